@@ -2,3 +2,11 @@ from optools.pricing import *
 from optools.pricing_wrappers import *
 from optools.helpers import *
 from optools.volsurface import *
+from optools.quadrature import *
+from optools.lnmix import *
+from optools.rnd import *
+from optools.calibration import *
+from optools.density import *
+from optools.smoothing import *
+from optools.smile_models import *
+from optools.grids import *
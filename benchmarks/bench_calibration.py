@@ -0,0 +1,60 @@
+"""Batch vs per-smile calibration of log-normal mixtures.
+
+Fits two-component mixtures to N synthetic smiles with the batch
+Levenberg-Marquardt of `estimate_rnd_batch`, and smile by smile with
+scipy.optimize.least_squares (`estimate_rnd`) and scipy.optimize.minimize,
+all from the same starting values and with analytic derivatives.
+
+Run as `python -m optools.benchmarks.bench_calibration`.
+"""
+import time
+import numpy as np
+from scipy.optimize import minimize
+
+from optools import rnd
+from optools.benchmarks.bench_rnd import make_history
+
+
+def main(n=1000):
+    """Print time per smile and the median loss for each method."""
+    call_p, strike, forward = make_history(n)
+    rf = np.full(n, 0.001)
+    scale = np.broadcast_to(forward[:, np.newaxis], call_p.shape)
+
+    x0 = rnd._initial_guess(call_p, strike, forward, rf, 2)
+
+    def loss(x, p):
+        res, jac = rnd._residuals_and_jacobian(
+            x, strike[p], call_p[p], forward[p], rf[p], 2, scale[p])
+        return res.dot(res), 2 * res.dot(jac)
+
+    steps = {
+        "batch": lambda: rnd.estimate_rnd_batch(
+            call_p, strike, forward, rf=0.012, tau=1/12),
+        "least_squares": lambda: [
+            rnd.estimate_rnd(call_p[p], strike[p], forward[p], rf=0.012,
+                             tau=1/12, full_output=True)[1]
+            for p in range(n)],
+        "minimize": lambda: [
+            minimize(loss, x0[p], args=(p, ), jac=True, method="BFGS")
+            for p in range(n)],
+    }
+
+    for k, v in steps.items():
+        t0 = time.perf_counter()
+        res = v()
+        t = time.perf_counter() - t0
+
+        if k == "batch":
+            x = rnd._pack(*np.split(res.iloc[:, :6].values, 3, axis=-1))
+        else:
+            x = np.vstack([r.x for r in res])
+
+        cost = [loss(x[p], p)[0] for p in range(n)]
+
+        print("{:<14} {:8.3f} ms per smile, median loss {:.1e}"
+              .format(k, t / n * 1e3, np.median(cost)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Strikes from premium-adjusted deltas: batch solver vs per-quote roots.
+
+Converts the 10- and 25-delta calls and puts of N days of quotes to
+strikes under the spot premium-adjusted convention, all at once with
+`strike_from_delta` and quote by quote with scipy.optimize.brentq.
+
+Run as `python -m optools.benchmarks.bench_delta`.
+"""
+import time
+import numpy as np
+from scipy.optimize import brentq
+
+from optools.pricing import strike_from_delta, delta_from_strike
+from optools.benchmarks.bench_parallel import make_history
+
+
+def main(n=2500):
+    """Print time per quote and the largest difference in strikes."""
+    quotes = make_history(n, 0)
+    tau = 1/12
+
+    delta = np.array([0.1, 0.25, -0.25, -0.1])
+    is_call = delta > 0
+    spot, rf, div_yield = [quotes[p].values[:, np.newaxis]
+                           for p in ("spot", "rf", "div_yield")]
+    vola = quotes["atm_vola"].values[:, np.newaxis] + \
+        np.array([0.01, 0.004, 0.006, 0.015])
+
+    t0 = time.perf_counter()
+    res = strike_from_delta(delta, spot, rf, div_yield, tau, vola, is_call,
+                            convention="spot_pa")
+    t_batch = time.perf_counter() - t0
+
+    # brentq between the strike of the unadjusted delta and far below it
+    unadj = strike_from_delta(delta, spot, rf, div_yield, tau, vola,
+                              is_call)
+
+    def one(p, q):
+        args = (spot[p, 0], rf[p, 0], div_yield[p, 0], tau, vola[p, q],
+                is_call[q], "spot_pa")
+        return brentq(lambda k: delta_from_strike(k, *args) - delta[q],
+                      unadj[p, q] * 0.9, unadj[p, q], xtol=1e-12)
+
+    t0 = time.perf_counter()
+    ref = np.array([[one(p, q) for q in range(len(delta))]
+                    for p in range(n)])
+    t_loop = time.perf_counter() - t0
+
+    n_quotes = res.size
+    print("batch    {:8.4f} ms per quote".format(t_batch / n_quotes * 1e3))
+    print("brentq   {:8.4f} ms per quote".format(t_loop / n_quotes * 1e3))
+    print("max abs diff in strikes {:.1e}".format(np.abs(res - ref).max()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Nonparametric risk-neutral densities: batch spline vs kernel fits.
+
+Estimates densities of N synthetic 1m smiles with five quotes each, with
+`breeden_litzenberger` (analytic and finite differences, all smiles at
+once) and with a local-linear kernel fit of each smile followed by second
+differences, as the former `rnd_nonparametric` did.
+
+Run as `python -m optools.benchmarks.bench_density`.
+"""
+import time
+import numpy as np
+from statsmodels.nonparametric.kernel_regression import KernelReg
+
+from optools.pricing import bs_price
+from optools.density import breeden_litzenberger
+from optools.benchmarks.bench_parallel import make_history
+from optools.pricing_wrappers import _smiles_from_block
+
+
+def main(n=200, n_kernel=10):
+    """Print the time per smile of each method."""
+    smiles = list(_smiles_from_block(make_history(n, 0), 1/12).values())
+
+    vola = np.vstack([s.vola for s in smiles])
+    strike = np.vstack([s.strike for s in smiles])
+    forward = np.array([s.forward for s in smiles])
+
+    for method in ("analytic", "fd"):
+        t0 = time.perf_counter()
+        res = breeden_litzenberger(vola, strike, forward, 1/12,
+                                   method=method)
+        t = time.perf_counter() - t0
+        print("{:<10} {:8.3f} ms per smile, mass {:.4f}"
+              .format(method, t / n * 1e3, res.mass.mean()))
+
+    t0 = time.perf_counter()
+    for p in range(n_kernel):
+        grid = res.strike[p]
+        kr = KernelReg(endog=[vola[p], ], exog=[strike[p], ],
+                       reg_type="ll", var_type=["c", ])
+        vola_hat, _ = kr.fit(data_predict=grid)
+        call_p = bs_price(grid, 0.0, 1/12, vola_hat, forward=forward[p])
+        np.diff(call_p, 2) / (grid[1] - grid[0])**2
+    t = time.perf_counter() - t0
+    print("{:<10} {:8.3f} ms per smile".format("kernel", t / n_kernel * 1e3))
+
+
+if __name__ == "__main__":
+    main()
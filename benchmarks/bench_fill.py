@@ -0,0 +1,47 @@
+"""Filling missing spot, forward and rates: row by row vs column-wise.
+
+Removes one of spot, forward, rf and div_yield at random from a share of
+N days of quotes, and fills them in again with the scalar
+`fill_by_no_arb` applied per row, as `wrapper_smile_from_series` does,
+and with `fill_by_no_arb_frame` for all rows at once.
+
+Run as `python -m optools.benchmarks.bench_fill`.
+"""
+import time
+import numpy as np
+import pandas as pd
+
+from optools.pricing import fill_by_no_arb, fill_by_no_arb_frame
+from optools.benchmarks.bench_parallel import make_history
+
+
+def main(n=2600, share=0.1):
+    """Print the time for the whole table and the largest difference."""
+    tau = 1/12
+    columns = ["spot", "forward", "rf", "div_yield"]
+
+    data = make_history(n, 0)
+    rng = np.random.RandomState(1)
+    rows = rng.choice(n, int(share * n), replace=False)
+    for p in rows:
+        data.iloc[p, rng.randint(4)] = np.nan
+
+    t0 = time.perf_counter()
+    per_row = data.copy()
+    for idx, row in per_row[columns].iterrows():
+        per_row.loc[idx, columns] = pd.Series(
+            fill_by_no_arb(tau=tau, **row))
+    t_row = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    frame = fill_by_no_arb_frame(data, tau)
+    t_frame = time.perf_counter() - t0
+
+    print("per row  {:9.2f} ms".format(t_row * 1e3))
+    print("frame    {:9.2f} ms".format(t_frame * 1e3))
+    print("max abs diff {:.1e}".format(
+        np.abs(per_row[columns].values - frame[columns].values).max()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Grids of strikes for the mfiv: size, accuracy and time per smile.
+
+Interpolates N synthetic 1m smiles with the cubic spline on grids of each
+policy of `grids.strike_grid`, and compares the mfiv with one on a very
+fine Gauss-Legendre grid.
+
+Run as `python -m optools.benchmarks.bench_grids`.
+"""
+import time
+import numpy as np
+
+from optools.grids import strike_grid
+from optools.pricing_wrappers import _smiles_from_block
+from optools.benchmarks.bench_parallel import make_history
+
+
+def main(n=500):
+    """Print the points per smile, the worst relative error and time per
+    smile for each policy."""
+    smiles = list(_smiles_from_block(make_history(n, 0), 1/12).values())
+
+    def mfiv(smile, policy, **kwargs):
+        grid, weights = strike_grid(smile.strike, smile.forward, smile.vola,
+                                    smile.tau, policy=policy,
+                                    return_weights=True, **kwargs)
+        return len(grid), smile.interpolate(grid)\
+            .get_mfivariance(weights=weights)
+
+    ref = np.array([mfiv(s, "gauss", tol=1e-12)[1] for s in smiles])
+
+    for policy in ("uniform", "adaptive", "gauss"):
+        t0 = time.perf_counter()
+        res = [mfiv(s, policy) for s in smiles]
+        t = time.perf_counter() - t0
+
+        n_points, values = [np.array(r) for r in zip(*res)]
+
+        print("{:<9} {:6.0f} points, max rel error {:.1e}, {:.3f} ms "
+              "per smile".format(policy, n_points.mean(),
+                                 np.abs(values / ref - 1).max(),
+                                 t / n * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Mfiv and svix of a 10-year daily panel: row by row vs the batch wrapper.
+
+Computes the mfiv and svix of N business days of synthetic 1m quotes row
+by row with `wrapper_mfiv_from_series` and for the whole panel with
+`wrapper_mfiv_from_frame`.
+
+Run as `python -m optools.benchmarks.bench_mfiv_frame`.
+"""
+import time
+import numpy as np
+
+from optools.pricing_wrappers import wrapper_mfiv_from_series, \
+    wrapper_mfiv_from_frame
+from optools.benchmarks.bench_parallel import make_history
+
+
+def main(n=2520):
+    """Print time per date and the largest difference for each measure."""
+    quotes = make_history(n, 0)
+    tau = 1/12
+
+    for svix in (False, True):
+        t0 = time.perf_counter()
+        ref = np.array([wrapper_mfiv_from_series(row, tau, None, svix=svix)
+                        for _, row in quotes.iterrows()])
+        t_rows = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        res = wrapper_mfiv_from_frame(quotes, tau, svix=svix)
+        t_frame = time.perf_counter() - t0
+
+        print("{:<5} by row {:7.4f} ms, frame {:7.4f} ms per date, "
+              "max abs diff {:.1e}".format(res.name, t_rows / n * 1e3,
+                                           t_frame / n * 1e3,
+                                           np.abs(res.values - ref).max()))
+
+
+if __name__ == "__main__":
+    main()
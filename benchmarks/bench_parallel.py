@@ -0,0 +1,67 @@
+"""Scaling of wrapper_moments_parallel with the number of processes.
+
+Estimates mfiv, svix and mfiskewness on synthetic daily quote histories of
+several currency pairs, with 1, 2, 4, ... processes up to the number of
+cpus, and checks that the output equals the serial one.
+
+Run as `python -m optools.benchmarks.bench_parallel`.
+"""
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from optools.pricing_wrappers import wrapper_moments_parallel
+
+
+def make_history(n, seed):
+    """Daily 1m quotes of atm, 25- and 10-delta risk reversals and flies."""
+    rng = np.random.RandomState(seed)
+    tau = 1/12
+
+    spot = 1.1 * np.exp(np.cumsum(rng.normal(size=(n,)) * 0.006))
+    rf = 0.01 + rng.normal(size=(n,)) * 0.001
+    div_yield = 0.005 + rng.normal(size=(n,)) * 0.001
+
+    res = pd.DataFrame({
+        "spot": spot,
+        "forward": spot * np.exp((rf - div_yield) * tau),
+        "rf": rf,
+        "div_yield": div_yield,
+        "atm_vola": 0.09 + rng.normal(size=(n,)) * 0.005,
+        "25rr": -0.01 + rng.normal(size=(n,)) * 0.002,
+        "25bf": 0.003 + rng.normal(size=(n,)) * 0.0005,
+        "10rr": -0.02 + rng.normal(size=(n,)) * 0.003,
+        "10bf": 0.009 + rng.normal(size=(n,)) * 0.001},
+        index=pd.bdate_range("2000-01-03", periods=n))
+
+    return res
+
+
+def main(n_pairs=8, n_days=2500, chunksize=250):
+    """Print the wall time and speed-up for each number of processes."""
+    data = {"pair{:d}".format(p): make_history(n_days, p)
+            for p in range(n_pairs)}
+
+    t0 = time.perf_counter()
+    res_serial = wrapper_moments_parallel(data, 1/12, chunksize=chunksize,
+                                          n_jobs=1)
+    t_serial = time.perf_counter() - t0
+    print("{:>3} procs {:8.2f} s".format(1, t_serial))
+
+    n_jobs = 2
+    while n_jobs <= os.cpu_count():
+        t0 = time.perf_counter()
+        res = wrapper_moments_parallel(data, 1/12, chunksize=chunksize,
+                                       n_jobs=n_jobs)
+        t = time.perf_counter() - t0
+
+        same = all(res[k].equals(res_serial[k]) for k in data)
+        print("{:>3} procs {:8.2f} s, speed-up {:5.1f}, identical: {}"
+              .format(n_jobs, t, t_serial / t, same))
+
+        n_jobs *= 2
+
+
+if __name__ == "__main__":
+    main()
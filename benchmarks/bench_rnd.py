@@ -0,0 +1,52 @@
+"""Cold vs warm starts in the log-normal mixture RND estimation.
+
+Fits two-component mixtures to a synthetic daily history of 1m call
+prices whose true parameters follow random walks, once starting each date
+from scratch and once from the previous date's estimate.
+
+Run as `python -m optools.benchmarks.bench_rnd`.
+"""
+import time
+import numpy as np
+
+from optools.pricing import price_under_mixture
+from optools.rnd import estimate_rnd_history
+
+
+def make_history(n=250, seed=1):
+    """Call prices at 9 strikes around the forward, per-period rf of 0.1%."""
+    rng = np.random.RandomState(seed)
+
+    mu = np.column_stack(
+        (0.06 + np.cumsum(rng.normal(size=(n,))) * 0.002,
+         0.10 + np.cumsum(rng.normal(size=(n,))) * 0.002))
+    sigma = np.column_stack(
+        (0.03 * np.exp(np.cumsum(rng.normal(size=(n,))) * 0.01),
+         0.05 * np.exp(np.cumsum(rng.normal(size=(n,))) * 0.01)))
+    w_1 = np.clip(0.4 + np.cumsum(rng.normal(size=(n,))) * 0.005, 0.1, 0.9)
+    wght = np.column_stack((w_1, 1 - w_1))
+
+    forward = (wght * np.exp(mu + sigma * sigma / 2)).sum(axis=1)
+    strike = forward[:, np.newaxis] * np.exp(np.linspace(-0.12, 0.12, 9))
+    call_p = price_under_mixture(strike, 0.001, mu, sigma, wght)
+
+    return call_p, strike, forward
+
+
+def main(n=250):
+    """Print time and function evaluations per date for both starts."""
+    call_p, strike, forward = make_history(n)
+
+    for warm_start in (False, True):
+        t0 = time.perf_counter()
+        res = estimate_rnd_history(call_p, strike, forward, rf=0.012,
+                                   tau=1/12, warm_start=warm_start)
+        t = time.perf_counter() - t0
+
+        print("{:<5} {:8.2f} ms per date, {:5.1f} evaluations per date"
+              .format("warm" if warm_start else "cold", t / n * 1e3,
+                      res["nfev"].mean()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Smiles from a table of quotes: row by row vs positionally, at once.
+
+Builds smiles from N days of quotes row by row with
+`wrapper_smile_from_series`, and for the whole table with
+`wrapper_smiles_from_frame`, where the columns are classified once by a
+`QuoteSchema` and quotes are taken by position.
+
+Run as `python -m optools.benchmarks.bench_schema`.
+"""
+import time
+import numpy as np
+
+from optools.pricing_wrappers import wrapper_smile_from_series, \
+    wrapper_smiles_from_frame
+from optools.benchmarks.bench_parallel import make_history
+
+
+def main(n=2500):
+    """Print time per date and the largest difference in strikes."""
+    quotes = make_history(n, 0)
+    tau = 1/12
+
+    t0 = time.perf_counter()
+    ref = [wrapper_smile_from_series(row, tau).dropna(from_index=True)
+           for _, row in quotes.iterrows()]
+    t_rows = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    res = wrapper_smiles_from_frame(quotes, tau)
+    t_frame = time.perf_counter() - t0
+
+    diff = max(np.abs(a.strike - b.strike).max() for a, b in zip(res, ref))
+
+    print("by row   {:8.4f} ms per date".format(t_rows / n * 1e3))
+    print("frame    {:8.4f} ms per date".format(t_frame / n * 1e3))
+    print("max abs diff in strikes {:.1e}".format(diff))
+
+
+if __name__ == "__main__":
+    main()
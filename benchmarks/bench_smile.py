@@ -0,0 +1,47 @@
+"""Per-smile latency of the VolatilitySmile pipeline.
+
+Times the steps of the per-quote loop: construction from a 5-point FX
+smile, interpolation over the default strike grid and integration.
+
+Run as `python -m optools.benchmarks.bench_smile`.
+"""
+import timeit
+import numpy as np
+import pandas as pd
+
+from optools.volsurface import VolatilitySmile
+
+
+def make_smile():
+    """Five-point FX smile as built from 10- and 25-delta quotes."""
+    strike = np.array([1.021, 1.062, 1.093, 1.121, 1.168])
+    vola = np.array([0.105, 0.096, 0.091, 0.093, 0.099])
+
+    res = VolatilitySmile(pd.Series(vola, index=strike), spot=1.09,
+                          forward=1.093, rf=0.01, div_yield=0.005, tau=0.25)
+
+    return res
+
+
+def main(number=1000):
+    """Print the average latency of each step, in microseconds."""
+    smile = make_smile()
+    smile_interp = smile.interpolate()
+
+    steps = {
+        "construct": make_smile,
+        "from_arrays": lambda: VolatilitySmile.from_arrays(
+            smile.vola, smile.strike, spot=1.09, forward=1.093, rf=0.01,
+            div_yield=0.005, tau=0.25),
+        "interpolate": lambda: smile.interpolate(),
+        "mfivariance": lambda: smile_interp.get_mfivariance(),
+        "total": lambda: make_smile().interpolate().get_mfivariance(),
+    }
+
+    for k, v in steps.items():
+        t = timeit.timeit(v, number=number) / number
+        print("{:<12} {:8.1f} us".format(k, t * 1e6))
+
+
+if __name__ == "__main__":
+    main()
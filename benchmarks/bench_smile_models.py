@@ -0,0 +1,79 @@
+"""Calibration of parametric smile models, batch vs per smile.
+
+Fits SABR to N synthetic smiles on consecutive dates with the batch
+Levenberg-Marquardt of `fit_smile_model`, cold and warm-started from the
+previous dates' parameters, and smile by smile with
+scipy.optimize.least_squares. Also compares the size of stored parameters
+with that of smiles interpolated on the default grid of strikes.
+
+Run as `python -m optools.benchmarks.bench_smile_models`.
+"""
+import time
+import numpy as np
+from scipy.optimize import least_squares
+
+from optools.helpers import strike_range
+from optools.smile_models import SABR, fit_smile_model
+
+
+def make_history(n, seed=0):
+    """SABR smiles of 9 quotes with parameters following random walks."""
+    rng = np.random.default_rng(seed)
+
+    params = np.column_stack((
+        0.1 * np.exp(np.cumsum(rng.normal(0, 0.02, n))),
+        np.tanh(-0.3 + np.cumsum(rng.normal(0, 0.02, n))),
+        0.8 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))))
+    forward = 1.1 * np.exp(np.cumsum(rng.normal(0, 0.005, n)))
+    strike = forward[:, np.newaxis] * np.exp(np.linspace(-0.15, 0.15, 9))
+    vola = SABR.vola(params, strike, forward[:, np.newaxis], 0.25)
+
+    return vola, strike, forward
+
+
+def main(n=2000):
+    """Print time per smile, iterations and the worst fit for each method.
+    """
+    vola, strike, forward = make_history(n)
+    tau = 0.25
+
+    def per_smile():
+        x0 = SABR.to_free(SABR.initial_guess(
+            vola, strike, forward[:, np.newaxis], tau))
+        return [least_squares(
+            lambda x, p: SABR.vola(SABR.from_free(x), strike[p],
+                                   forward[p], tau) - vola[p],
+            x0[p], args=(p, )) for p in range(n)]
+
+    cold = fit_smile_model(vola, strike, forward, tau, model="sabr")
+    steps = {
+        "batch": lambda: fit_smile_model(vola, strike, forward, tau,
+                                         model="sabr"),
+        "batch, warm": lambda: fit_smile_model(
+            vola, strike, forward, tau, model="sabr",
+            x0=cold.shift(1).fillna(cold)),
+        "least_squares": per_smile,
+    }
+
+    for k, v in steps.items():
+        t0 = time.perf_counter()
+        res = v()
+        t = time.perf_counter() - t0
+
+        if k == "least_squares":
+            # function evaluations, one per iteration of its trust region
+            nit = np.mean([r.nfev for r in res])
+            rmse = max(np.sqrt(np.mean(r.fun**2)) for r in res)
+        else:
+            nit, rmse = res["nit"].mean(), res["rmse"].max()
+
+        print("{:<14} {:8.3f} ms per smile, {:5.1f} iterations, "
+              "max rmse {:.1e}".format(k, t / n * 1e3, nit, rmse))
+
+    n_grid = len(strike_range(strike[0]))
+    print("stored per smile: {} parameters vs {} strikes and volas"
+          .format(len(SABR.param_names), 2 * n_grid))
+
+
+if __name__ == "__main__":
+    main()
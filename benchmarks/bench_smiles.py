@@ -0,0 +1,79 @@
+"""Construction of smiles from a history of FX quotes.
+
+Builds smiles from N days of atm, risk reversal and butterfly quotes:
+date by date through pandas, as `by_delta_from_combinations` used to (one
+Series per delta, concatenated and passed to `by_delta`), date by date
+with `by_delta_from_combinations`, and for all dates at once with
+`smiles_from_combinations`.
+
+Run as `python -m optools.benchmarks.bench_smiles`.
+"""
+import time
+import numpy as np
+import pandas as pd
+
+from optools.pricing import vanillas_from_combinations
+from optools.helpers import fast_norm_cdf
+from optools.volsurface import VolatilitySmile, smiles_from_combinations
+from optools.benchmarks.bench_parallel import make_history
+
+
+def by_delta_from_combinations_pandas(combies, atm_vola, spot, forward, rf,
+                                      div_yield, tau):
+    """The former per-date implementation, through pandas."""
+    volas = pd.concat([vanillas_from_combinations(atm=atm_vola, delta=k, **v)
+                       for k, v in combies.items()])
+
+    atm_delta = np.exp(-div_yield * tau) * \
+        fast_norm_cdf(0.5 * atm_vola * np.sqrt(tau))
+    volas.loc[atm_delta] = atm_vola
+
+    return VolatilitySmile.by_delta(volas, spot, forward, rf, div_yield, tau,
+                                    is_call=True)
+
+
+def main(n=2500):
+    """Print time per date and the largest difference in strikes."""
+    quotes = make_history(n, 0)
+    tau = 1/12
+    deltas = {0.25: "25", 0.1: "10"}
+
+    def per_date(fun):
+        res = []
+        for _, row in quotes.iterrows():
+            combies = {d: {"rr": row[k + "rr"], "bf": row[k + "bf"]}
+                       for d, k in deltas.items()}
+            res.append(fun(combies, row["atm_vola"], row["spot"],
+                           row["forward"], row["rf"], row["div_yield"],
+                           tau).strike)
+        return np.vstack(res)
+
+    def batch():
+        combies = {d: {"rr": quotes[k + "rr"].values,
+                       "bf": quotes[k + "bf"].values}
+                   for d, k in deltas.items()}
+        return smiles_from_combinations(
+            combies, *[quotes[p].values for p in
+                       ("atm_vola", "spot", "forward", "rf", "div_yield")],
+            tau=tau)["strike"]
+
+    steps = {
+        "pandas": lambda: per_date(by_delta_from_combinations_pandas),
+        "per date": lambda: per_date(
+            VolatilitySmile.by_delta_from_combinations),
+        "batch": batch,
+    }
+
+    ref = None
+    for k, v in steps.items():
+        t0 = time.perf_counter()
+        res = v()
+        t = time.perf_counter() - t0
+
+        ref = res if ref is None else ref
+        print("{:<9} {:8.4f} ms per date, max abs diff {:.1e}"
+              .format(k, t / n * 1e3, np.abs(res - ref).max()))
+
+
+if __name__ == "__main__":
+    main()
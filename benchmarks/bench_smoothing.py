@@ -0,0 +1,72 @@
+"""Kernel interpolation of smiles: statsmodels vs in-house local-linear.
+
+Interpolates N synthetic 1m smiles with five quotes each on a grid of 200
+strikes with KernelReg (cross-validated bandwidth), with
+VolatilitySmile.interpolate(in_method='kernel') and with one batched call
+of cv_bandwidth and local_linear, and reports the largest difference to
+KernelReg within the quoted strikes, as well as the share of smiles with a
+difference above 1e-4 and the difference with KernelReg's bandwidths, to
+tell differences in bandwidths from those in fits.
+
+Run as `python -m optools.benchmarks.bench_smoothing`.
+"""
+import time
+import numpy as np
+from statsmodels.nonparametric.kernel_regression import KernelReg
+
+from optools.smoothing import (local_linear, cv_bandwidth,
+                               clear_bandwidth_cache)
+from optools.benchmarks.bench_parallel import make_history
+from optools.pricing_wrappers import _smiles_from_block
+
+
+def main(n=100):
+    """Print the time per smile of each method."""
+    smiles = list(_smiles_from_block(make_history(n, 0), 1/12).values())
+
+    strike = np.vstack([s.strike for s in smiles])
+    vola = np.vstack([s.vola for s in smiles])
+    grid = strike[:, :1] + (strike[:, -1:] - strike[:, :1]) * \
+        np.linspace(0, 1, 200)
+
+    t0 = time.perf_counter()
+    res_sm = np.vstack([
+        KernelReg(endog=[s.vola, ], exog=[s.strike, ], reg_type="ll",
+                  var_type=["c", ]).fit(data_predict=g)[0]
+        for s, g in zip(smiles, grid)])
+    t_sm = time.perf_counter() - t0
+
+    clear_bandwidth_cache()
+    t0 = time.perf_counter()
+    res_one = np.vstack([
+        s.interpolate(new_strike=g, in_method="kernel").vola
+        for s, g in zip(smiles, grid)])
+    t_one = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    res_batch = local_linear(strike, vola, grid, cv_bandwidth(strike, vola))
+    t_batch = time.perf_counter() - t0
+
+    for k, t, r in (("KernelReg", t_sm, res_sm),
+                    ("interpolate", t_one, res_one),
+                    ("batch", t_batch, res_batch)):
+        diff = np.abs(r - res_sm).max(axis=-1)
+        print("{:<12} {:9.3f} ms per smile, max abs diff {:.1e}, "
+              "above 1e-4 for {:.0%} of smiles"
+              .format(k, t / n * 1e3, diff.max(), (diff > 1e-4).mean()))
+
+    # KernelReg's bandwidths: the same fits but where these are far below
+    #   the spacing of quotes
+    bw_sm = np.abs([KernelReg(endog=[s.vola, ], exog=[s.strike, ],
+                              reg_type="ll", var_type=["c", ]).bw[0]
+                    for s in smiles])
+    diff = np.abs(local_linear(strike, vola, grid, bw_sm) - res_sm)\
+        .max(axis=-1)
+    regular = bw_sm > 0.2 * np.diff(strike, axis=-1).min(axis=-1)
+    print("same bw      max abs diff {:.1e}, {:.1e} without {:d} smiles "
+          "with tiny bandwidths".format(diff.max(), diff[regular].max(),
+                                        (~regular).sum()))
+
+
+if __name__ == "__main__":
+    main()
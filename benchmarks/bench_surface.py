@@ -0,0 +1,103 @@
+"""Latency of VolatilitySurface.interpolate_along_tau on FX surfaces.
+
+Compares the vectorized method against the former double loop over
+maturity pairs, on a 12-tenor surface with five quotes per tenor as read
+by `import_data_hf`.
+
+Run as `python -m optools.benchmarks.bench_surface`.
+"""
+import timeit
+from functools import reduce
+import numpy as np
+import pandas as pd
+
+from optools.volsurface import VolatilitySurface
+
+TENORS = {"1W": 1/52, "2W": 2/52, "3W": 3/52, "1M": 1/12, "2M": 2/12,
+          "3M": 3/12, "4M": 4/12, "6M": 6/12, "9M": 9/12, "1Y": 1.0,
+          "18M": 1.5, "2Y": 2.0}
+
+
+def make_surface(spot=1.09, rf=0.01, div_yield=0.005):
+    """Surface of 10d put, 25d put, atm, 25d call and 10d call volas."""
+    tau = np.array(list(TENORS.values()))
+    forward = spot * np.exp((rf - div_yield) * tau)
+
+    z = np.array([-1.28, -0.67, 0.0, 0.67, 1.28])
+    smile = np.array([0.011, 0.003, 0.0, 0.002, 0.008])
+
+    vola = dict()
+    for t, f in zip(tau, forward):
+        atm = 0.08 + 0.01 * np.sqrt(t)
+        strike = f * np.exp(atm * np.sqrt(t) * z)
+        vola[t] = pd.Series(atm + smile, index=strike)
+
+    vola_df = pd.concat(vola, axis=1)
+
+    res = VolatilitySurface(
+        vola_df,
+        spot=pd.Series(spot, index=tau),
+        forward=pd.Series(forward, index=tau),
+        rf=pd.Series(rf, index=tau),
+        div_yield=pd.Series(div_yield, index=tau))
+
+    return res
+
+
+def legacy_interpolate_along_tau(surf):
+    """Former implementation, kept for reference."""
+    imputed_all = list()
+
+    for tau_star, tau_star_col in surf.surface.iteritems():
+        f_star = surf.forward.loc[tau_star]
+        k_star = np.array(tau_star_col.dropna().index)
+
+        imputed_tau_star = dict()
+
+        for tau_new, tau_new_col in surf.surface.iteritems():
+            f_new = surf.forward.loc[tau_new]
+
+            k_new = f_new * (k_star / f_star)**(np.sqrt(tau_new/tau_star))
+
+            sigma_new = surf.surface.loc[f_new, tau_new] +\
+                surf.surface.loc[k_star, tau_star].values - \
+                surf.surface.loc[f_star, tau_star]
+
+            imputed_tau_star[tau_new] = pd.Series(index=k_new,
+                                                  data=sigma_new)
+
+        imputed_all.append(pd.concat(imputed_tau_star, axis=1))
+
+    def reduce_func(x, y):
+        x_new, y_new = x.align(y, join="outer")
+        return x_new.fillna(y_new)
+
+    res = VolatilitySurface(
+        vola_df=reduce(reduce_func, imputed_all),
+        forward=surf.forward, spot=surf.spot, rf=surf.rf,
+        div_yield=surf.div_yield)
+
+    return res
+
+
+def main(number=20):
+    """Print the average latency of both methods, in milliseconds."""
+    surf = make_surface()
+
+    res_new = surf.interpolate_along_tau().surface
+    res_old = legacy_interpolate_along_tau(surf).surface
+    print("max abs diff {:.2e}".format(
+        np.nanmax(np.abs(res_new.values - res_old.values))))
+
+    steps = {
+        "legacy": lambda: legacy_interpolate_along_tau(surf),
+        "vectorized": lambda: surf.interpolate_along_tau(),
+    }
+
+    for k, v in steps.items():
+        t = timeit.timeit(v, number=number) / number
+        print("{:<12} {:8.2f} ms".format(k, t * 1e3))
+
+
+if __name__ == "__main__":
+    main()
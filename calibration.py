@@ -0,0 +1,298 @@
+"""Loss functions and solvers for calibrating mixtures of log-normals.
+
+Everything is per period. Losses are sums of squared residuals: call
+pricing errors, scaled either by the forward price ('price' space) or by
+the vega of the observed option ('iv' space, a first-order approximation
+to errors in implied vola), and the relative forward pricing error. Values
+and exact gradients w.r.t. (mu, sigma, wght) come from one pricing pass.
+"""
+import numpy as np
+
+from optools.pricing import price_under_mixture, bs_iv, bs_greeks
+
+
+def vega_scale(call_p, strike, forward, rf, vola=None):
+    """Calculate vegas of options to scale pricing errors to errors in vola.
+
+    Parameters
+    ----------
+    call_p : numpy.ndarray
+        (M,) or (N, M) array of call prices
+    strike : numpy.ndarray
+        (M,) or (N, M) array of strike prices
+    forward : float or numpy.ndarray
+        forward price(s), (N,) if an array
+    rf : float or numpy.ndarray
+        risk-free rate(s), in (frac of 1), per period
+    vola : numpy.ndarray, optional
+        implied volas per period (i.e. times the root of maturity) of the
+        options; backed out of `call_p` if not provided
+
+    Returns
+    -------
+    res : numpy.ndarray
+        vegas per unit of vola per period, same shape as `call_p`
+
+    """
+    forward, rf = [np.asarray(p, dtype=float)[..., np.newaxis]
+                   for p in (forward, rf)]
+
+    if vola is None:
+        vola = bs_iv(call_p, forward, strike, rf, tau=1.0)
+
+    res = bs_greeks(strike, rf, 1.0, vola, forward=forward,
+                    greeks=["vega"])["vega"]
+
+    return res
+
+
+def mixture_residuals(mu, sigma, wght, strike, call_p, forward, rf,
+                      scale=None, jac=False):
+    """Calculate residuals of a mixture of log-normals and their derivatives.
+
+    Residuals are (call price - observed call price) / scale for each
+    strike followed by (forward price - observed forward) / forward.
+
+    Parameters
+    ----------
+    mu, sigma, wght : numpy.ndarray
+        (K,) or (N, K) arrays of parameters of the mixture(s)
+    strike : numpy.ndarray
+        (M,) or (N, M) array of strike prices
+    call_p : numpy.ndarray
+        (M,) or (N, M) array of observed call prices
+    forward : float or numpy.ndarray
+        observed forward price(s), (N,) if an array
+    rf : float or numpy.ndarray
+        risk-free rate(s), in (frac of 1), per period
+    scale : numpy.ndarray, optional
+        (M,) or (N, M) scale of pricing errors, e.g. output of
+        `vega_scale`; the forward price by default
+    jac : bool
+        True to also return the derivatives
+
+    Returns
+    -------
+    res : numpy.ndarray
+        (M+1,) or (N, M+1) array of residuals
+    res_jac : numpy.ndarray
+        (M+1, 3*K) or (N, M+1, 3*K) derivatives w.r.t. mu, sigma and wght,
+        in this order; only if `jac` is True
+
+    """
+    mu, sigma, wght = [np.asarray(p, dtype=float) for p in (mu, sigma, wght)]
+    forward = np.asarray(forward, dtype=float)[..., np.newaxis]
+
+    if scale is None:
+        scale = forward
+
+    # forward of each component and of the mixture
+    f_comp = np.exp(mu + 0.5 * sigma * sigma)
+    f_hat = (wght * f_comp).sum(axis=-1, keepdims=True)
+
+    if jac:
+        c_hat, c_jac = price_under_mixture(strike, rf, mu, sigma, wght,
+                                           jac=True)
+    else:
+        c_hat = price_under_mixture(strike, rf, mu, sigma, wght)
+
+    res_c = (c_hat - call_p) / scale
+    res_f = np.broadcast_to((f_hat - forward) / forward,
+                            res_c.shape[:-1] + (1, ))
+
+    res = np.concatenate((res_c, res_f), axis=-1)
+
+    if not jac:
+        return res
+
+    # the forward is one more price, of the same structure
+    f_jac = np.concatenate((wght * f_comp, wght * sigma * f_comp, f_comp),
+                           axis=-1)[..., np.newaxis, :]
+
+    res_jac = np.concatenate(
+        (c_jac / np.asarray(scale)[..., np.newaxis],
+         f_jac / forward[..., np.newaxis]), axis=-2)
+
+    return res, res_jac
+
+
+def mixture_loss(mu, sigma, wght, strike, call_p, forward, rf, space="price",
+                 vola=None, scale=None):
+    """Calculate the calibration loss and its gradient in one pass.
+
+    Parameters
+    ----------
+    mu, sigma, wght : numpy.ndarray
+        (K,) or (N, K) arrays of parameters of the mixture(s)
+    strike : numpy.ndarray
+        (M,) or (N, M) array of strike prices
+    call_p : numpy.ndarray
+        (M,) or (N, M) array of observed call prices
+    forward : float or numpy.ndarray
+        observed forward price(s), (N,) if an array
+    rf : float or numpy.ndarray
+        risk-free rate(s), in (frac of 1), per period
+    space : str
+        'price' for pricing errors relative to the forward, 'iv' for pricing
+        errors divided by vegas
+    vola : numpy.ndarray, optional
+        implied volas per period of the options, for `space='iv'`
+    scale : numpy.ndarray, optional
+        precomputed scale of pricing errors, overrides `space`; pass the
+        output of `vega_scale` to avoid backing out volas at every call
+
+    Returns
+    -------
+    loss : float or numpy.ndarray
+        sum of squared residuals, (N,) for N mixtures
+    grad : numpy.ndarray
+        (3*K,) or (N, 3*K) gradient w.r.t. mu, sigma and wght
+
+    """
+    if scale is None:
+        if space == "iv":
+            scale = vega_scale(call_p, strike, forward, rf, vola)
+        elif space != "price":
+            raise NotImplementedError("Loss space not implemented!")
+
+    res, res_jac = mixture_residuals(mu, sigma, wght, strike, call_p,
+                                     forward, rf, scale=scale, jac=True)
+
+    loss = (res * res).sum(axis=-1)
+    grad = 2 * (res[..., np.newaxis] * res_jac).sum(axis=-2)
+
+    return loss, grad
+
+
+def levenberg_marquardt(fun, x0, args=(), max_iter=200, xtol=1e-10,
+                        ftol=1e-12, gtol=1e-14, lambda0=1.0, max_step=0.5):
+    """Solve N independent nonlinear least-squares problems at once.
+
+    The Jacobian of the stacked problem is block-diagonal, so each
+    Levenberg-Marquardt step is a batch of small (P, P) solves. Every
+    problem has its own damping, and problems that have converged (or
+    failed) drop out while the rest continue.
+
+    Parameters
+    ----------
+    fun : callable
+        fun(x, *args) -> (res, jac) with (n, P) `x`, returning (n, R)
+        residuals and (n, R, P) derivatives
+    x0 : numpy.ndarray
+        (N, P) starting values
+    args : tuple
+        additional arguments to `fun`; numpy arrays with N rows are
+        subset to the active problems, everything else is passed as is
+    max_iter : int
+        maximum number of iterations
+    xtol : float
+        tolerance on the relative change of parameters
+    ftol : float
+        tolerance on the relative decrease of the sum of squares
+    gtol : float
+        tolerance on the max norm of the gradient
+    lambda0 : float
+        initial damping
+    max_step : float
+        maximum absolute change of any parameter in one iteration
+
+    Returns
+    -------
+    x : numpy.ndarray
+        (N, P) solutions
+    info : dict
+        with (N,) arrays 'cost' (half the sum of squared residuals), 'nit'
+        (number of iterations) and 'converged' (bool)
+
+    """
+    x = np.array(x0, dtype=float)
+    n, n_par = x.shape
+
+    def take(rows):
+        return [p[rows] if isinstance(p, np.ndarray) and p.ndim > 0 and
+                len(p) == n else p for p in args]
+
+    res, jac = fun(x, *args)
+    cost = 0.5 * (res * res).sum(axis=-1)
+
+    damping = np.full(n, lambda0)
+    nu = np.full(n, 2.0)
+    nit = np.zeros(n, dtype=int)
+    converged = np.zeros(n, dtype=bool)
+
+    # problems that cannot be evaluated at the start are left out
+    active = np.flatnonzero(np.isfinite(cost))
+
+    for _ in range(max_iter):
+        if active.size < 1:
+            break
+
+        res_a, jac_a = res[active], jac[active]
+
+        grad = np.einsum("nrp,nr->np", jac_a, res_a)
+        hess = np.einsum("nrp,nrq->npq", jac_a, jac_a)
+
+        # gradient small enough: nothing to do
+        done = np.abs(grad).max(axis=-1) <= gtol
+        converged[active[done]] = True
+
+        # damped normal equations, with Marquardt's scaling (floored to keep
+        #   them regular)
+        diag = hess.diagonal(axis1=-2, axis2=-1)
+        diag = np.maximum(diag, 1e-12 * (1 + diag.max(axis=-1,
+                                                      keepdims=True)))
+        hess_damped = hess + np.eye(n_par) * \
+            (damping[active, np.newaxis] * diag)[..., np.newaxis]
+        hess_damped[done] = np.eye(n_par)
+
+        step = -np.linalg.solve(hess_damped, grad[..., np.newaxis])[..., 0]
+
+        # limit the size of steps
+        step = step / np.maximum(
+            np.abs(step).max(axis=-1, keepdims=True) / max_step, 1.0)
+
+        x_new = x[active] + step
+        with np.errstate(all="ignore"):
+            res_new, jac_new = fun(x_new, *take(active))
+        cost_new = 0.5 * (res_new * res_new).sum(axis=-1)
+
+        # gain ratio: actual over predicted decrease of the sum of squares
+        jac_step = np.einsum("nrp,np->nr", jac_a, step)
+        predicted = -(step * grad).sum(axis=-1) - \
+            0.5 * (jac_step * jac_step).sum(axis=-1)
+        with np.errstate(all="ignore"):
+            gain = (cost[active] - cost_new) / predicted
+
+        better = (gain > 0) & ~done
+
+        # relative changes
+        small_step = (np.abs(step) <=
+                      xtol * (xtol + np.abs(x[active]))).all(axis=-1)
+        small_decrease = (cost[active] - cost_new) <= ftol * cost[active]
+
+        rows = active[better]
+        x[rows] = x_new[better]
+        res[rows] = res_new[better]
+        jac[rows] = jac_new[better]
+        cost[rows] = cost_new[better]
+
+        # damping update of Nielsen (1999)
+        damping[rows] = np.maximum(
+            damping[rows] * np.maximum(1/3, 1 - (2 * gain[better] - 1)**3),
+            1e-12)
+        nu[rows] = 2
+        rows = active[~better]
+        damping[rows] = damping[rows] * nu[rows]
+        nu[rows] = nu[rows] * 2
+
+        nit[active] += 1
+
+        converged[active[small_step | (better & small_decrease)]] = True
+
+        # drop converged ones and hopeless ones
+        failed = damping[active] > 1e16
+        active = active[~(converged[active] | failed)]
+
+    info = {"cost": cost, "nit": nit, "converged": converged}
+
+    return x, info
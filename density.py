@@ -0,0 +1,258 @@
+"""Nonparametric risk-neutral densities (Breeden and Litzenberger, 1978).
+
+The density is the second derivative of undiscounted call prices w.r.t.
+the strike. Volas are interpolated as in `VolatilitySmile.interpolate`:
+a cubic spline through the quotes, constant beyond them. The derivative
+is taken either analytically through the spline or by central second
+differences on a uniform grid of strikes, for many smiles at once.
+Working with forward prices, the density needs no discounting.
+"""
+import numpy as np
+from scipy.interpolate import CubicSpline
+
+from optools.pricing import bs_price
+from optools.helpers import interp_rows, spline_rows, fast_norm_pdf
+
+
+class RiskNeutralDensity:
+    """Risk-neutral density tabulated on a grid of strikes.
+
+    Between grid points the density is linear. Several densities, each on
+    its own grid, are stored as rows.
+
+    Parameters
+    ----------
+    strike : numpy.ndarray
+        (M,) or (N, M) grid(s), increasing
+    density : numpy.ndarray
+        (M,) or (N, M) non-negative densities at `strike`, integrating to 1
+    mass : float or numpy.ndarray, optional
+        probability mass before repair, (N,) if an array, for diagnostics
+
+    """
+    def __init__(self, strike, density, mass=None):
+        """
+        """
+        self.strike = np.asarray(strike, dtype=float)
+        self.density = np.asarray(density, dtype=float)
+        self.mass = mass
+
+        # cumulative trapezoid, exact for a piecewise linear density
+        d_cdf = 0.5 * (self.density[..., 1:] + self.density[..., :-1]) * \
+            np.diff(self.strike, axis=-1)
+        self.cdf_values = np.concatenate(
+            (np.zeros(d_cdf.shape[:-1] + (1, )), d_cdf.cumsum(axis=-1)),
+            axis=-1)
+
+    def _at(self, x, fp, left, right):
+        """Interpolate `fp` at `x`, one point per density if `x` is (N,)."""
+        x = np.asarray(x, dtype=float)
+
+        if self.strike.ndim > 1 and x.ndim < 2:
+            return interp_rows(x[..., np.newaxis], self.strike, fp,
+                               left=left, right=right)[..., 0]
+
+        return interp_rows(x, self.strike, fp, left=left, right=right)
+
+    def pdf(self, x):
+        """Evaluate the density, 0 beyond the grid.
+
+        Parameters
+        ----------
+        x : float or numpy.ndarray
+            points, (N,) for one point per density or (N, m)
+
+        Returns
+        -------
+        res : float or numpy.ndarray
+
+        """
+        return self._at(x, self.density, 0.0, 0.0)
+
+    def cdf(self, x):
+        """Evaluate the distribution function, 0 (1) below (above) the grid.
+        """
+        return self._at(x, self.cdf_values, 0.0, 1.0)
+
+    def quantile(self, p):
+        """Calculate quantiles by inverting the tabulated distribution.
+
+        Parameters
+        ----------
+        p : float or numpy.ndarray
+            probabilities, (N,) for one per density or (N, m)
+
+        Returns
+        -------
+        res : float or numpy.ndarray
+
+        """
+        p = np.asarray(p, dtype=float)
+
+        if self.strike.ndim > 1 and p.ndim < 2:
+            return interp_rows(p[..., np.newaxis], self.cdf_values,
+                               self.strike)[..., 0]
+
+        return interp_rows(p, self.cdf_values, self.strike)
+
+    def raw_moment(self, order):
+        """Calculate E[X^order] by the trapezoidal rule on the grid."""
+        return np.trapz(self.strike**order * self.density, self.strike,
+                        axis=-1)
+
+    def central_moment(self, order):
+        """Calculate E[(X - E[X])^order] by the trapezoidal rule."""
+        mean = np.asarray(self.raw_moment(1))[..., np.newaxis]
+
+        return np.trapz((self.strike - mean)**order * self.density,
+                        self.strike, axis=-1)
+
+    def moments(self):
+        """Calculate mean and variance."""
+        return self.raw_moment(1), self.central_moment(2)
+
+    def skewness(self):
+        """Calculate skewness."""
+        return self.central_moment(3) / self.central_moment(2)**1.5
+
+    def kurtosis(self):
+        """Calculate kurtosis (not in excess of 3)."""
+        return self.central_moment(4) / self.central_moment(2)**2
+
+
+def _spline_on_grid(vola, strike, grid, derivatives, bc_type="clamped",
+                    **kwargs):
+    """Evaluate the spline of volas (and its derivatives) with constant
+    extrapolation, all rows at once by `helpers.spline_rows`; row by row
+    with CubicSpline only for arguments beyond `bc_type`.
+
+    Returns
+    -------
+    res : list
+        of (N, n_points) arrays, one per order of derivative in
+        `derivatives`
+    """
+    k_lo, k_hi = strike[:, :1], strike[:, -1:]
+    x = np.clip(grid, k_lo, k_hi)
+    beyond = (grid < k_lo) | (grid > k_hi)
+
+    n_min = 4 if bc_type == "not-a-knot" else 2
+    if (len(kwargs) == 0) and (strike.shape[-1] >= n_min) and \
+            (bc_type in ("not-a-knot", "clamped", "natural")):
+        res = spline_rows(x, strike, vola, bc_type=bc_type,
+                          nu=tuple(derivatives))
+    else:
+        res = [np.empty(grid.shape) for _ in derivatives]
+        for p in range(len(vola)):
+            cs = CubicSpline(strike[p], vola[p], extrapolate=False,
+                             bc_type=bc_type, **kwargs)
+            for r, d in zip(res, derivatives):
+                r[p] = cs(x[p], d)
+
+    for r, d in zip(res, derivatives):
+        if d > 0:
+            r[beyond] = 0.0
+
+    return res
+
+
+def breeden_litzenberger(vola, strike, forward, tau, method="analytic",
+                         n_points=501, width=6.0, bc_type="clamped",
+                         **kwargs):
+    """Estimate risk-neutral densities from smiles of implied volas.
+
+    Parameters
+    ----------
+    vola : numpy.ndarray
+        (M,) or (N, M) volas, in (frac of 1) p.a.
+    strike : numpy.ndarray
+        (M,) or (N, M) strikes, increasing along rows
+    forward : float or numpy.ndarray
+        forward price(s), (N,) if an array
+    tau : float or numpy.ndarray
+        maturity(-ies), in years
+    method : str
+        'analytic' for the second derivative of the Black formula through
+        the spline of volas; 'fd' for central second differences of call
+        prices on the grid
+    n_points : int
+        number of points of the uniform grid of strikes
+    width : float
+        the grid spans the forward -/+ `width` times the highest total
+        vola of each smile, in logs
+    bc_type : str
+        boundary condition of the spline; the default 'clamped' makes the
+        smile smooth where the constant extrapolation starts, which keeps
+        the density free of point masses there; 'clamped', 'natural' and
+        'not-a-knot' splines of all smiles are fitted at once
+    **kwargs : any
+        additional arguments to scipy.interpolate.CubicSpline, which is
+        then fitted smile by smile
+
+    Returns
+    -------
+    res : RiskNeutralDensity
+        with (n_points,) or (N, n_points) grids; negative values (butterfly
+        arbitrage) are set to zero and the density rescaled to integrate to
+        one, with the mass before that stored in `mass`
+
+    """
+    vola = np.asarray(vola, dtype=float)
+    strike = np.asarray(strike, dtype=float)
+    one_smile = vola.ndim < 2
+
+    vola, strike = np.atleast_2d(vola), np.atleast_2d(strike)
+    forward, tau = [np.broadcast_to(np.asarray(p, dtype=float),
+                                    (len(vola), ))[:, np.newaxis]
+                    for p in (forward, tau)]
+
+    # uniform grid of strikes in each row
+    half = width * vola.max(axis=-1, keepdims=True) * np.sqrt(tau)
+    grid = np.exp(-half) + (np.exp(half) - np.exp(-half)) * \
+        np.linspace(0, 1, n_points)
+    grid = forward * grid
+
+    if method == "analytic":
+        vol, d_vol, d2_vol = _spline_on_grid(vola, strike, grid, (0, 1, 2),
+                                             bc_type=bc_type, **kwargs)
+
+        # d2c/dk2 = c_kk + 2 c_ks s' + c_ss s'^2 + c_s s'', greeks of the
+        #   undiscounted black formula w.r.t. strike k and vola s
+        sqrt_tau = np.sqrt(tau)
+        v = vol * sqrt_tau
+        d1 = (np.log(forward / grid) + 0.5 * v * v) / v
+        d2 = d1 - v
+        n_d2 = fast_norm_pdf(d2)
+
+        c_kk = n_d2 / (grid * v)
+        c_ks = n_d2 * d1 / vol
+        c_s = grid * n_d2 * sqrt_tau
+        c_ss = c_s * d1 * d2 / vol
+
+        density = c_kk + 2 * c_ks * d_vol + c_ss * d_vol * d_vol + \
+            c_s * d2_vol
+
+    elif method == "fd":
+        vol, = _spline_on_grid(vola, strike, grid, (0, ), bc_type=bc_type,
+                               **kwargs)
+        call_p = bs_price(grid, 0.0, tau, vol, forward=forward)
+
+        d_strike = grid[:, 1:2] - grid[:, :1]
+        density = np.empty(grid.shape)
+        density[:, 1:-1] = (call_p[:, 2:] - 2 * call_p[:, 1:-1] +
+                            call_p[:, :-2]) / d_strike**2
+        density[:, [0, -1]] = density[:, [1, -2]]
+
+    else:
+        raise ValueError("Differentiation method {} not implemented, use "
+                         "'analytic' or 'fd'!".format(method))
+
+    # repair: no negative probabilities, total mass of one
+    mass = np.trapz(density, grid, axis=-1)
+    density = np.maximum(density, 0.0)
+    density = density / np.trapz(density, grid, axis=-1)[:, np.newaxis]
+
+    if one_smile:
+        return RiskNeutralDensity(grid[0], density[0], mass[0])
+
+    return RiskNeutralDensity(grid, density, mass)
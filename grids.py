@@ -0,0 +1,333 @@
+"""Grids of strikes for integrating over smiles.
+
+Grids are built in standardized log-moneyness z = ln(K/F) / (s*sqrt(tau)),
+with s the highest quoted vola, and mapped back to strikes. Breakpoints are
+the forward (where the integrand of the mfiv has a kink) and the outermost
+quotes (where the constant extrapolation starts); between the quotes points
+are dense, in the flat wings sparser. The step for a target tolerance on
+the mfiv is found once, on a flat smile for which the mfiv is known
+exactly, and cached; so is everything else that does not depend on the
+smile itself.
+
+Policies:
+- 'uniform': `helpers.strike_range`, kept for comparison;
+- 'adaptive': uniform steps in z on each segment, with an even number of
+  intervals each, so that Simpson's rule never straddles a breakpoint;
+- 'gauss': Gauss-Legendre nodes on each segment, to be integrated with the
+  weights returned along.
+"""
+import numpy as np
+import warnings
+from functools import lru_cache
+from scipy.special import ndtri
+
+from optools.helpers import strike_range
+from optools.pricing import bs_price, mfivariance
+from optools.quadrature import gauss_legendre, get_weights
+
+grid_policies = ("uniform", "adaptive", "gauss")
+
+
+@lru_cache(maxsize=256)
+def _unit_nodes(policy, n):
+    """Nodes and weights on [0, 1] of a segment with `n` intervals (n + 1
+    points) or `n` Gauss nodes, read-only."""
+    if policy == "adaptive":
+        nodes = np.linspace(0, 1, n + 1)
+        weights = get_weights(nodes, rule="simpson")
+    else:
+        nodes, weights = gauss_legendre(n, 0.0, 1.0)
+        weights.setflags(write=False)
+
+    nodes.setflags(write=False)
+
+    return nodes, weights
+
+
+def _segment_counts(breaks, step, policy, wing_ratio, z_lo, z_hi):
+    """Number of intervals (or nodes) of each segment between `breaks`.
+
+    Vectorized: (..., K) breaks with (...) steps and quotes give (..., K-1)
+    counts.
+    """
+    breaks = np.asarray(breaks, dtype=float)
+    a, b = breaks[..., :-1], breaks[..., 1:]
+    step, z_lo, z_hi = [np.asarray(p, dtype=float)[..., np.newaxis]
+                        for p in (step, z_lo, z_hi)]
+
+    quoted = (a >= z_lo - 1e-12) & (b <= z_hi + 1e-12)
+    h = np.where(quoted, step, step * wing_ratio)
+
+    if policy == "adaptive":
+        # an even number of intervals, at least two
+        res = np.maximum(2, 2 * np.ceil((b - a) / (2 * h)).astype(int))
+    else:
+        res = np.maximum(2, np.ceil((b - a) / h).astype(int))
+
+    return res
+
+
+def _grid_from_counts(breaks, counts, policy):
+    """Grids and weights in z over segments between rows of (N, K)
+    `breaks`, with the same (K-1,) `counts` for all rows."""
+    nodes, weights = [], []
+
+    for p, n in enumerate(counts):
+        a, b = breaks[:, [p]], breaks[:, [p + 1]]
+        t, w = _unit_nodes(policy, int(n))
+        nodes.append(a + (b - a) * t)
+        weights.append((b - a) * w)
+
+    if policy == "adaptive":
+        # segments share their endpoints
+        nodes = [nodes[0]] + [x[:, 1:] for x in nodes[1:]]
+        for p in range(1, len(weights)):
+            weights[p - 1][:, -1] += weights[p][:, 0]
+        weights = [weights[0]] + [w[:, 1:] for w in weights[1:]]
+
+    return np.hstack(nodes), np.hstack(weights)
+
+
+def _standard_grid(breaks, step, policy, wing_ratio, z_lo, z_hi):
+    """Grid and weights in z over segments between `breaks`."""
+    counts = _segment_counts(breaks, step, policy, wing_ratio, z_lo, z_hi)
+    nodes, weights = _grid_from_counts(np.asarray(breaks)[np.newaxis],
+                                       counts, policy)
+
+    return nodes[0], weights[0]
+
+
+def _breaks(z_lo, z_hi, width):
+    """Breakpoints: wing ends, outermost quotes and the forward."""
+    res = np.unique(np.clip([-width, z_lo, 0.0, z_hi, width], -width, width))
+
+    return res
+
+
+def default_width(tol):
+    """Half-width of grids in z such that the truncated tails of a
+    lognormal weigh less than `tol`."""
+    return -ndtri(tol) + 1.0
+
+
+@lru_cache(maxsize=256)
+def grid_step(tol, total_vola, policy="adaptive", wing_ratio=4.0,
+              width=None, max_iter=16):
+    """Find the largest step in z integrating a flat smile within `tol`.
+
+    The step is halved until the mfiv of a flat smile with total vola
+    `total_vola` (vola times the square root of maturity), which equals
+    total_vola^2 exactly, is matched to a relative `tol`. Cached: the step
+    depends on the smile only through its total vola, best rounded.
+
+    If `tol` is not met after `max_iter` halvings, e.g. because it is below
+    the rounding error of the mfiv, the smallest step is returned with a
+    warning, issued once, when the step is first computed.
+
+    Parameters
+    ----------
+    tol : float
+        relative tolerance on the mfiv
+    total_vola : float
+        vola times square root of maturity
+    policy : str
+        'adaptive' or 'gauss'
+    wing_ratio : float
+        steps in the wings relative to those between the quotes
+    width : float, optional
+        half-width of the grid in z, `default_width(tol)` by default
+    max_iter : int
+        maximum number of halvings of the step, starting from 0.5
+
+    Returns
+    -------
+    res : float
+
+    """
+    if width is None:
+        width = default_width(tol)
+
+    # quotes at -/+ one standard deviation, as a typical smile
+    z_lo, z_hi = -1.0, 1.0
+    breaks = _breaks(z_lo, z_hi, width)
+
+    step = 1.0
+    for _ in range(max_iter):
+        step /= 2
+
+        z, w = _standard_grid(breaks, step, policy, wing_ratio, z_lo, z_hi)
+        strike = np.exp(z * total_vola)
+        call_p = bs_price(strike, 0.0, 1.0, total_vola, forward=1.0)
+        mfiv = mfivariance(call_p, strike, 1.0, 0.0, 1.0,
+                           weights=w * strike * total_vola)
+
+        err = abs(mfiv / total_vola**2 - 1)
+        if err < tol:
+            break
+    else:
+        warnings.warn("Tolerance {:.1e} not met by a step of {:.1e}, the "
+                      "smallest tried: relative error {:.1e}."
+                      .format(tol, step, err))
+
+    return step
+
+
+def strike_grid(strike, forward, vola, tau, policy="adaptive", tol=1e-6,
+                wing_ratio=4.0, width=None, return_weights=False):
+    """Construct a grid of strikes to evaluate a smile at for integration.
+
+    Parameters
+    ----------
+    strike : numpy.ndarray
+        quoted strikes
+    forward : float
+        forward price
+    vola : float or numpy.ndarray
+        quoted volas, the highest sets the scale of the grid
+    tau : float
+        maturity, in years
+    policy : str
+        'uniform', 'adaptive' or 'gauss', see module docstring
+    tol : float
+        relative tolerance on the mfiv, sets the step and the width
+    wing_ratio : float
+        steps in the flat wings relative to those between the quotes
+    width : float, optional
+        half-width of the grid in standard deviations of log-moneyness,
+        `default_width(tol)` by default
+    return_weights : bool
+        True to also return quadrature weights over the grid
+
+    Returns
+    -------
+    res : numpy.ndarray
+        sorted strikes
+    weights : numpy.ndarray
+        quadrature weights over `res`, only if `return_weights`; for
+        'adaptive' and 'uniform' these are Simpson's, for 'gauss'
+        Gauss-Legendre ones, to pass to `mfivariance(weights=...)`
+
+    """
+    strike = np.asarray(strike, dtype=float)
+
+    if policy == "uniform":
+        res = strike_range(strike)
+        if return_weights:
+            return res, get_weights(res, rule="simpson")
+        return res
+
+    if policy not in grid_policies:
+        raise ValueError("Grid policy {} not implemented, use one of {}!"
+                         .format(policy, list(grid_policies)))
+
+    if width is None:
+        width = default_width(tol)
+
+    # rounded, to reuse cached steps
+    total_vola = np.nanmax(vola) * np.sqrt(tau)
+    step = grid_step(tol, float("{:.2g}".format(total_vola)), policy,
+                     wing_ratio, width)
+
+    z_lo = np.log(strike.min() / forward) / total_vola
+    z_hi = np.log(strike.max() / forward) / total_vola
+
+    z, w = _standard_grid(_breaks(z_lo, z_hi, width), step, policy,
+                          wing_ratio, z_lo, z_hi)
+
+    res = forward * np.exp(z * total_vola)
+
+    if return_weights:
+        return res, w * res * total_vola
+
+    return res
+
+
+def strike_grids(strike, forward, vola, tau, policy="adaptive", tol=1e-6,
+                 wing_ratio=4.0, width=None):
+    """Construct the grids of `strike_grid` for many smiles at once.
+
+    Smiles whose grids have equally many points in each segment share the
+    unit nodes and are mapped to strikes together, one (n, M) array per
+    group; the rare smile with a quote beyond the width of the grid or at
+    the forward is done on its own.
+
+    Parameters
+    ----------
+    strike : numpy.ndarray
+        (N, m) sorted quoted strikes, without nan
+    forward : numpy.ndarray
+        (N,) forward prices
+    vola : numpy.ndarray
+        (N, m) quoted volas
+    tau : float or numpy.ndarray
+        maturity, in years
+    policy : str
+        'adaptive' or 'gauss', see `strike_grid`
+    tol : float
+    wing_ratio : float
+    width : float, optional
+        as in `strike_grid`
+
+    Returns
+    -------
+    res : list
+        of (rows, grids, weights) tuples, where `rows` are integer indexes
+        of rows and `grids` and `weights` are (n, M) arrays, as from
+        `strike_grid(..., return_weights=True)` row by row
+
+    """
+    if policy not in grid_policies[1:]:
+        raise ValueError("Grid policy {} not implemented, use one of {}!"
+                         .format(policy, list(grid_policies[1:])))
+
+    strike = np.asarray(strike, dtype=float)
+    vola = np.asarray(vola, dtype=float)
+    forward = np.asarray(forward, dtype=float)
+    tau = np.broadcast_to(np.asarray(tau, dtype=float), forward.shape)
+
+    if width is None:
+        width = default_width(tol)
+
+    total_vola = np.nanmax(vola, axis=1) * np.sqrt(tau)
+
+    # one cached step per rounded total vola
+    rounded = np.array(["{:.2g}".format(v) for v in total_vola], dtype=float)
+    steps = {v: grid_step(tol, v, policy, wing_ratio, width)
+             for v in np.unique(rounded)}
+    step = np.array([steps[v] for v in rounded])
+
+    z_lo = np.log(strike[:, 0] / forward) / total_vola
+    z_hi = np.log(strike[:, -1] / forward) / total_vola
+
+    breaks = np.sort(np.clip(
+        np.column_stack((np.full_like(z_lo, -width), z_lo,
+                         np.zeros_like(z_lo), z_hi,
+                         np.full_like(z_lo, width))),
+        -width, width), axis=1)
+    distinct = (np.diff(breaks, axis=1) > 0).all(axis=1)
+
+    counts = _segment_counts(breaks, step, policy, wing_ratio, z_lo, z_hi)
+
+    res = list()
+
+    # rows with equal counts
+    idx = np.flatnonzero(distinct)
+    uniq, inv = np.unique(counts[idx], axis=0, return_inverse=True)
+
+    for p, c in enumerate(uniq):
+        rows = idx[inv.ravel() == p]
+        z, w = _grid_from_counts(breaks[rows], c, policy)
+
+        tv = total_vola[rows, np.newaxis]
+        grids = forward[rows, np.newaxis] * np.exp(z * tv)
+
+        res.append((rows, grids, w * grids * tv))
+
+    # the rest, one by one
+    for p in np.flatnonzero(~distinct):
+        grid, w = strike_grid(strike[p], forward[p], vola[p], tau[p],
+                              policy=policy, tol=tol, wing_ratio=wing_ratio,
+                              width=width, return_weights=True)
+        res.append((np.array([p]), grid[np.newaxis], w[np.newaxis]))
+
+    return res
@@ -18,6 +18,20 @@ def fast_norm_cdf(x):
     return res
 
 
+def fast_norm_pdf(x):
+    """Calculate normal pdf.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+
+    Avoids the overhead of scipy.stats.norm
+    """
+    res = np.exp(-x * x / 2) / np.sqrt(2 * np.pi)
+
+    return res
+
+
 def maturity_float_to_str(mat):
     """
 
@@ -134,4 +148,177 @@ def ndays_from_dateoffset(t, dateoffset):
     res = len(pd.date_range(t, BDay().rollforward(t + dateoffset),
                             freq='B')) - 1
 
-    return res
\ No newline at end of file
+    return res
+
+
+def interp_rows(x, xp, fp, left=None, right=None):
+    """Interpolate linearly along the last axis, each row on its own grid.
+
+    Same as numpy.interp applied row by row, but with one sorted search
+    over all rows: each row of the grid and of the points is shifted past
+    the previous one.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        (..., m) points
+    xp : numpy.ndarray
+        (..., n) grids, increasing along the last axis
+    fp : numpy.ndarray
+        (..., n) values at `xp`
+    left, right : float, optional
+        values for points below (above) the grid; the end values by default
+
+    Returns
+    -------
+    res : numpy.ndarray
+        (..., m) interpolated values, with the batch dimensions of `x` and
+        `xp` broadcast
+
+    """
+    x = np.asarray(x, dtype=float)
+    xp = np.asarray(xp, dtype=float)
+    fp = np.asarray(fp, dtype=float)
+
+    if xp.ndim < 2:
+        return np.interp(x, xp, fp, left=left, right=right)
+
+    batch = np.broadcast_shapes(x.shape[:-1], xp.shape[:-1])
+    n = xp.shape[-1]
+
+    x_ = np.broadcast_to(x, batch + x.shape[-1:]).reshape(-1, x.shape[-1])
+    xp_ = np.broadcast_to(xp, batch + (n, )).reshape(-1, n)
+    fp_ = np.broadcast_to(fp, batch + (n, )).reshape(-1, n)
+
+    # rows start at 0 and are at most `width` long
+    start = xp_[:, :1]
+    width = (xp_[:, -1:] - start).max() + 1.0
+    shift = width * np.arange(len(xp_))[:, np.newaxis]
+
+    x_clipped = np.clip(x_, start, xp_[:, -1:])
+    idx = np.searchsorted((xp_ - start + shift).ravel(),
+                          (x_clipped - start + shift).ravel())
+    idx = idx.reshape(x_.shape) - n * np.arange(len(xp_))[:, np.newaxis]
+    idx = np.clip(idx, 1, n - 1)
+
+    x0, x1 = [np.take_along_axis(xp_, i, axis=-1) for i in (idx - 1, idx)]
+    f0, f1 = [np.take_along_axis(fp_, i, axis=-1) for i in (idx - 1, idx)]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        res = np.where(x1 > x0, f0 + (f1 - f0) * (x_clipped - x0) / (x1 - x0),
+                       f1)
+
+    if left is not None:
+        res = np.where(x_ < xp_[:, :1], left, res)
+    if right is not None:
+        res = np.where(x_ > xp_[:, -1:], right, res)
+
+    return res.reshape(batch + x.shape[-1:])
+
+
+def spline_rows(x, xp, fp, bc_type="not-a-knot", nu=0):
+    """Interpolate with cubic splines, each row on its own grid.
+
+    Same as scipy.interpolate.CubicSpline(xp, fp, bc_type=bc_type)(x, nu)
+    row by row, for points within the grids: the slopes at the knots of all
+    rows come from one stacked solve.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        (N, M) points, within the grids
+    xp : numpy.ndarray
+        (N, n) grids, increasing along the last axis, with n >= 4 for
+        'not-a-knot' and n >= 2 otherwise
+    fp : numpy.ndarray
+        (N, n) values at `xp`
+    bc_type : str
+        'not-a-knot', 'clamped' (zero first derivatives at the ends) or
+        'natural' (zero second derivatives at the ends)
+    nu : int or tuple
+        order of derivative to evaluate, 0 to 2; a tuple of orders gives a
+        list of arrays
+
+    Returns
+    -------
+    res : numpy.ndarray or list
+        (N, M) interpolated values (or derivatives)
+
+    """
+    x = np.asarray(x, dtype=float)
+    xp = np.asarray(xp, dtype=float)
+    fp = np.asarray(fp, dtype=float)
+
+    n_rows, n = xp.shape
+
+    if bc_type not in ("not-a-knot", "clamped", "natural"):
+        raise ValueError("Boundary condition {} not implemented!"
+                         .format(bc_type))
+    if n < (4 if bc_type == "not-a-knot" else 2):
+        raise ValueError("Too few knots for boundary condition {}!"
+                         .format(bc_type))
+
+    dx = np.diff(xp, axis=-1)
+    slope = np.diff(fp, axis=-1) / dx
+
+    # tridiagonal system for the slopes at the knots, as in CubicSpline
+    a = np.zeros((n_rows, n, n))
+    b = np.empty((n_rows, n))
+    i = np.arange(1, n - 1)
+
+    a[:, i, i] = 2 * (dx[:, :-1] + dx[:, 1:])
+    a[:, i, i + 1] = dx[:, :-1]
+    a[:, i, i - 1] = dx[:, 1:]
+    b[:, 1:-1] = 3 * (dx[:, 1:] * slope[:, :-1] + dx[:, :-1] * slope[:, 1:])
+
+    if bc_type == "not-a-knot":
+        d = xp[:, 2] - xp[:, 0]
+        a[:, 0, 0] = dx[:, 1]
+        a[:, 0, 1] = d
+        b[:, 0] = ((dx[:, 0] + 2 * d) * dx[:, 1] * slope[:, 0] +
+                   dx[:, 0] ** 2 * slope[:, 1]) / d
+
+        d = xp[:, -1] - xp[:, -3]
+        a[:, -1, -1] = dx[:, -2]
+        a[:, -1, -2] = d
+        b[:, -1] = (dx[:, -1] ** 2 * slope[:, -2] +
+                    (2 * d + dx[:, -1]) * dx[:, -2] * slope[:, -1]) / d
+
+    elif bc_type == "clamped":
+        a[:, 0, 0] = a[:, -1, -1] = 1.0
+        b[:, 0] = b[:, -1] = 0.0
+
+    else:
+        a[:, 0, 0] = a[:, -1, -1] = 2.0
+        a[:, 0, 1] = a[:, -1, -2] = 1.0
+        b[:, 0] = 3 * slope[:, 0]
+        b[:, -1] = 3 * slope[:, -1]
+
+    s = np.linalg.solve(a, b[..., np.newaxis])[..., 0]
+
+    # cubic hermite pieces, evaluated in the interval of each point
+    idx = (x[..., np.newaxis] >= xp[:, np.newaxis, 1:-1]).sum(axis=-1)
+
+    def take(arr):
+        return np.take_along_axis(arr, idx, axis=-1)
+
+    h = x - take(xp[:, :-1])
+    dx_, m_ = take(dx), take(slope)
+    s0, s1 = take(s[:, :-1]), take(s[:, 1:])
+
+    c0 = (s0 + s1 - 2 * m_) / dx_ ** 2
+    c1 = (3 * m_ - 2 * s0 - s1) / dx_
+
+    def evaluate(order):
+        if order == 0:
+            return ((c0 * h + c1) * h + s0) * h + take(fp[:, :-1])
+        if order == 1:
+            return (3 * c0 * h + 2 * c1) * h + s0
+        if order == 2:
+            return 6 * c0 * h + 2 * c1
+        raise ValueError("Derivatives up to the second only!")
+
+    if isinstance(nu, (tuple, list)):
+        return [evaluate(p) for p in nu]
+
+    return evaluate(nu)
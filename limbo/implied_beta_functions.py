@@ -84,8 +84,22 @@ class ImpliedBetaEnvironment():
 
         return data.loc[s_dt:e_dt,cols]
 
-    def get_mfiv(self):
-        """
+    def _moments_by_file(self, what, chunksize=1000, n_jobs=None):
+        """Calculate model-free moments for each file with raw data.
+
+        Parameters
+        ----------
+        what : str
+            'mfiv', 'svix' or 'mfiskewness'
+        chunksize : int
+            number of rows per block
+        n_jobs : int
+            number of processes, see wrap.wrapper_moments_parallel
+
+        Returns
+        -------
+        res : pandas.DataFrame
+            of moments, one column per currency pair
         """
         # interest rates
         ir_name = import_rf_bloomi(
@@ -95,12 +109,16 @@ class ImpliedBetaEnvironment():
         files = list(filter(lambda x: x.endswith("deriv.xlsx"),
             os.listdir(self.path_to_raw)))
 
-        mfiv = pd.DataFrame()
+        # from the names of import_data to those of pricing_wrappers
+        rename_dict = {"rr25d": "25rr", "rr10d": "10rr", "bf25d": "25bf",
+                       "bf10d": "10bf", "atm": "atm_vola", "s": "spot",
+                       "f": "forward", "y": "div_yield"}
+
+        # one file at a time, only its moments are kept
+        res = dict()
 
         for filename in files:
             # collect data from .xlsx file
-            # filename = files[17]
-            # filename = 'usdjpy_fx_deriv.xlsx'
             data_for_est = import_data(
                 data_path=self.path_to_raw,
                 filename=filename,
@@ -110,115 +128,37 @@ class ImpliedBetaEnvironment():
             if data_for_est.empty:
                 continue
 
-            this_mfiv = pd.Series(index=data_for_est.index)
-            for idx, row in data_for_est.iterrows():
-                # idx, row = list(data_for_est.iterrows())[-528]
-                # fetch wings
-                deltas, ivs = op.get_wings(
-                    row["rr25d"],
-                    row["rr10d"],
-                    row["bf25d"],
-                    row["bf10d"],
-                    row["atm"],
-                    row["y"],
-                    self.tau)
-
-                # to strikes
-                K = op.strike_from_delta(
-                    deltas,
-                    row["s"],
-                    row["rf"],
-                    row["y"],
-                    self.tau,
-                    ivs,
-                    True)
-
-                # concat to pandas object
-                vol_surf = pd.DataFrame(
-                    data=np.vstack((K,ivs)).T,
-                    columns=["K","iv"])
-
-                # transform & integrate
-                res = op.mfiv_wrapper(
-                    vol_surf,row["f"],row["rf"],self.tau,"spline")
-                this_mfiv[idx] = res
-
-            mfiv[filename[:6]] = this_mfiv
+            # blocks of this file over a pool of processes
+            moments = wrap.wrapper_moments_parallel(
+                data_for_est.rename(columns=rename_dict), self.tau,
+                chunksize=chunksize, n_jobs=n_jobs)
 
-        self._store_to_hdf({"variances": mfiv})
+            res[filename[:6]] = moments[what]
 
-        with pd.HDFStore(path_out+"mfiv_"+self.tau_str+".h5", mode='w') \
-            as hangar:
-                hangar.put("variances", mfiv)
+        res = pd.DataFrame(res)
 
-    def get_mfis(self):
+        return res
+
+    def get_mfiv(self):
         """
         """
-        # interest rates
-        ir_name = import_rf_bloomi(
-            self.path_to_raw+"ir_bloomi.xlsx", self.tau_str)
-
-        # fetch all files with raw data
-        files = list(filter(lambda x: x.endswith("deriv.xlsx"),
-            os.listdir(self.path_to_raw)))
+        mfiv = self._moments_by_file("mfiv")
 
-        mfis = pd.DataFrame()
-
-        for filename in files:
-            # ipdb.set_trace()
-            # collect data from .xlsx file
-            # filename = files[17]
-            # filename = 'usdjpy_fx_deriv.xlsx'
-            data_for_est = import_data(
-                data_path=self.path_to_raw,
-                filename=filename,
-                tau_str=self.tau_str,
-                ir_name=ir_name)
+        self._store_to_hdf({"variances": mfiv})
 
-            if data_for_est.empty:
-                continue
+        with pd.HDFStore(self.path_to_data+"mfiv_"+self.tau_str+".h5",
+            mode='w') as hangar:
+                hangar.put("variances", mfiv)
 
-            this_mfis = pd.Series(index=data_for_est.index)
-            for idx, row in data_for_est.iterrows():
-                # idx, row = list(data_for_est.iterrows())[-528]
-                # fetch wings
-                deltas, ivs = op.get_wings(
-                    row["rr25d"],
-                    row["rr10d"],
-                    row["bf25d"],
-                    row["bf10d"],
-                    row["atm"],
-                    row["y"],
-                    self.tau)
-
-                # to strikes
-                K = op.strike_from_delta(
-                    deltas,
-                    row["s"],
-                    row["rf"],
-                    row["y"],
-                    self.tau,
-                    ivs,
-                    True)
-
-                # concat to pandas object
-                vol_surf = pd.DataFrame(
-                    data=np.vstack((K,ivs)).T,
-                    columns=["K","iv"])
-
-                # transform & integrate
-                res = op.mfiskew_wrapper(
-                    vol_surf, row["f"], row["rf"], self.tau, row["s"],
-                    method="spline")
-
-                this_mfis[idx] = res
-
-            mfis[filename[:6]] = this_mfis
+    def get_mfis(self):
+        """
+        """
+        mfis = self._moments_by_file("mfiskewness")
 
         self._store_to_hdf({"skewness": mfis})
 
-        with pd.HDFStore(self.path_to_data+"mfis_"+self.tau_str+".h5", mode='a') \
-            as hangar:
+        with pd.HDFStore(self.path_to_data+"mfis_"+self.tau_str+".h5",
+            mode='a') as hangar:
                 hangar.put("skewness", mfis)
 
     def get_covariances(self):
@@ -0,0 +1,492 @@
+# mixture of n log-normals
+import pandas as pd
+import numpy as np
+from scipy.special import ndtr, ndtri, comb
+
+from optools.helpers import interp_rows
+
+class lognormal_mixture():
+    """ Mixture of log-normals
+
+    Parameters
+    ----------
+    mu: numpy.ndarray
+        of means of normal variables that underlie log-normals, (K,) or
+        (..., K) for several mixtures at once
+    sigma: numpy.ndarray
+        of st. dev's of normal variables that underlie log-normals
+    wght: numpy.ndarray
+        of weights of each component
+    """
+    # attributes cached results depend on
+    _param_attrs = ("mu", "sigma", "wght")
+
+    def __init__(self, mu, sigma, wght):
+        """
+        """
+        mu, sigma, wght = [np.asarray(p, dtype=float)
+                           for p in (mu, sigma, wght)]
+
+        assert all([p.shape == wght.shape for p in [mu, sigma]])
+
+        self.mu = mu
+        self.sigma = sigma
+        self.wght = wght
+
+    def __setattr__(self, name, value):
+        """Set attribute, invalidating cached moments and tables if needed."""
+        object.__setattr__(self, name, value)
+
+        if name in self._param_attrs:
+            object.__setattr__(self, "_moments", dict())
+            object.__setattr__(self, "_cdf_tables", dict())
+
+    def _cached(self, key, fun):
+        """Return fun() from the cache of moments, calculating it once."""
+        if key not in self._moments:
+            res = fun()
+            if isinstance(res, np.ndarray):
+                res.setflags(write=False)
+            self._moments[key] = res
+
+        return self._moments[key]
+
+    def _truncated_raw_moment(self, order, log, threshold=None, upper=False):
+        """Calculate E[Y^order 1{Y < c}] (or > c) for Y = X or Y = ln(X).
+
+        Without `threshold`, the full raw moment E[Y^order].
+        """
+        zero = np.float64(0.0)
+
+        res = 0.0
+        for w, m, s in self._components(zero):
+            if not log:
+                # E[X^j] of a log-normal, times P(ln X < c - j s^2)
+                res_k = np.exp(order * m + 0.5 * order * order * s * s)
+                if threshold is not None:
+                    d = (np.log(threshold) - m - order * s * s) / s
+                    res_k = res_k * ndtr(-d if upper else d)
+            elif threshold is None:
+                # moments of a normal: m_j = m m_{j-1} + (j-1) s^2 m_{j-2}
+                prev, res_k = 0.0, 1.0
+                for j in range(1, order + 1):
+                    prev, res_k = res_k, m * res_k + (j - 1) * s * s * prev
+            else:
+                # same for a truncated normal, with a boundary term
+                c = np.log(threshold)
+                d = (c - m) / s
+                phi = np.exp(-0.5 * d * d) / np.sqrt(2 * np.pi)
+                sign = 1 if upper else -1
+                prev, res_k = 0.0, ndtr(-d if upper else d)
+                for j in range(1, order + 1):
+                    prev, res_k = res_k, m * res_k + \
+                        (j - 1) * s * s * prev + sign * s * c**(j - 1) * phi
+
+            res = res + w * res_k
+
+        return res
+
+    def raw_moment(self, order, log=False):
+        """Compute the raw moment E[X^order] or E[ln(X)^order].
+
+        Parameters
+        ----------
+        order : int
+            order of the moment
+        log : bool
+            True for moments of ln(X)
+
+        Returns
+        -------
+        res : float or numpy.ndarray
+            (...,) for batched parameters of shape (..., K)
+
+        """
+        return self._cached(
+            ("raw", order, log),
+            lambda: self._truncated_raw_moment(order, log))
+
+    def central_moment(self, order, log=False):
+        """Compute the central moment E[(X - E[X])^order], or of ln(X).
+
+        Parameters
+        ----------
+        order : int
+            order of the moment
+        log : bool
+            True for moments of ln(X)
+
+        Returns
+        -------
+        res : float or numpy.ndarray
+            (...,) for batched parameters of shape (..., K)
+
+        """
+        def fun():
+            mean = self.raw_moment(1, log)
+            return sum(comb(order, j) * self.raw_moment(j, log) *
+                       (-mean)**(order - j) for j in range(order + 1))
+
+        return self._cached(("central", order, log), fun)
+
+    def skewness(self, log=False):
+        """Compute the skewness of X, or of ln(X).
+
+        The skewness of ln(X) is that of log returns, as estimated
+        model-free by `pricing.mfiskewness`.
+        """
+        return self.central_moment(3, log) / self.central_moment(2, log)**1.5
+
+    def kurtosis(self, log=False):
+        """Compute the kurtosis (not in excess of 3) of X, or of ln(X)."""
+        return self.central_moment(4, log) / self.central_moment(2, log)**2
+
+    def partial_moment(self, order, threshold=None, upper=False, log=False):
+        """Compute the lower or upper partial moment around a threshold.
+
+        The lower one is E[(k - X)^order 1{X < k}], the upper one is
+        E[(X - k)^order 1{X > k}]; with `log`, X and k are replaced by their
+        logs.
+
+        Parameters
+        ----------
+        order : int
+            order of the moment
+        threshold : float or numpy.ndarray, optional
+            threshold k, (...,) for batched parameters; the forward price
+            E[X] by default, in which case the result is cached
+        upper : bool
+            True for the upper partial moment
+        log : bool
+            True for partial moments of ln(X)
+
+        Returns
+        -------
+        res : float or numpy.ndarray
+            (...,) for batched parameters of shape (..., K)
+
+        """
+        def fun(k):
+            k_ = np.log(k) if log else k
+            sign = 1 if upper else -1
+            return sum(comb(order, j) * (-sign * k_)**(order - j) *
+                       sign**j *
+                       self._truncated_raw_moment(j, log, k, upper)
+                       for j in range(order + 1))
+
+        if threshold is not None:
+            return fun(np.asarray(threshold, dtype=float))
+
+        return self._cached(("partial", order, upper, log),
+                            lambda: fun(self.raw_moment(1)))
+
+    def semivariance(self, threshold=None, upper=False, log=False):
+        """Compute the down- (or up-)side semivariance around a threshold.
+
+        Same as `partial_moment` of order 2.
+        """
+        return self.partial_moment(2, threshold, upper, log)
+
+    def mfisemivariance(self):
+        """Compute the down- and upside parts of the implied variance.
+
+        The analytic counterpart of `VolatilitySmile.get_mfisemivariance`
+        with the maturity set to 1: twice the expectation of
+        ln(F/X) + X/F - 1, the payoff of the portfolio of puts (calls) with
+        strikes below (above) the forward F = E[X], for X below (above) F.
+
+        Returns
+        -------
+        down, up : float or numpy.ndarray
+            (...,) for batched parameters of shape (..., K)
+
+        """
+        def fun(upper):
+            f = self.raw_moment(1)
+            prob = self._truncated_raw_moment(0, False, f, upper)
+            return 2 * (np.log(f) * prob -
+                        self._truncated_raw_moment(1, True, f, upper) +
+                        self._truncated_raw_moment(1, False, f, upper) / f -
+                        prob)
+
+        return tuple(self._cached(("mfisemivariance", upper),
+                                  lambda: fun(upper))
+                     for upper in (False, True))
+
+    def moments(self):
+        """ Compute mean and variance of X ~ lnmix
+        """
+        return self.raw_moment(1), self.central_moment(2)
+
+    def moments_of_log(self):
+        """ Compute mean and variance of ln(X) when X ~ lnmix
+        """
+        return self.raw_moment(1, log=True), self.central_moment(2, log=True)
+
+    def _components(self, x):
+        """Iterate over weights, means and st. dev's aligned with `x`.
+
+        Parameters of batched mixtures, (..., K), get an axis inserted
+        before the last one unless `x` is a scalar, so that (..., M) points
+        broadcast against them.
+        """
+        for k in range(self.wght.shape[-1]):
+            w, m, s = [p[..., k] for p in (self.wght, self.mu, self.sigma)]
+
+            if x.ndim > 0:
+                w, m, s = [np.asarray(p)[..., np.newaxis] for p in (w, m, s)]
+
+            yield w, m, s
+
+    def logpdf(self, x):
+        """Compute the log of the PDF of the mixture of log-normals.
+
+        Components are added up in logs, which is stable far in the tails,
+        where the PDF itself underflows.
+
+        Parameters
+        ----------
+        x : float or numpy.ndarray
+            points, any shape for one mixture; (..., M) for batched
+            parameters of shape (..., K)
+
+        Returns
+        -------
+        res : float or numpy.ndarray
+            of log-densities, of the broadcast shape of `x` and the
+            parameters without their last axis; -inf at non-positive points
+
+        """
+        x = np.asarray(x, dtype=float)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_x = np.log(np.where(x > 0, x, 0.0))
+
+        res = -np.inf
+        with np.errstate(invalid="ignore"):
+            for w, m, s in self._components(x):
+                arg = (log_x - m) / s
+                res = np.logaddexp(
+                    res, np.log(w / (s * np.sqrt(2 * np.pi))) - log_x -
+                    0.5 * arg * arg)
+
+        res = np.where(x > 0, res, -np.inf)
+
+        return res[()]
+
+    def pdf(self, x):
+        """Compute the PDF of the mixture of log-normals.
+
+        Parameters
+        ----------
+        x : float or numpy.ndarray
+            points, any shape for one mixture; (..., M) for batched
+            parameters of shape (..., K)
+
+        Returns
+        -------
+        res : float or numpy.ndarray
+            of densities, of the broadcast shape of `x` and the parameters
+            without their last axis
+
+        """
+        x = np.asarray(x, dtype=float)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_x = np.log(np.where(x > 0, x, 0.0))
+
+        res = 0.0
+        for w, m, s in self._components(x):
+            arg = (log_x - m) / s
+            res = res + w / (s * np.sqrt(2 * np.pi)) * np.exp(-0.5 * arg * arg)
+
+        # the 1/x is common to all components
+        with np.errstate(divide="ignore", invalid="ignore"):
+            res = np.where(x > 0, res / x, 0.0)
+
+        return res[()]
+
+    def cdf(self, x):
+        """Compute the CDF of the mixture of log-normals.
+
+        Parameters
+        ----------
+        x : float or numpy.ndarray
+            points, any shape for one mixture; (..., M) for batched
+            parameters of shape (..., K)
+
+        Returns
+        -------
+        res : float or numpy.ndarray
+            of probabilities, of the broadcast shape of `x` and the
+            parameters without their last axis
+
+        """
+        x = np.asarray(x, dtype=float)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_x = np.log(np.where(x > 0, x, 0.0))
+
+        res = 0.0
+        for w, m, s in self._components(x):
+            res = res + w * ndtr((log_x - m) / s)
+
+        return res[()]
+
+    def _cdf_of_log(self, y, components):
+        """Compute the CDF and PDF of ln(X) at `y`, given aligned components.
+        """
+        cdf, pdf = 0.0, 0.0
+        for w, m, s in components:
+            arg = (y - m) / s
+            cdf = cdf + w * ndtr(arg)
+            pdf = pdf + w / (s * np.sqrt(2 * np.pi)) * \
+                np.exp(-0.5 * arg * arg)
+
+        return cdf, pdf
+
+    def _quantile_newton(self, p, xtol, max_iter):
+        """Invert the CDF of ln(X) by Newton steps safeguarded by bisection.
+
+        The mixture quantile is bracketed by the smallest and the largest
+        component quantile, and the weighted average of those is the
+        starting value. Steps leaving the bracket are replaced by bisection.
+        """
+        components = list(self._components(p))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = ndtri(p)
+
+        lo, hi, y = np.inf, -np.inf, 0.0
+        for w, m, s in components:
+            q = m + s * z
+            lo, hi, y = np.minimum(lo, q), np.maximum(hi, q), y + w * q
+
+        # 0 and 1 map to 0 and inf, everything else is solved for
+        interior = (p > 0) & (p < 1)
+        lo, hi, y = [np.where(interior, v, 0.0) for v in (lo, hi, y)]
+        p_int = np.where(interior, p, 0.5)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for _ in range(max_iter):
+                cdf, pdf = self._cdf_of_log(y, components)
+                f = cdf - p_int
+
+                lo = np.where(f <= 0, y, lo)
+                hi = np.where(f > 0, y, hi)
+
+                y_new = y - f / pdf
+                y_new = np.where((y_new > lo) & (y_new < hi), y_new,
+                                 0.5 * (lo + hi))
+
+                dy = np.abs(y_new - y)
+                y = y_new
+
+                if np.all((dy <= xtol * (1 + np.abs(y))) |
+                          (hi - lo <= xtol * (1 + np.abs(y)))):
+                    break
+
+        res = np.where(interior, np.exp(y), np.where(p <= 0, 0.0, np.inf))
+        res = np.where(np.isnan(p), np.nan, res)
+
+        return res
+
+    def _cdf_table(self, n_points, tail=1e-10):
+        """Tabulate the CDF on a grid of ln(X), on the normal quantile scale.
+
+        On that scale the CDF of each component is linear in ln(X), which
+        makes linear interpolation of the inverse accurate.
+
+        Returns
+        -------
+        y : numpy.ndarray
+            (..., n_points) grid of ln(X)
+        z : numpy.ndarray
+            (..., n_points) ndtri of the CDF at `y`, increasing
+        """
+        if n_points in self._cdf_tables:
+            return self._cdf_tables[n_points]
+
+        z_tail = ndtri(tail)
+        lo = (self.mu + self.sigma * z_tail).min(axis=-1)
+        hi = (self.mu - self.sigma * z_tail).max(axis=-1)
+
+        y = lo[..., np.newaxis] + (hi - lo)[..., np.newaxis] * \
+            np.linspace(0, 1, n_points)
+
+        cdf, sf = 0.0, 0.0
+        for w, m, s in self._components(y):
+            cdf = cdf + w * ndtr((y - m) / s)
+            sf = sf + w * ndtr((m - y) / s)
+
+        # the survival function is precise in the upper tail
+        z = np.where(cdf < 0.5, ndtri(cdf), -ndtri(sf))
+
+        self._cdf_tables[n_points] = (y, z)
+
+        return y, z
+
+    def _quantile_table(self, p, n_points, xtol, max_iter):
+        """Interpolate quantiles in a cached table of the CDF."""
+        y_grid, z_grid = self._cdf_table(n_points)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = ndtri(p)
+
+        if p.ndim > 0 or y_grid.ndim < 2:
+            y = interp_rows(z, z_grid, y_grid)
+        else:
+            # one probability for each mixture
+            y = interp_rows(z[..., np.newaxis], z_grid, y_grid)[..., 0]
+
+        res = np.exp(y)
+
+        # beyond the table, e.g. far in the tails: solve
+        z_lo, z_hi = z_grid[..., 0], z_grid[..., -1]
+        if p.ndim > 0:
+            z_lo, z_hi = z_lo[..., np.newaxis], z_hi[..., np.newaxis]
+
+        outside = ~((z >= z_lo) & (z <= z_hi))
+        if outside.any():
+            res = np.where(outside, self._quantile_newton(p, xtol, max_iter),
+                           res)
+
+        return res
+
+    def quantile(self, p, method="newton", n_points=1001, xtol=1e-12,
+                 max_iter=100):
+        """Compute quantiles of the mixture of log-normals.
+
+        Parameters
+        ----------
+        p : float or numpy.ndarray
+            probabilities, any shape for one mixture; (..., M) for batched
+            parameters of shape (..., K)
+        method : str
+            'newton' to solve CDF(x) = p to precision `xtol`; 'table' to
+            interpolate in a table of the CDF at `n_points` points, built on
+            first use and cached, which is faster for repeated queries
+        n_points : int
+            size of the table, for method 'table'
+        xtol : float
+            tolerance on the log of quantiles
+        max_iter : int
+            maximum number of iterations of Newton's method
+
+        Returns
+        -------
+        q : float or numpy.ndarray
+            of quantiles, of the broadcast shape of `p` and the parameters
+            without their last axis
+
+        """
+        p = np.asarray(p, dtype=float)
+
+        if method == "newton":
+            res = self._quantile_newton(p, xtol, max_iter)
+        elif method == "table":
+            res = self._quantile_table(p, n_points, xtol, max_iter)
+        else:
+            raise NotImplementedError("Quantile method not implemented!")
+
+        return res[()]
@@ -1,9 +1,20 @@
 import pandas as pd
 import numpy as np
-from optools.helpers import fast_norm_cdf
+import warnings
+from optools.helpers import fast_norm_cdf, fast_norm_pdf
+from optools.quadrature import get_weights
 from scipy.stats import norm
-from scipy.optimize import fsolve
-from scipy import integrate
+from scipy.special import ndtr
+
+
+def _d_plus_minus(forward, strike, tau, vola):
+    """Compute d+ and d- of the Black-Scholes formula (Wystup (2006))."""
+    vola_sqrt_tau = vola * np.sqrt(tau)
+
+    d_plus = (np.log(forward / strike) + vola ** 2 / 2 * tau) / vola_sqrt_tau
+    d_minus = d_plus - vola_sqrt_tau
+
+    return d_plus, d_minus
 
 
 def bs_price(strike, rf, tau, vola, div_yield=None, spot=None, forward=None):
@@ -40,9 +51,7 @@ def bs_price(strike, rf, tau, vola, div_yield=None, spot=None, forward=None):
             raise TypeError("Make sure to provide rf, div_yield and spot!")
 
     # d+ and d-
-    d_plus = (np.log(forward / strike) + vola ** 2 / 2 * tau) / \
-             (vola * np.sqrt(tau))
-    d_minus = d_plus - vola * np.sqrt(tau)
+    d_plus, d_minus = _d_plus_minus(forward, strike, tau, vola)
 
     res = np.exp(-rf * tau) *\
         (forward * fast_norm_cdf(d_plus) - strike * fast_norm_cdf(d_minus))
@@ -79,60 +88,136 @@ def call_to_put(call_p, strike, forward, rf, tau):
     return p
 
 
-def bs_iv(call_p, forward, strike, rf, tau, **kwargs):
+def bs_iv(call_p, forward, strike, rf, tau, xtol=1e-12, max_iter=100,
+          full_output=False):
     """Compute Black-Scholes implied volatility.
 
-    Inversion of Black-Scholes formula to obtain implied volatility. Saddle
-    point is calculated and used as the initial guess.
+    Element-wise inversion of the Black-Scholes formula: every option is an
+    independent problem, solved by Newton iterations on the total
+    volatility (vola * sqrt(tau)) safeguarded by bisection. Newton starts
+    at the saddle point (Wystup (2006), p. 19), where the price is an
+    inflection point in vola, and keeps a per-element bracket around the
+    root to which it falls back whenever a step would leave it.
+
+    Vectorized: all arguments are broadcast against each other, so that
+    e.g. (N, M) prices can be inverted with (N, 1) forwards, rates and
+    maturities in one call.
 
     Parameters
     ----------
-    call_p: numpy.ndarray
-        (M,) array of fitted option prices (IVs)
-    forward: float
+    call_p: float or numpy.ndarray
+        call option prices
+    forward: float or numpy.ndarray
         forward price of underlying
-    strike: numpy.ndarray
-        (M,) array of strike prices
-    rf: float
-        risk-free rate, (in frac of 1) per period tau
-    tau: float
+    strike: float or numpy.ndarray
+        strike prices
+    rf: float or numpy.ndarray
+        risk-free rate, in (frac of 1) p.a.
+    tau: float or numpy.ndarray
         time to maturity, in years
-    **kwargs: dict
-        other arguments to fsolve
+    xtol: float
+        tolerance on the total volatility
+    max_iter: int
+        maximum number of iterations
+    full_output: bool
+        True to also return the convergence flags
 
     Return
     ------
-    res: numpy.ndarray
-        (M,) array of implied volatilities
+    res: float or numpy.ndarray
+        implied volatilities, in (frac of 1) p.a.; nan where the price
+        violates no-arbitrage bounds
+    converged: bool or numpy.ndarray
+        (only if `full_output` is True) True where the solver converged
     """
-    # lower part is dplus
-    def f_prime(x):
-        """Derivative of bs_price, or vega."""
-        # forward*e^{-rf*tau} is the same as S*e^{-y*tau}
-        x_1 = forward * np.exp(-rf * tau) * np.sqrt(tau)
-        x_2 = norm.pdf(
-            (np.log(forward / strike) + x * x / 2 * tau) / (x * np.sqrt(tau)))
-
-        val = np.diag(x_1 * x_2)
-
-        return val
-
-    # saddle point (Wystup (2006), p. 19)
-    saddle = np.sqrt(2 / tau * np.abs(np.log(forward / strike)))
-
-    # make sure it is positive, else set it next to 0
-    saddle *= 0.9
-    saddle[saddle <= 0] = 0.1
-
-    # objective
-    def f_obj(x):
-        """Objective function: call minus target call."""
-        val = bs_price(forward, strike, rf, tau, x) - call_p
-
-        return val
-
-    # solve with fsolve, use f_prime for gradient
-    res = fsolve(func=f_obj, x0=saddle, fprime=f_prime, **kwargs)
+    call_p, forward, strike, rf, tau = np.broadcast_arrays(
+        *[np.asarray(p, dtype=float) for p in
+          (call_p, forward, strike, rf, tau)])
+
+    # undiscounted price in units of the forward is a function of
+    #   log-moneyness and total vola only; work with the time value of the
+    #   out-of-the-money option (put-call parity for in-the-money calls)
+    #   for precision
+    x = np.log(forward / strike)
+    theta = np.where(x > 0, -1.0, 1.0)
+    target = call_p * np.exp(rf * tau) / forward
+    time_value = target - np.maximum(1 - np.exp(-x), 0.0)
+
+    # no-arbitrage bounds: between intrinsic value and the forward
+    valid = (time_value > 0) & (target < 1.0) & np.isfinite(x) & (tau > 0)
+
+    def otm_price(s, x, theta):
+        """Normalized OTM price and its derivative w.r.t. total vola."""
+        # the saddle point is zero only at the money, where d+ is zero too
+        with np.errstate(divide="ignore", invalid="ignore"):
+            d_plus = np.where(s > 0, x / s + s / 2, 0.0)
+        d_minus = d_plus - s
+
+        val = theta * (ndtr(theta * d_plus) -
+                       np.exp(-x) * ndtr(theta * d_minus))
+
+        return val, fast_norm_pdf(d_plus)
+
+    # saddle point (Wystup (2006), p. 19) as the initial guess: the price
+    #   is convex in vola below it and concave above it
+    s = np.where(valid, np.sqrt(2 * np.abs(x)), np.nan)
+
+    # below the saddle point, prices can be tiny: newton on log-prices
+    b_saddle, _ = otm_price(s, x, theta)
+    in_logs = valid & (time_value < b_saddle)
+
+    # brackets: price is increasing in vola
+    s_lo = np.zeros_like(s)
+    s_hi = np.full_like(s, np.inf)
+
+    converged = np.zeros(s.shape, dtype=bool)
+    todo = valid.copy()
+
+    for _ in range(max_iter):
+        if not todo.any():
+            break
+
+        s_t = s[todo]
+        b_t, b_prime = otm_price(s_t, x[todo], theta[todo])
+        f_val = b_t - time_value[todo]
+
+        # update brackets
+        s_lo[todo] = np.where(f_val < 0, s_t, s_lo[todo])
+        s_hi[todo] = np.where(f_val > 0, s_t, s_hi[todo])
+
+        # newton step, or bisection if it leaves the bracket
+        with np.errstate(all="ignore"):
+            s_new = np.where(
+                in_logs[todo],
+                s_t - np.log(b_t / time_value[todo]) * b_t / b_prime,
+                s_t - f_val / b_prime)
+
+        lo_t, hi_t = s_lo[todo], s_hi[todo]
+        bisect = ~((s_new > lo_t) & (s_new < hi_t))
+        s_new[bisect] = np.where(np.isinf(hi_t[bisect]),
+                                 2 * lo_t[bisect] + 1.0,
+                                 (lo_t[bisect] + hi_t[bisect]) / 2)
+
+        # converged if the step is small
+        done = (np.abs(s_new - s_t) <= xtol * (1 + s_t)) | (f_val == 0)
+
+        s[todo] = s_new
+        idx = np.flatnonzero(todo)[done]
+        converged.flat[idx] = True
+        todo.flat[idx] = False
+
+    # back to vola p.a.
+    res = np.where(valid, s / np.sqrt(tau), np.nan)
+
+    if not converged[valid].all():
+        warnings.warn("Implied vola did not converge for {} option(s)!"
+                      .format((valid & ~converged).sum()))
+
+    if res.ndim < 1:
+        res, converged = res[()], converged[()]
+
+    if full_output:
+        return res, converged
 
     return res
 
@@ -161,13 +246,138 @@ def bs_vega(forward, strike, y, tau, sigma):
     vega: numpy.ndarray
         vegas
     """
-    dplus = (np.log(forward / strike) + sigma ** 2 / 2 * tau) / \
-            (sigma * np.sqrt(tau))
-    vega = forward * np.exp(-y * tau) * np.sqrt(tau) * norm.pdf(dplus)
+    dplus, _ = _d_plus_minus(forward, strike, tau, sigma)
+    vega = forward * np.exp(-y * tau) * np.sqrt(tau) * fast_norm_pdf(dplus)
 
     return vega
 
 
+def bs_greeks(strike, rf, tau, vola, div_yield=None, spot=None, forward=None,
+              is_call=True, greeks=None):
+    """Compute the Black-Scholes price and Greeks in one pass.
+
+    d+ and d- are evaluated once, and the other shared intermediates
+    (normal cdfs and pdf, discount factors) are computed only when a
+    requested Greek needs them and then reused by the others. Definitions
+    are as in Wystup (2006); all arguments are broadcast against each
+    other, e.g. (T, 1, 1) dates, (1, M, 1) maturities and (1, 1, K) strikes.
+
+    Either `spot` and `div_yield` or `forward` must be provided; the
+    missing one(s) are filled using the no-arbitrage relation. Greeks with
+    respect to the spot price need all three.
+
+    Parameters
+    ----------
+    strike : float or numpy.ndarray
+        strike prices
+    rf : float or numpy.ndarray
+        risk-free rate, in (frac of 1) p.a.
+    tau : float or numpy.ndarray
+        maturity, in years
+    vola : float or numpy.ndarray
+        volatility, in (frac of 1) p.a.
+    div_yield : float or numpy.ndarray
+        dividend yield, in (frac of 1) p.a.
+    spot : float or numpy.ndarray
+        spot price of the underlying
+    forward : float or numpy.ndarray
+        forward price of the underlying
+    is_call : bool
+        whether options are call options
+    greeks : list-like of str
+        any of 'price', 'delta_spot', 'delta_forward',
+        'delta_premium_adjusted' (spot, premium-adjusted), 'gamma', 'vega',
+        'vanna', 'volga', 'theta', 'rho'; None for all of them
+
+    Returns
+    -------
+    res : dict
+        of (greek: value) pairs
+
+    """
+    if greeks is None:
+        greeks = ["price", "delta_spot", "delta_forward",
+                  "delta_premium_adjusted", "gamma", "vega", "vanna",
+                  "volga", "theta", "rho"]
+
+    # no-arbitrage relation to fill in what is missing
+    if forward is None:
+        try:
+            forward = spot * np.exp((rf - div_yield) * tau)
+        except TypeError:
+            raise TypeError("Make sure to provide rf, div_yield and spot!")
+    elif (spot is None) and (div_yield is not None):
+        spot = forward / np.exp((rf - div_yield) * tau)
+    elif (div_yield is None) and (spot is not None):
+        div_yield = rf - np.log(forward / spot) / tau
+
+    # +1 for calls, -1 for puts
+    phi = is_call * 2 - 1.0
+
+    d_plus, d_minus = _d_plus_minus(forward, strike, tau, vola)
+
+    # shared intermediates, computed lazily and only once
+    intermediates = {
+        "cdf_plus": lambda: fast_norm_cdf(phi * d_plus),
+        "cdf_minus": lambda: fast_norm_cdf(phi * d_minus),
+        "pdf_plus": lambda: fast_norm_pdf(d_plus),
+        "df_rf": lambda: np.exp(-rf * tau),
+        "df_div": lambda: np.exp(-div_yield * tau),
+        "sqrt_tau": lambda: np.sqrt(tau),
+        "vega": lambda: forward * get("df_rf") * get("sqrt_tau") *
+        get("pdf_plus"),
+    }
+    cache = dict()
+
+    def get(what):
+        if what not in cache:
+            cache[what] = intermediates[what]()
+        return cache[what]
+
+    def need_spot(what):
+        if spot is None:
+            raise ValueError("{} needs the spot price and dividend yield!"
+                             .format(what))
+
+    res = dict()
+
+    for g in greeks:
+        if g == "price":
+            res[g] = get("df_rf") * phi * \
+                (forward * get("cdf_plus") - strike * get("cdf_minus"))
+        elif g == "delta_forward":
+            res[g] = phi * get("cdf_plus")
+        elif g == "delta_spot":
+            need_spot(g)
+            res[g] = phi * get("df_div") * get("cdf_plus")
+        elif g == "delta_premium_adjusted":
+            need_spot(g)
+            res[g] = phi * get("df_div") * strike / forward * \
+                get("cdf_minus")
+        elif g == "gamma":
+            need_spot(g)
+            res[g] = get("df_div") * get("pdf_plus") / \
+                (spot * vola * get("sqrt_tau"))
+        elif g == "vega":
+            res[g] = get("vega")
+        elif g == "vanna":
+            need_spot(g)
+            res[g] = -get("df_div") * get("pdf_plus") * d_minus / vola
+        elif g == "volga":
+            res[g] = get("vega") * d_plus * d_minus / vola
+        elif g == "theta":
+            need_spot(g)
+            res[g] = -get("vega") * vola / (2 * tau) + \
+                phi * div_yield * spot * get("df_div") * get("cdf_plus") - \
+                phi * rf * strike * get("df_rf") * get("cdf_minus")
+        elif g == "rho":
+            res[g] = phi * strike * tau * get("df_rf") * get("cdf_minus")
+        else:
+            raise ValueError("Greek {} not implemented!".format(g))
+
+    return res
+
+
 def vanillas_from_combinations(rr, bf, atm, delta=None):
     """Calculate implied vola of calls from that of put/call combinations.
 
@@ -211,76 +421,426 @@ def vanillas_from_combinations(rr, bf, atm, delta=None):
     return res
 
 
-def strike_from_delta(delta, spot, rf, div_yield, tau, vola, is_call):
+delta_conventions = ("spot", "forward", "spot_pa", "forward_pa")
+
+
+def _delta_discount(convention, div_yield, tau):
+    """Discount factor of spot deltas (1 for forward deltas)."""
+    if convention not in delta_conventions:
+        raise ValueError("Delta convention {} not implemented!"
+                         .format(convention))
+
+    if convention.startswith("spot"):
+        return np.exp(-div_yield * tau)
+
+    return 1.0
+
+
+def _solve_bracketed(fun, lo, hi, x0=None, args=(), xtol=1e-12,
+                     max_iter=100):
+    """Find roots of increasing functions element-wise.
+
+    Newton iterations safeguarded by bisection, as in `bs_iv`: each element
+    keeps a bracket with negative values at `lo` and positive at `hi`, and
+    is bisected whenever a Newton step would leave it. `fun(x, *args)`
+    returns values and derivatives; array `args` are broadcast against the
+    brackets and subset to the elements not yet converged.
+
+    Returns
+    -------
+    res : numpy.ndarray
+        roots, nan where the bracket does not contain a sign change
+    converged : numpy.ndarray
+
+    """
+    lo, hi = np.broadcast_arrays(np.asarray(lo, dtype=float),
+                                 np.asarray(hi, dtype=float))
+    shape = lo.shape
+    lo, hi = lo.ravel().copy(), hi.ravel().copy()
+
+    args = [np.broadcast_to(a, shape).ravel() if np.ndim(a) > 0 else a
+            for a in args]
+
+    x = (lo + hi) / 2 if x0 is None else \
+        np.broadcast_to(np.asarray(x0, dtype=float), shape).ravel().copy()
+    x = np.clip(x, lo, hi)
+
+    with np.errstate(all="ignore"):
+        valid = (fun(lo, *args)[0] <= 0) & (fun(hi, *args)[0] >= 0)
+
+    converged = np.zeros(x.shape, dtype=bool)
+    todo = valid.copy()
+
+    for _ in range(max_iter):
+        idx = np.flatnonzero(todo)
+        if idx.size < 1:
+            break
+
+        x_t = x[idx]
+        f_val, f_prime = fun(x_t, *[a[idx] if np.ndim(a) > 0 else a
+                                    for a in args])
+
+        # update brackets
+        lo[idx] = np.where(f_val < 0, x_t, lo[idx])
+        hi[idx] = np.where(f_val > 0, x_t, hi[idx])
+
+        # newton step, or bisection if it leaves the bracket
+        with np.errstate(all="ignore"):
+            x_new = x_t - f_val / f_prime
+
+        lo_t, hi_t = lo[idx], hi[idx]
+        bisect = ~((x_new > lo_t) & (x_new < hi_t))
+        x_new[bisect] = (lo_t[bisect] + hi_t[bisect]) / 2
+
+        done = (np.abs(x_new - x_t) <= xtol * (1 + np.abs(x_t))) | \
+            (f_val == 0)
+
+        x[idx] = x_new
+        converged[idx[done]] = True
+        todo[idx[done]] = False
+
+    x[~valid] = np.nan
+
+    return x.reshape(shape), converged.reshape(shape)
+
+
+def delta_from_strike(strike, spot, rf, div_yield, tau, vola, is_call,
+                      convention="spot"):
+    """Calculate option deltas given strike and implied vola.
+
+    Deltas are of the vanilla option per unit of the base currency, with
+    the discount factor of the base currency (spot) or without (forward),
+    and unadjusted or premium-adjusted ('_pa': the premium is paid in the
+    base currency, as e.g. for USDJPY); see Reiswich and Wystup (2010).
+
+    Parameters
+    ----------
+    strike : float or numpy.ndarray
+        strike prices
+    spot : float or numpy.ndarray
+        underlying price
+    rf : float or numpy.ndarray
+        risk-free rate, in (frac of 1) p.a.
+    div_yield : float or numpy.ndarray
+        dividend yield (rf rate of the base currency), in (frac of 1) p.a.
+    tau : float or numpy.ndarray
+        time to maturity, in years
+    vola : float or numpy.ndarray
+        implied vol
+    is_call : bool or numpy.ndarray
+        whether options are call options
+    convention : str
+        'spot', 'forward', 'spot_pa' or 'forward_pa'
+
+    Returns
+    -------
+    res : float or numpy.ndarray
+        of deltas, negative for puts
+
+    """
+    disc = _delta_discount(convention, div_yield, tau)
+
+    # +1 for calls, -1 for puts
+    phi = np.asarray(is_call) * 2 - 1.0
+
+    forward = spot * np.exp((rf - div_yield) * tau)
+    d_plus, d_minus = _d_plus_minus(forward, strike, tau, vola)
+
+    if convention.endswith("_pa"):
+        res = phi * disc * strike / forward * ndtr(phi * d_minus)
+    else:
+        res = phi * disc * ndtr(phi * d_plus)
+
+    return res
+
+
+def strike_from_delta(delta, spot, rf, div_yield, tau, vola, is_call,
+                      convention="spot", xtol=1e-12, max_iter=100):
     """Calculate strike prices given delta and implied vola.
 
-    Everything relevant is annualized.
+    Everything relevant is annualized. Unadjusted deltas have closed-form
+    strikes (Wystup (2006), eq. 1.44); premium-adjusted ones are solved
+    for, all at once, by `_solve_bracketed` in log-moneyness, between the
+    strike of the unadjusted delta and, for calls, the strike of the
+    highest premium-adjusted delta (Reiswich and Wystup (2010)).
 
     Parameters
     ----------
     delta: float or numpy.ndarray
-        of option deltas, in (frac of 1)
-    spot: float
+        of option deltas, in (frac of 1), negative for puts
+    spot: float or numpy.ndarray
         underlying price
-    rf: float
+    rf: float or numpy.ndarray
         risk-free rate, in (frac of 1) p.a.
-    div_yield: float
+    div_yield: float or numpy.ndarray
         dividend yield, in (frac of 1) p.a.
-    tau: float
+    tau: float or numpy.ndarray
         time to maturity, in years
     vola: float or numpy.ndarray
         implied vol
-    is_call: bool
+    is_call: bool or numpy.ndarray
         whether options are call options
+    convention : str
+        'spot', 'forward', 'spot_pa' or 'forward_pa', see
+        `delta_from_strike`
+    xtol : float
+        tolerance on log-strikes, for premium-adjusted deltas
+    max_iter : int
+        maximum number of iterations, for premium-adjusted deltas
 
     Return
     ------
     k: float or numpy.ndarray
-        of strike prices
+        of strike prices; nan for call deltas above the highest
+        premium-adjusted one
     """
+    disc = _delta_discount(convention, div_yield, tau)
+
     # +1 for calls, -1 for puts
-    phi = is_call*2 - 1.0
+    phi = np.asarray(is_call) * 2 - 1.0
 
     theta_plus = (rf - div_yield) / vola + vola / 2
 
     # eq. (1.44) in Wystup
     k = spot * \
-        np.exp(-phi * norm.ppf(phi * delta * np.exp(div_yield * tau)) *
+        np.exp(-phi * norm.ppf(phi * delta / disc) *
                vola * np.sqrt(tau) + vola * theta_plus * tau)
 
-    return k
+    if not convention.endswith("_pa"):
+        return k
+
+    # premium-adjusted: solve phi*(a - m(x)) = 0 for log-moneyness x, where
+    #   m(x) = disc * exp(x) * N(phi * d-) is increasing in x for puts and
+    #   decreasing for calls beyond the highest delta
+    forward = spot * np.exp((rf - div_yield) * tau)
+    v = vola * np.sqrt(tau)
+    x_unadj = np.log(k / forward)
+
+    phi, a, disc, v, x_unadj = np.broadcast_arrays(
+        phi, phi * np.asarray(delta, dtype=float), disc, v, x_unadj)
+
+    def fun(x, phi, a, disc, v):
+        d_minus = (-x - v * v / 2) / v
+        m = disc * np.exp(x) * ndtr(phi * d_minus)
+        m_prime = disc * np.exp(x) * \
+            (ndtr(phi * d_minus) - phi * fast_norm_pdf(d_minus) / v)
+        return phi * (a - m), -phi * m_prime
+
+    # highest call delta where v*N(d-) = n(d-), increasing in d- > -v
+    def fun_max(d, v):
+        return v * ndtr(d) - fast_norm_pdf(d), fast_norm_pdf(d) * (v + d)
+
+    d_max, _ = _solve_bracketed(fun_max, -v, 10.0, args=(v, ), xtol=xtol,
+                                max_iter=max_iter)
+    x_max = -d_max * v - v * v / 2
+
+    lo = np.where(phi > 0, x_max, x_unadj - 20 * v)
+
+    x, converged = _solve_bracketed(fun, lo, x_unadj, x0=x_unadj,
+                                    args=(phi, a, disc, v), xtol=xtol,
+                                    max_iter=max_iter)
+
+    if not converged[~np.isnan(x)].all():
+        warnings.warn("Strike did not converge for {} option(s)!"
+                      .format((~np.isnan(x) & ~converged).sum()))
 
+    res = forward * np.exp(x)
+
+    return res[()]
+
+
+def atm_strike(spot, rf, div_yield, tau, vola, atm="atmf",
+               convention="spot"):
+    """Calculate the strike of the at-the-money option.
+
+    Parameters
+    ----------
+    spot, rf, div_yield, tau, vola : float or numpy.ndarray
+        as in `strike_from_delta`; `vola` is the atm vola
+    atm : str
+        'atmf' for the forward; 'dns' for the delta-neutral straddle, whose
+        call and put deltas add up to zero under `convention`
+    convention : str
+        delta convention, see `delta_from_strike`
+
+    Returns
+    -------
+    res : float or numpy.ndarray
+
+    """
+    _delta_discount(convention, div_yield, tau)
+
+    forward = spot * np.exp((rf - div_yield) * tau)
+
+    if atm == "atmf":
+        return forward * np.ones_like(np.asarray(vola, dtype=float))[()]
+
+    if atm != "dns":
+        raise ValueError("Atm definition {} not implemented!".format(atm))
+
+    half_var = 0.5 * vola * vola * tau
+
+    if convention.endswith("_pa"):
+        return forward * np.exp(-half_var)
+
+    return forward * np.exp(half_var)
+
+
+def price_under_mixture(strike, rf, mu, sigma, wght, jac=False):
+    """Compute call prices when the underlying is a mixture of log-normals.
+
+    Everything is per period. Vectorized: parameters of N mixtures of K
+    components can be passed as (N, K) arrays, with (N, M) strikes.
+
+    Parameters
+    ----------
+    strike : float or numpy.ndarray
+        (M,) or (N, M) array of strike prices
+    rf : float or numpy.ndarray
+        risk-free rate, in (frac of 1), per period
+    mu : numpy.ndarray
+        (K,) or (N, K) array of means of log-normal distributions
+    sigma : numpy.ndarray
+        (K,) or (N, K) array of st. deviations of log-normal distributions
+    wght : numpy.ndarray
+        (K,) or (N, K) array of component weights
+    jac : bool
+        True to also return the derivatives of prices w.r.t. parameters
 
-def mfivariance(call_p, strike, forward_p, rf, tau):
+    Returns
+    -------
+    res : numpy.ndarray
+        (M,) or (N, M) array of call prices
+    res_jac : numpy.ndarray
+        (M, 3*K) or (N, M, 3*K) derivatives w.r.t. mu, sigma and wght, in
+        this order; only if `jac` is True
+
+    """
+    strike = np.asarray(strike, dtype=float)[..., np.newaxis]
+    rf = np.asarray(rf, dtype=float)[..., np.newaxis, np.newaxis]
+    mu, sigma, wght = [np.asarray(p, dtype=float)[..., np.newaxis, :]
+                       for p in (mu, sigma, wght)]
+
+    # forward price of each component
+    forward = np.exp(mu + 0.5 * sigma * sigma)
+
+    d_plus = (mu + sigma * sigma - np.log(strike)) / sigma
+    d_minus = d_plus - sigma
+
+    n_plus = ndtr(d_plus)
+    disc = np.exp(-rf)
+
+    # prices of components, (..., M, K)
+    c_comp = disc * (forward * n_plus - strike * ndtr(d_minus))
+
+    res = (c_comp * wght).sum(axis=-1)
+
+    if not jac:
+        return res
+
+    dc_dmu = wght * disc * forward * n_plus
+    dc_dsigma = wght * disc * forward * (fast_norm_pdf(d_plus) +
+                                         sigma * n_plus)
+
+    res_jac = np.concatenate(
+        np.broadcast_arrays(dc_dmu, dc_dsigma, c_comp), axis=-1)
+
+    return res, res_jac
+
+
+def _integrate(y, x, start=None, stop=None, rule="simpson"):
+    """Integrate `y` over x[..., start:stop] with quadrature weights.
+
+    Rows of (N, M) `y` are integrated at once: on a shared (M,) grid `x`,
+    rows with the same bounds take one matrix-vector product with the
+    same (cached) weights.
+    """
+    if (start is None) and (stop is None):
+        weights = get_weights(x, rule)
+
+        if weights.ndim < 2:
+            return y.dot(weights)
+
+        return (y * weights).sum(axis=-1)
+
+    start = 0 if start is None else start
+    stop = x.shape[-1] if stop is None else stop
+
+    if y.ndim < 2:
+        return y[start:stop].dot(get_weights(x[start:stop], rule))
+
+    bounds = np.stack(np.broadcast_arrays(start, stop), axis=-1)
+    bounds = np.broadcast_to(bounds, y.shape[:-1] + (2, ))
+
+    res = np.empty(y.shape[:-1])
+
+    # rows with the same bounds are done at once
+    uniq, inv = np.unique(bounds, axis=0, return_inverse=True)
+
+    for p, (a, b) in enumerate(uniq):
+        rows = inv.ravel() == p
+
+        if x.ndim < 2:
+            res[rows] = y[rows, a:b].dot(get_weights(x[a:b], rule))
+        else:
+            res[rows] = (y[rows, a:b] *
+                         get_weights(x[rows, a:b], rule)).sum(axis=-1)
+
+    return res
+
+
+def _per_row(*args):
+    """Convert per-row parameters to float arrays broadcastable to (N, M).
+    """
+    return [np.asarray(p, dtype=float)[..., np.newaxis] for p in args]
+
+
+def mfivariance(call_p, strike, forward_p, rf, tau, rule="simpson",
+                weights=None):
     """Calculate the mfiv as the integral over call prices.
 
     For details, see Jiang and Tian (2005).
 
+    Vectorized: (N, M) call prices on a shared (M,) or per-row (N, M)
+    strike grid, with (N,) forward prices, rates and maturities, give N
+    values at once.
+
     Parameters
     ----------
     call_p : numpy.ndarray
-        of call option prices
+        (M,) or (N, M) array of call option prices
     strike : numpy.ndarray
-        of strike prices
-    forward_p : float
+        (M,) or (N, M) array of sorted strike prices
+    forward_p : float or numpy.ndarray
         forward price
-    rf : float
+    rf : float or numpy.ndarray
         risk-free rate, in (frac of 1) p.a.
-    tau : float
+    tau : float or numpy.ndarray
         maturity, in years
+    rule : str
+        quadrature rule, 'simpson' or 'trapezoid'
+    weights : numpy.ndarray, optional
+        quadrature weights over `strike`, e.g. from `grids.strike_grid`;
+        `rule` is ignored if set
 
     Returns
     -------
-    res : float
+    res : float or numpy.ndarray
         mfiv, in (frac of 1) p.a.
 
     """
+    call_p = np.asarray(call_p, dtype=float)
+    strike = np.asarray(strike, dtype=float)
+    f_, rf_, tau_ = _per_row(forward_p, rf, tau)
+
     # integrate
-    integrand = (call_p * np.exp(rf * tau) -\
-        np.maximum(np.zeros(shape=(len(call_p), )), forward_p-strike)) /\
-        (strike * strike)
+    integrand = (call_p * np.exp(rf_ * tau_) -
+                 np.maximum(f_ - strike, 0.0)) / (strike * strike)
 
-    res = integrate.simps(integrand, strike) * 2
+    if weights is None:
+        res = _integrate(integrand, strike, rule=rule) * 2
+    else:
+        res = (integrand * weights).sum(axis=-1) * 2
 
     # annualize
     res /= tau
@@ -288,98 +848,114 @@ def mfivariance(call_p, strike, forward_p, rf, tau):
     return res
 
 
-def simple_var_swap_rate(call_p, strike, forward_p, rf, tau):
+def simple_var_swap_rate(call_p, strike, forward_p, rf, tau,
+                         rule="simpson", weights=None):
     """Calculate simple variance swap rate as in Martin (2017).
 
+    Vectorized as `mfivariance`.
+
     Parameters
     ----------
     call_p : numpy.ndarray
+        (M,) or (N, M) array of call option prices
     strike : numpy.ndarray
-    forward_p : float
-    rf : float
-    tau : float
+        (M,) or (N, M) array of sorted strike prices
+    forward_p : float or numpy.ndarray
+    rf : float or numpy.ndarray
+    tau : float or numpy.ndarray
         maturity, in years
+    rule : str
+        quadrature rule, 'simpson' or 'trapezoid'
+    weights : numpy.ndarray, optional
+        quadrature weights over `strike`, as in `mfivariance`
 
     Returns
     -------
-    res : float
+    res : float or numpy.ndarray
         swap rate, annualized
 
     """
-    # split into otm calls and puts
-    otm_call_idx = strike >= forward_p
+    call_p = np.asarray(call_p, dtype=float)
+    strike = np.asarray(strike, dtype=float)
+    f_, rf_, tau_ = _per_row(forward_p, rf, tau)
 
-    # otm calls
-    otm_call_p = call_p[otm_call_idx]
-    otm_call_strike = strike[otm_call_idx]
-
-    # convert itm calls to puts
-    otm_put_strike = strike[~otm_call_idx]
-    otm_put_p = call_to_put(call_p[~otm_call_idx], otm_put_strike,
-                            forward_p, rf, tau)
+    # otm puts (below the forward) and calls, continuous at the forward:
+    #   one integral over the whole grid, leaving no gap around the forward
+    otm_p = np.where(strike < f_,
+                     call_to_put(call_p, strike, f_, rf_, tau_), call_p)
 
     # integrate
-    res = \
-        integrate.simps(otm_put_p, otm_put_strike) + \
-        integrate.simps(otm_call_p, otm_call_strike)
+    if weights is None:
+        res = _integrate(otm_p, strike, rule=rule)
+    else:
+        res = (otm_p * weights).sum(axis=-1)
 
     res *= 2 * np.exp(rf * tau) / forward_p**2 / tau
 
     return res
 
 
-def mfiskewness(call_p, strike, spot, forward, rf, tau):
+def mfiskewness(call_p, strike, spot, forward, rf, tau, mfiv=None,
+                rule="simpson"):
     """Calculate the MFIskewness.
 
-    For details, see Bakshi et al. (2003).
+    For details, see Bakshi et al. (2003). Vectorized as `mfivariance`.
 
     Parameters
     ----------
     call_p : numpy.ndarray
-        of call prices
+        (M,) or (N, M) array of call prices
     strike : numpy.ndarray
-        of strike prices
-    spot : float
+        (M,) or (N, M) array of sorted strike prices
+    spot : float or numpy.ndarray
         spot price of the underlying
-    forward : float
+    forward : float or numpy.ndarray
         spot price of the underlying
-    rf : float
+    rf : float or numpy.ndarray
         risk-free rate, in (frac of 1) p.a.
-    tau : float
+    tau : float or numpy.ndarray
         maturity, in years
+    mfiv : float or numpy.ndarray, optional
+        output of `mfivariance` for the same arguments, if already
+        calculated
+    rule : str
+        quadrature rule, 'simpson' or 'trapezoid'
 
     Returns
     -------
-    res : float
+    res : float or numpy.ndarray
         model-free implied skewness
 
     """
+    call_p = np.asarray(call_p, dtype=float)
+    strike = np.asarray(strike, dtype=float)
+    s_, f_, rf_, tau_ = _per_row(spot, forward, rf, tau)
+
     # put-call parity: call for for strike > spot and put for strike <= spot
-    strike_put = strike[strike <= spot]
-    otm_puts = call_to_put(call_p=call_p[strike <= spot], strike=strike_put,
-                           forward=forward, rf=rf, tau=tau)
+    n_put = (strike <= s_).sum(axis=-1)
+    otm_puts = call_to_put(call_p=call_p, strike=strike, forward=f_, rf=rf_,
+                           tau=tau_)
+    otm_calls = call_p
 
-    strike_call = strike[strike > spot]
-    otm_calls = call_p[strike > spot]
+    log_k = np.log(strike / s_)
+    log_k2 = log_k * log_k
+    strike2 = strike * strike
 
     # cubic contract
-    c_cube = (6*np.log(strike_call/spot) - 3*np.log(strike_call/spot)**2) / \
-        strike_call**2 * otm_calls
-    p_cube = (6*np.log(spot/strike_put) + 3*np.log(spot/strike_put)**2) / \
-        strike_put**2 * otm_puts
-    cube = integrate.simps(c_cube, strike_call) - \
-        integrate.simps(p_cube, strike_put)
+    c_cube = (6*log_k - 3*log_k2) / strike2 * otm_calls
+    p_cube = (-6*log_k + 3*log_k2) / strike2 * otm_puts
+    cube = _integrate(c_cube, strike, start=n_put, rule=rule) - \
+        _integrate(p_cube, strike, stop=n_put, rule=rule)
 
     # quadratic contract
-    mfiv = mfivariance(call_p, strike, forward, rf, tau)
+    if mfiv is None:
+        mfiv = mfivariance(call_p, strike, forward, rf, tau, rule=rule)
 
     # quartic contract
-    c_quart = (12*np.log(strike_call/spot)**2
-               - 4*np.log(strike_call/spot)**3) / strike_call**2 * otm_calls
-    p_quart = (12*np.log(spot/strike_put)**2
-              + 4*np.log(spot/strike_put)**3) / strike_put**2 * otm_puts
-    quart = integrate.simps(c_quart, strike_call) + \
-        integrate.simps(p_quart, strike_put)
+    c_quart = (12*log_k2 - 4*log_k2*log_k) / strike2 * otm_calls
+    p_quart = (12*log_k2 - 4*log_k2*log_k) / strike2 * otm_puts
+    quart = _integrate(c_quart, strike, start=n_put, rule=rule) + \
+        _integrate(p_quart, strike, stop=n_put, rule=rule)
 
     # mu
     mu = np.exp(rf*tau) - 1 - np.exp(rf*tau) / 2 * mfiv - \
@@ -446,6 +1022,78 @@ def fill_by_no_arb(spot, forward, rf, div_yield, tau, raise_errors=False):
     return args
 
 
+def fill_by_no_arb_frame(data, tau=None, raise_errors=False,
+                         full_output=False):
+    """Fill missing values using the no-arbitrage relation, in all rows.
+
+    The column-wise counterpart of `fill_by_no_arb`: in each row with one
+    missing value among spot, forward, rf and div_yield, that value is
+    filled from the other three, for all rows at once.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        with columns 'spot', 'forward', 'rf' and 'div_yield', and 'tau'
+        unless `tau` is given; other columns are kept as they are
+    tau : float or numpy.ndarray, optional
+        maturity(-ies), in years; replaces column 'tau'
+    raise_errors : bool
+        True to raise an error if a row has more than one missing value,
+        counting a missing maturity; a warning otherwise
+    full_output : bool
+        True to also return which rows could not be filled
+
+    Returns
+    -------
+    res : pandas.DataFrame
+        copy of `data`, filled where possible
+    unsolved : pandas.Series
+        (only if `full_output` is True) True for rows with more than one
+        missing value, left as they were
+
+    """
+    columns = ["spot", "forward", "rf", "div_yield"]
+    values = data[columns].values.astype(float)
+
+    if tau is None:
+        if "tau" not in data.columns:
+            raise ValueError("Maturity not provided!")
+        tau = data["tau"].values
+    tau = np.broadcast_to(np.asarray(tau, dtype=float), (len(data), ))
+
+    missing = np.isnan(values)
+    n_missing = missing.sum(axis=1)
+    unsolved = (n_missing > 0) & (n_missing + np.isnan(tau) > 1)
+
+    if unsolved.any():
+        msg = "More than one value missing in {} row(s)!"\
+            .format(unsolved.sum())
+        if raise_errors:
+            raise ValueError(msg)
+        warnings.warn(msg)
+
+    # no-arb relationships, in the order of `columns`
+    spot, forward, rf, div_yield = values.T
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = (rf - div_yield) * tau
+        log_fs = np.log(forward / spot) / tau
+        filled = np.column_stack((forward * np.exp(-growth),
+                                  spot * np.exp(growth),
+                                  log_fs + div_yield,
+                                  rf - log_fs))
+
+    fill = missing & ~unsolved[:, np.newaxis]
+
+    res = data.copy()
+    res[columns] = np.where(fill, filled, values)
+
+    if full_output:
+        return res, pd.Series(unsolved, index=data.index)
+
+    return res
+
+
 # def bs_iv_objective(c_hat, forward_p, strike, rf, tau, sigma):
 #     """Compute discrepancy between the calculated option price and `c_hat`.
 #
@@ -468,331 +1116,6 @@ def fill_by_no_arb(spot, forward, rf, div_yield, tau, raise_errors=False):
 #
 #     return c
 
-# def estimate_rnd(c_true, f_true, strike, rf, is_iv, W, opt_meth, **kwargs):
-#     """Fit parameters of mixture of two log-normals to market data.
-# 
-#     Everything is per period.
-# 
-#     Returns
-#     -------
-#     res: numpy.ndarray
-#         [mu1, mu2, sigma1, sigma2, w1, w2]
-# 
-#     """
-#     # if c_true is not IV, convert it to IV
-#     if not is_iv:
-#         c_true = bs_iv(c_true, f_true, strike, rf, tau = 1)
-# 
-#     # 1) using one log-normal, come up with initial guess
-#     # some really simple starting values
-#     proto_x = np.array([np.log(f_true), np.median(c_true)], dtype = float)
-# 
-#     logger.debug(("Proto-x:\n"+"%.4f "*len(proto_x)+"\n") % tuple(proto_x))
-# 
-#     # objective function now is mixture of log-normals with 1 component
-#     wght = np.array([1,])
-#     obj_fun = lambda x: \
-#         objective_for_rnd(x, wght, strike, rf, c_true, f_true, True, W)
-# 
-#     # optimization problem
-#     first_guess = minimize(obj_fun, proto_x, method = "SLSQP",
-#         bounds = [(0,proto_x[0]*2), (0,proto_x[1]*2)])
-# 
-#     logger.debug(("First guess:\n"+"%.2f "*len(first_guess.x)+"\n") %
-#         tuple(first_guess.x))
-# 
-#     # starting value for optimization
-#     x0 = first_guess.x
-# 
-#     # switch to 2
-#     x0 = [x0[0]*np.array([1.05, 1/1.05]), x0[1]*np.array([1, 1])]
-# 
-#     # bounds: [mu1, mu2, sigma1, sigma2]
-#     bounds = [(np.log(f_true*0.9), np.log(f_true/0.9))]*2 +\
-#         [(0, proto_x[1]*3)]*2
-# 
-#     # 2) using this initial guess, cook up a more sophisticated problem
-#     # space for parameters and loss function value
-#     if opt_meth == "differential_evolution":
-#         # try differential_evolution
-#         try:
-#             x, w = optimize_for_mixture_par(x0, strike, rf, c_true, f_true,
-#                                             True, W, "differential_evolution",
-#                                             bounds=bounds)
-#         except:
-#             # if fails, stick to the standard stuff
-#             # err = sys.exc_info()[0]
-#             logger.error("differential evolution aborted:\n")
-#             x, w = optimize_for_mixture_par(x0, strike, rf, c_true, f_true,
-#                                             True, W, opt_meth, bounds=bounds,
-#                                             **kwargs)
-#         # end of try/except
-#     else:
-#         x, w = optimize_for_mixture_par(x0, strike, rf, c_true, f_true, True,
-#                                         W, opt_meth, **kwargs)
-# 
-#     logger.debug("Weight: %.2f\n" % w[0])
-#     logger.debug(("Par: "+"%.2f "*len(x)+"\n") % tuple(x))
-# 
-#     return np.concatenate((x, w))
-#
-#
-# def objective_for_rnd(par, wght, strike, rf, c_true, f_true, is_iv, W=None):
-#     """Compute objective function for minimization problem in RND estimation.
-#
-#     Objective function is loss function of errors between prices (IVs) of
-#     options priced under mixture of normals vs. true provided pricse (IVs).
-#
-#     Parameters
-#     ----------
-#     par: numpy.ndarray
-#         [[means], [stds]] of individual components, (2,N)
-#     wght: numpy.ndarray
-#         (N,) weights of each component (in frac of 1)
-#     strike: numpy.ndarray
-#         (M,) array of strike prices
-#     rf: float
-#         risk-free rate, per period (in frac of 1)
-#     c_true: numpy.ndarray
-#         (M,) array of real-world option prices (or IVs)
-#     f_true: float
-#         real-world price of forward contract on underlying
-#     is_iv: boolean
-#         True if `c_true` are option IVs rather than prices
-#     W: numpy.ndarray-like
-#         weights to components of loss function
-#
-#     Return
-#     ------
-#     res: float
-#         loss function value
-#     """
-#     if W is None:
-#         W = np.diag(np.ones(len(c_true)))
-#
-#     # number of components
-#     N = len(wght)
-#
-#     # decompose par into mu and sigma
-#     mu = par[:N]
-#     sigma = par[N:]
-#
-#     # fitted values
-#     c_hat = price_under_mixture(strike, rf, mu, sigma, wght)
-#     f_hat = np.dot(wght, np.exp(mu + 0.5*sigma*sigma))
-#
-#     # if implied_vol, transform to iv and log-prices
-#     if is_iv:
-#         # tau = 1 to avoid rescaling; make sure rf is per period!
-#         c_hat = bs_iv(c_hat, f_hat, strike, rf, tau = 1)
-#         f_hat = np.log(f_hat); f_true = np.log(f_true)
-#
-#     # pack into objective
-#     res = loss_fun(c_true, c_hat, f_true, f_hat, W)
-#
-#     return res
-#
-#
-# def loss_fun(c_true, c_hat, f_true, f_hat, W=None):
-#     """Compute value of loss function.
-#
-#     Quadratic loss with weights defined in `W`. Weight of forward pricing
-#     error is exactly 1, so rescale `W` accordingly.
-#
-#     Parameters
-#     ----------
-#     c_true: numpy.ndarray
-#         (M,) array of real-world option prices (IVs)
-#     c_hat: numpy.ndarray
-#         (M,) array of fitted option prices (IVs)
-#     f_true: float
-#         real-world price of forward contract on underlying
-#     f_hat: float
-#         fitted price of forward contract on underlying
-#     W: numpy.ndarray_like
-#         weights to components of loss function
-#
-#     Return
-#     ------
-#     loss: float
-#         value of loss function
-#     """
-#     # if no weighting matrix provided, use equal weighting
-#     if W is None:
-#         W = np.eye(len(c_hat))
-#
-#     # deviations from options prices (ivs)
-#     c_dev = c_true - c_hat
-#
-#     # deviations from forward price (log-price)
-#     f_dev = f_true - f_hat
-#
-#     # loss: quadratic form of deviations with weights in W
-#     loss = 1e04*(np.dot(c_dev, np.dot(W, c_dev)) + f_dev*f_dev)
-#
-#     return loss
-#
-#
-# def price_under_mixture(strike, rf, mu, sigma, wght):
-#     """
-#     Computes the price of a call option under assumption that the underlying 
-#     follows a mixture of lognormal distributions with parameters specified in 
-#     `mu` and `sigma` and weights specified in `w`.
-# 
-#     Everything is per period
-# 
-#     Parameters
-#     ----------
-#     strike: numpy.ndarray
-#         of strike prices
-#     rf: float
-#         risk-free rate, in (frac of 1), per period
-#     mu: numpy.ndarray
-#         of means of log-normal distributions in the mixture
-#     sigma: numpy.ndarray
-#         of st. deviations of log-normal distributions in the mixture
-#     wght: numpy.ndarray
-#         of component weights
-#     Returns
-#     -------
-#     c: numpy.ndarray
-#         of call option prices
-#     p: numpy.ndarray
-#         of put option prices
-#     """
-#     N = len(strike)
-#     M = len(mu)
-# 
-#     # tile with strike a matrix with rows for distributional components
-#     strike = np.array([strike, ] * M)
-# 
-#     # tile with mu and sigma matrices with columns for strikes
-#     mu = np.array([mu,]*N).transpose()
-#     # %timeit sigma = np.tile(sigma[np.newaxis].T, (1, len(strike)))
-#     sigma = np.array([sigma,]*N).transpose()
-# 
-#     # calculate forward price based on distributional assumptions
-#     f = np.exp(mu + 0.5*sigma*sigma)
-# 
-#     # finally, call prices
-#     c = bs_price(f, strike, rf, tau = 1, sigma = sigma)
-# 
-#     # result
-#     res = wght.dot(c)
-# 
-#     return res
-#
-#
-# def get_wings(r25, r10, b25, b10, atm, y, tau):
-#     """Find no-arbitrage quotes of single options from quotes of contracts.
-#
-#     Following Malz (2014), one can recover prices (in terms of implied vol)
-#     of the so-called wing options, or individual options entering the risk
-#     reversals and strangles.
-#
-#     Everything relevant is annualized.
-#
-#     Parameters
-#     ----------
-#     r25: numpy.ndarray
-#         iv of 25-delta risk reversals
-#     atm: numpy.ndarray
-#         iv of ATMF
-#     y: float
-#         dividend yield, in (frac of 1)
-#     tau: float
-#         time to maturity
-#
-#     Return
-#     ------
-#     deltas: numpy.ndarray
-#         of deltas (delta of ATM is re-calculated)
-#     ivs: numpy.ndarray
-#         of implied volatilities of wing options
-#     """
-#     # slightly different delta of atm option
-#     atm_delta = np.exp(-y*tau) * fast_norm_cdf(0.5*atm*np.sqrt(tau))
-#
-#     # deltas
-#     deltas = np.array([0.1, 0.25, atm_delta, 0.75, 0.9])
-#
-#     #
-#     ivs = np.array([
-#         atm + b10 + 0.5*r10,
-#         atm + b25 + 0.5*r25,
-#         atm,
-#         atm + b25 - 0.5*r25,
-#         atm + b10 - 0.5*r10
-#     ])
-#
-#     return deltas, ivs
-#
-#
-# def optimize_for_mixture_par(x0, K, rf, c_true, f_true, is_iv, W,
-#     opt_meth, **kwargs):
-#     """
-#     TODO: relocate to wrappers
-#     """
-#     if opt_meth == "differential_evolution":
-#         # redefine bounds - now need one on weight now
-#         new_bounds = kwargs["bounds"] + [(0.01, 0.49)]
-# 
-#         # new objective: function of [mu1,mu2,s1,s2,w1]
-#         def new_obj_fun(x):
-#             # mus, sigma
-#             x1 = x[:4]
-#             # weight
-#             x2 = np.array([x[4], 1-x[4]])
-# 
-#             return objective_for_rnd(x1, x2, K, rf, c_true, f_true, is_iv, W)
-# 
-#         # optimize
-#         res = differential_evolution(new_obj_fun, new_bounds)
-#         # unpack weight
-#         w = np.array([res.x[-1], 1-res.x[-1]])
-#         # unpack mu, sigma
-#         x = res.x[:4]
-# 
-#     else:
-#         # allocate space for grid search over weight
-#         xs = {}
-#         loss = {}
-#         # loop over weights
-#         for p in range(1,50,2):
-#             # two weights
-#             wght = np.array([p/100, 1-p/100])
-# 
-#             # objective changes with each weight
-#             obj_fun = lambda x: \
-#                 objective_for_rnd(x, wght, K, rf, c_true, f_true, True, W)
-# 
-#             # optimize (**kwargs are for bounds and constraints)
-#             res = minimize(obj_fun, x0, method=opt_meth, **kwargs)
-# 
-#             # store parameters, value
-#             xs.update({p/100 : res.x})
-#             loss.update({res.fun : p/100})
-# 
-#         logger.debug(("Losses over w:\n"+"%04d "*len(loss.get_keys())+"\n") %
-#             tuple(range(1,50,2)))
-#         logger.debug(("\n"+"%4.3f "*len(loss.get_keys())+"\n") %
-#             tuple(loss.get_keys()))
-# 
-#         # find minimum of losses
-#         best_p = loss[min(loss.get_keys())]
-#         w = np.array([best_p, 1-best_p])
-# 
-#         # mu, sigma
-#         x = xs[best_p]
-# 
-#     # warning if weight is close to 0 or 0.5
-#     if (w[0] < 0.02) or (w[0] > 0.48):
-#         logger.warning("Weight of the first component is at the boundary: {}".\
-#             format(w[0]))
-# 
-#     return x, w
-#
-#
 # def rnd_nonparametric(y, X, X_pred, rf, tau, is_iv=True, h=None, **kwargs):
 #     """
 #
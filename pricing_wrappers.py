@@ -1,12 +1,102 @@
 import pandas as pd
-from scipy import integrate
 import optools.pricing as op_func
-import re
-from optools.volsurface import VolatilitySmile
+import os
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from optools.volsurface import VolatilitySmile, stack_smiles, \
+    smiles_from_combinations
+from optools.grids import strike_grids
+from optools.helpers import spline_rows
+from optools.quadrature import get_weights
 import numpy as np
 
 
-def wrapper_smile_from_series(series, tau, fill_no_arb=False):
+class QuoteSchema:
+    """Positions of quotes among the columns of a table, found once.
+
+    Columns 'spot', 'forward', 'rf', 'div_yield' and 'atm_vola' are found
+    by name, combinations by digits (the delta, in percent) followed by the
+    contract, 'rr' or 'bf', as in '25rr' or '10bf'; other columns are
+    ignored. Rows of quotes are then split by position, for one row or
+    many at once.
+
+    Parameters
+    ----------
+    columns : iterable
+        of column names (or the index of a Series of quotes)
+
+    """
+    market_names = ("spot", "forward", "rf", "div_yield", "atm_vola")
+    contracts = ("rr", "bf")
+
+    def __init__(self, columns):
+        """
+        """
+        self.columns = tuple(columns)
+
+        # (name: position) and (delta: (contract: position))
+        self.market = dict()
+        self.combies = dict()
+
+        for p, c in enumerate(self.columns):
+            c = str(c)
+            if c in self.market_names:
+                self.market[c] = p
+            elif c[-2:] in self.contracts and c[:-2].isdigit():
+                self.combies.setdefault(int(c[:-2]) / 100, dict())[c[-2:]] = p
+
+        missing = [k for k in self.market_names if k not in self.market]
+        if len(missing) > 0:
+            raise ValueError("Columns {} not found!".format(missing))
+
+        # positions of the columns used, in order
+        self.positions = sorted(
+            list(self.market.values()) +
+            [p for v in self.combies.values() for p in v.values()])
+
+    def __repr__(self):
+        return "QuoteSchema(deltas={})".format(sorted(self.combies))
+
+    def split(self, values):
+        """Split quotes into market data and combinations by position.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            (C,) quotes of one row or (N, C) of many, columns as `columns`
+
+        Returns
+        -------
+        market : dict
+            of (name: float or (N,) array), for each of `market_names`
+        combies : dict
+            of (delta: {'rr': ..., 'bf': ...}), as expected by
+            `volsurface.smiles_from_combinations`, nan for a contract
+            without a column
+
+        """
+        values = np.asarray(values)
+
+        def take(p):
+            return np.asarray(values[..., p], dtype=float)
+
+        market = {k: take(p) for k, p in self.market.items()}
+        combies = {
+            d: {c: take(v[c]) if c in v else np.nan for c in self.contracts}
+            for d, v in sorted(self.combies.items())
+        }
+
+        return market, combies
+
+
+@lru_cache(maxsize=64)
+def get_quote_schema(columns):
+    """Get the QuoteSchema of a tuple of `columns`, reusing cached ones."""
+    return QuoteSchema(columns)
+
+
+def wrapper_smile_from_series(series, tau, fill_no_arb=False,
+                              convention="spot", atm="atmf"):
     """
 
     Parameters
@@ -16,6 +106,10 @@ def wrapper_smile_from_series(series, tau, fill_no_arb=False):
     intpl_kwargs
     estim_kwargs
     fill_no_arb : bool
+    convention : str
+        delta convention of the quotes, see `pricing.delta_conventions`
+    atm : str
+        'atmf' or 'dns', definition of the at-the-money quote
 
     Returns
     -------
@@ -29,32 +123,21 @@ def wrapper_smile_from_series(series, tau, fill_no_arb=False):
         series.update(pd.Series(op_func.fill_by_no_arb(tau=tau,
                                                        **no_arb_dict)))
 
-    # find combinations: these have to start with digits --------------------
-    combies_regex = re.compile("[0-9]+[a-z]{2}")
-    combies_names = list(filter(combies_regex.match, series.index))
-    group_fun = lambda x: int(x[:2]) / 100
-
-    # group by delta, rename from '25rr' to 'rr' etc.
-    rename_dict = {k: k[2:] for k in combies_names}
-    combies = {
-        k: v.rename(rename_dict)
-        for k, v in series.loc[combies_names].dropna().groupby(group_fun)
-    }
+    # split by position; deltas with a missing quote are left out ---------
+    market, combies = get_quote_schema(tuple(series.index)).split(
+        series.values)
+    combies = {k: v for k, v in combies.items()
+               if not np.isnan(list(v.values())).any()}
 
     # vol smile -------------------------------------------------------------
     res = VolatilitySmile.by_delta_from_combinations(
-        combies=combies,
-        atm_vola=series.loc["atm_vola"],
-        spot=series.loc["spot"],
-        forward=series.loc["forward"],
-        rf=series.loc["rf"],
-        div_yield=series.loc["div_yield"],
-        tau=tau)
+        combies=combies, tau=tau, convention=convention, atm=atm, **market)
 
     return res
 
 
-def wrapper_mfiv_from_series(series, tau, intpl_kwargs, svix=False):
+def wrapper_mfiv_from_series(series, tau, intpl_kwargs, svix=False,
+                             convention="spot", atm="atmf"):
     """Calculate MFIV from iv of combinations, forward and the rest.
 
     Find valid combinations (by name) in `series`, constructs a
@@ -76,6 +159,10 @@ def wrapper_mfiv_from_series(series, tau, intpl_kwargs, svix=False):
     estim_kwargs : dict
     svix : bool
         True to use simple variance swap rate of Martin (2017) instead
+    convention : str
+        delta convention of the quotes, see `pricing.delta_conventions`
+    atm : str
+        'atmf' or 'dns', definition of the at-the-money quote
 
     Returns
     -------
@@ -87,7 +174,8 @@ def wrapper_mfiv_from_series(series, tau, intpl_kwargs, svix=False):
         intpl_kwargs = {}
 
     # vol smile -------------------------------------------------------------
-    smile = wrapper_smile_from_series(series, tau)
+    smile = wrapper_smile_from_series(series, tau, convention=convention,
+                                      atm=atm)
 
     smile_interp = smile.dropna(from_index=True).interpolate(**intpl_kwargs)
 
@@ -96,6 +184,427 @@ def wrapper_mfiv_from_series(series, tau, intpl_kwargs, svix=False):
     return res
 
 
+def _smiles_from_values(values, schema, tau, **kwargs):
+    """Construct smiles from rows of quotes, deltas to strikes at once.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        (N, C) quotes, columns as in `schema`
+    schema : QuoteSchema
+    tau : float
+        maturity, in years
+    **kwargs : any
+        `convention` and `atm` of `volsurface.smiles_from_combinations`
+
+    Returns
+    -------
+    res : dict
+        of (row number: VolatilitySmile)
+
+    """
+    market, combies = schema.split(values)
+
+    # a missing quote of either contract removes both vanillas of that delta
+    arr = smiles_from_combinations(combies, tau=tau, **market, **kwargs)
+
+    vola, strike, delta = arr["vola"], arr["strike"], arr["delta"]
+
+    valid = ~(np.isnan(strike) | np.isnan(vola))
+
+    res = {
+        p: VolatilitySmile.from_arrays(
+            vola[p, valid[p]], strike[p, valid[p]], spot=arr["spot"][p],
+            forward=arr["forward"][p], rf=arr["rf"][p],
+            div_yield=arr["div_yield"][p], tau=tau, delta=delta[p, valid[p]])
+        for p in range(len(values))
+    }
+
+    return res
+
+
+def _smiles_from_block(block, tau):
+    """Construct smiles from a block of quotes, deltas to strikes at once.
+
+    Parameters
+    ----------
+    block : pandas.DataFrame
+        with columns as the index of `series` in `wrapper_mfiv_from_series`
+    tau : float
+        maturity, in years
+
+    Returns
+    -------
+    res : dict
+        of (row number: VolatilitySmile)
+
+    """
+    return _smiles_from_values(block.values,
+                               get_quote_schema(tuple(block.columns)), tau)
+
+
+def _moments_of_smiles(smiles, n_rows, intpl_kwargs):
+    """Calculate mfiv, svix and mfiskewness of (row number: smile) pairs.
+
+    Returns
+    -------
+    res : numpy.ndarray
+        (n_rows, 3), nan for rows with fewer than two valid quotes
+
+    """
+    smiles = {
+        k: v.interpolate(**intpl_kwargs)
+        for k, v in smiles.items()
+        if len(v.strike) > 1
+    }
+
+    res = np.full((n_rows, 3), np.nan)
+
+    for rows, arr in stack_smiles(smiles):
+        strike = arr["strike"]
+        spot, forward, rf, tau_ = [
+            arr[p] for p in ("spot", "forward", "rf", "tau")]
+
+        call_p = op_func.bs_price(strike=strike, rf=rf[:, np.newaxis],
+                                  tau=tau_[:, np.newaxis], vola=arr["vola"],
+                                  forward=forward[:, np.newaxis])
+
+        mfiv = op_func.mfivariance(call_p, strike, forward, rf, tau_)
+        svix = op_func.simple_var_swap_rate(call_p, strike, forward, rf, tau_)
+        mfis = op_func.mfiskewness(call_p, strike, spot, forward, rf, tau_,
+                                   mfiv=mfiv)
+
+        res[rows] = np.column_stack((mfiv, svix, mfis))
+
+    return res
+
+
+def _moments_of_block(block, tau, intpl_kwargs):
+    """Calculate mfiv, svix and mfiskewness for each row of `block`.
+
+    Returns
+    -------
+    res : numpy.ndarray
+        (N, 3), nan for rows with fewer than two valid quotes
+
+    """
+    return _moments_of_smiles(_smiles_from_block(block, tau), len(block),
+                              intpl_kwargs)
+
+
+def _moments_of_job(job):
+    """Unpack a (values, columns, tau, intpl_kwargs) job; for worker processes.
+    """
+    values, columns, tau, intpl_kwargs = job
+
+    smiles = _smiles_from_values(values, get_quote_schema(tuple(columns)),
+                                 tau)
+    res = _moments_of_smiles(smiles, len(values), intpl_kwargs)
+
+    return res
+
+
+def wrapper_smiles_from_frame(data, tau, moments=False, intpl_kwargs=None,
+                              fill_no_arb=False, convention="spot",
+                              atm="atmf"):
+    """Construct smiles from a whole table of quotes at once.
+
+    The columns of `data` are classified once (see `QuoteSchema`), then
+    quotes are taken by position and deltas are converted to strikes for
+    all rows together.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        of quotes, with columns as the index of `series` in
+        `wrapper_mfiv_from_series`
+    tau : float
+        maturity, in years
+    moments : bool
+        True to return mfiv, svix and mfiskewness instead of the smiles
+    intpl_kwargs : dict
+        arguments to VolatilitySmile.interpolate(), if `moments`
+    fill_no_arb : bool
+        True to fill one missing value of spot, forward, rf and div_yield
+        per row by `pricing.fill_by_no_arb_frame`
+    convention : str
+        delta convention of the quotes, see `pricing.delta_conventions`
+    atm : str
+        'atmf' or 'dns', definition of the at-the-money quote
+
+    Returns
+    -------
+    res : pandas.Series or pandas.DataFrame
+        of VolatilitySmile, indexed as `data`, missing quotes being left
+        out; or, if `moments`, of 'mfiv', 'svix' and 'mfiskewness', rows
+        with fewer than two valid quotes being nan
+
+    """
+    if fill_no_arb:
+        data = op_func.fill_by_no_arb_frame(data, tau)
+
+    schema = get_quote_schema(tuple(data.columns))
+
+    smiles = _smiles_from_values(data.values, schema, tau,
+                                 convention=convention, atm=atm)
+
+    if not moments:
+        res = pd.Series([smiles[p] for p in range(len(data))],
+                        index=data.index, dtype=object)
+        return res
+
+    if intpl_kwargs is None:
+        intpl_kwargs = {}
+
+    res = pd.DataFrame(_moments_of_smiles(smiles, len(data), intpl_kwargs),
+                       index=data.index,
+                       columns=["mfiv", "svix", "mfiskewness"])
+
+    return res
+
+
+def wrapper_mfiv_from_frame(data, tau, intpl_kwargs=None, svix=False,
+                            fill_no_arb=False, convention="spot", atm="atmf"):
+    """Calculate the mfiv (or svix) of each row of a table of quotes at once.
+
+    The batch counterpart of `wrapper_mfiv_from_series`, in stages over all
+    rows: deltas are converted to strikes together; smiles with equally
+    many valid quotes are interpolated by stacked cubic splines on the grids
+    of `grids.strike_grids`; smiles on grids of equal size are priced and
+    integrated together. Interpolation other than the default (spline with
+    constant extrapolation), or from fewer than four quotes, is done smile
+    by smile.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        of quotes, with columns as the index of `series` in
+        `wrapper_mfiv_from_series`
+    tau : float
+        maturity, in years
+    intpl_kwargs : dict
+        arguments to VolatilitySmile.interpolate()
+    svix : bool
+        True to use simple variance swap rate of Martin (2017) instead
+    fill_no_arb : bool
+        True to fill one missing value of spot, forward, rf and div_yield
+        per row by `pricing.fill_by_no_arb_frame`
+    convention : str
+        delta convention of the quotes, see `pricing.delta_conventions`
+    atm : str
+        'atmf' or 'dns', definition of the at-the-money quote
+
+    Returns
+    -------
+    res : pandas.Series
+        of mfiv (or svix), in (frac of 1) p.a., indexed as `data`; rows
+        with fewer than two valid quotes are nan
+
+    """
+    if intpl_kwargs is None:
+        intpl_kwargs = {}
+
+    batched = set(intpl_kwargs).issubset({"in_method", "ex_method"}) and \
+        intpl_kwargs.get("in_method", "spline") == "spline" and \
+        intpl_kwargs.get("ex_method", "constant") == "constant"
+
+    if fill_no_arb:
+        data = op_func.fill_by_no_arb_frame(data, tau)
+
+    # deltas to strikes ---------------------------------------------------
+    market, combies = get_quote_schema(tuple(data.columns)).split(
+        data.values)
+    arr = smiles_from_combinations(combies, tau=tau, convention=convention,
+                                   atm=atm, **market)
+
+    strike, vola = arr["strike"], arr["vola"]
+    forward, rf, tau_ = arr["forward"], arr["rf"], arr["tau"]
+
+    valid = ~(np.isnan(strike) | np.isnan(vola))
+    n_valid = valid.sum(axis=1)
+
+    res = np.full(len(data), np.nan)
+
+    for k in np.unique(n_valid):
+        rows = np.flatnonzero(n_valid == k)
+
+        if k < 2:
+            continue
+
+        k_strike = strike[rows][valid[rows]].reshape(-1, k)
+        k_vola = vola[rows][valid[rows]].reshape(-1, k)
+
+        if not batched or k < 4:
+            for p, r in enumerate(rows):
+                smile = VolatilitySmile.from_arrays(
+                    k_vola[p], k_strike[p], spot=arr["spot"][r],
+                    forward=forward[r], rf=rf[r],
+                    div_yield=arr["div_yield"][r], tau=tau_[r])
+                res[r] = smile.interpolate(**intpl_kwargs)\
+                    .get_mfivariance(svix=svix)
+            continue
+
+        # interpolate, price and integrate on grids of equal size --------
+        for sub, grids, _ in strike_grids(k_strike, forward[rows], k_vola,
+                                          tau_[rows]):
+            r = rows[sub]
+
+            # constant extrapolation with endpoint values
+            eval_strike = np.clip(grids, k_strike[sub, :1],
+                                  k_strike[sub, -1:])
+            vola_i = spline_rows(eval_strike, k_strike[sub], k_vola[sub])
+
+            call_p = op_func.bs_price(strike=grids, rf=rf[r, np.newaxis],
+                                      tau=tau_[r, np.newaxis], vola=vola_i,
+                                      forward=forward[r, np.newaxis])
+
+            if svix:
+                res[r] = op_func.simple_var_swap_rate(
+                    call_p, grids, forward[r], rf[r], tau_[r])
+            else:
+                res[r] = op_func.mfivariance(call_p, grids, forward[r],
+                                             rf[r], tau_[r])
+
+    res = pd.Series(res, index=data.index, name="svix" if svix else "mfiv")
+
+    return res
+
+
+def wrapper_moments_by_block(data, tau, chunksize=1000, intpl_kwargs=None,
+                             fill_no_arb=False):
+    """Calculate model-free moments from a history of quotes, block by block.
+
+    A generator: only one block of quotes and its smiles are held in memory
+    at a time. Within each block, deltas are converted to strikes for all
+    rows at once, each smile is interpolated, and smiles with equally many
+    strikes are priced and integrated together.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame or iterable
+        of quotes, with columns as the index of `series` in
+        `wrapper_mfiv_from_series`; an iterable of such DataFrames (e.g.
+        from pandas.read_csv(..., chunksize=...)) is consumed as it is
+    tau : float
+        maturity, in years
+    chunksize : int
+        number of rows per block, if `data` is a DataFrame
+    intpl_kwargs : dict
+        arguments to VolatilitySmile.interpolate()
+    fill_no_arb : bool
+        True to fill one missing value of spot, forward, rf and div_yield
+        per row by `pricing.fill_by_no_arb_frame`
+
+    Yields
+    ------
+    res : pandas.DataFrame
+        of 'mfiv', 'svix' and 'mfiskewness', indexed as the block; rows with
+        fewer than two valid quotes are nan
+
+    """
+    if intpl_kwargs is None:
+        intpl_kwargs = {}
+
+    if isinstance(data, pd.DataFrame):
+        blocks = (data.iloc[p:(p + chunksize)]
+                  for p in range(0, len(data), chunksize))
+    else:
+        blocks = data
+
+    for block in blocks:
+        if fill_no_arb:
+            block = op_func.fill_by_no_arb_frame(block, tau)
+
+        res = pd.DataFrame(_moments_of_block(block, tau, intpl_kwargs),
+                           index=block.index,
+                           columns=["mfiv", "svix", "mfiskewness"])
+
+        yield res
+
+
+def wrapper_moments_parallel(data, tau, chunksize=1000, intpl_kwargs=None,
+                             n_jobs=None):
+    """Calculate model-free moments of several quote histories in parallel.
+
+    Each history is split into blocks of `chunksize` rows, and (history,
+    block) jobs are distributed over a pool of processes. Jobs carry only
+    the float array of the quote columns (see `QuoteSchema`) and their
+    names, other columns are left out; the results are reassembled in the original order. Blocks are the same as in
+    `wrapper_moments_by_block`, so the output does not depend on `n_jobs`.
+
+    Parameters
+    ----------
+    data : dict or pandas.DataFrame
+        of (key: DataFrame of quotes), e.g. keyed by currency pair; see
+        `wrapper_moments_by_block` for the columns
+    tau : float
+        maturity, in years
+    chunksize : int
+        number of rows per block
+    intpl_kwargs : dict
+        arguments to VolatilitySmile.interpolate()
+    n_jobs : int
+        number of processes; None for the number of cpus, 1 to run serially
+        in this process
+
+    Returns
+    -------
+    res : dict or pandas.DataFrame
+        of (key: DataFrame of 'mfiv', 'svix' and 'mfiskewness'); a DataFrame
+        if `data` is one
+
+    """
+    if intpl_kwargs is None:
+        intpl_kwargs = {}
+
+    if isinstance(data, pd.DataFrame):
+        return wrapper_moments_parallel({None: data}, tau, chunksize,
+                                        intpl_kwargs, n_jobs)[None]
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+
+    # shard by (key, block)
+    shards = [(k, p) for k, v in data.items()
+              for p in range(0, len(v), chunksize)]
+
+    # only the quote columns are cast and sent, others (e.g. a ticker) may
+    #   be of any type
+    quotes = dict()
+    for k, v in data.items():
+        schema = get_quote_schema(tuple(v.columns))
+        quotes[k] = (v.iloc[:, schema.positions],
+                     [schema.columns[p] for p in schema.positions])
+
+    jobs = (
+        (quotes[k][0].values[p:(p + chunksize)].astype(float),
+         quotes[k][1], tau, intpl_kwargs)
+        for k, p in shards
+    )
+
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            blocks = list(executor.map(
+                _moments_of_job, jobs,
+                chunksize=max(1, len(shards) // (4 * n_jobs))))
+    else:
+        blocks = [_moments_of_job(job) for job in jobs]
+
+    # reassemble in order
+    res = dict()
+    for (k, p), v in zip(shards, blocks):
+        res.setdefault(k, list()).append(v)
+
+    res = {
+        k: pd.DataFrame(
+            np.vstack(res[k]) if k in res else np.empty((0, 3)),
+            index=v.index, columns=["mfiv", "svix", "mfiskewness"])
+        for k, v in data.items()
+    }
+
+    return res
+
+
 def mfiskew_wrapper(iv_surf, forward_p, rf, tau, spot_p, method="spline"):
     """Wrapper.
 
@@ -138,7 +647,7 @@ def mfiskew_wrapper(iv_surf, forward_p, rf, tau, spot_p, method="spline"):
         K_C**2 * C
     yP = (6 * np.log(spot_p / K_P) + 3 * np.log(spot_p / K_P) ** 2) /\
         K_P**2 * P
-    W = integrate.simps(yC, K_C) - integrate.simps(yP, K_P)
+    W = get_weights(K_C).dot(yC) - get_weights(K_P).dot(yP)
 
     # quadratic contract
     V = mfiv_wrapper(iv_surf, forward_p, rf, tau, method)
@@ -148,7 +657,7 @@ def mfiskew_wrapper(iv_surf, forward_p, rf, tau, spot_p, method="spline"):
         K_C**2 * C
     yP = (12 * np.log(spot_p / K_P) ** 2 + 4 * np.log(spot_p / K_P)**3) /\
         K_P**2 * P
-    X = integrate.simps(yC, K_C) + integrate.simps(yP, K_P)
+    X = get_weights(K_C).dot(yC) + get_weights(K_P).dot(yP)
 
     # mu
     mu = np.exp(rf*tau) - 1 - np.exp(rf*tau)/2*V - np.exp(rf*tau)/6*W -\
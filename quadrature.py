@@ -0,0 +1,178 @@
+import numpy as np
+from functools import lru_cache
+
+
+def simpson_weights(x):
+    """Calculate weights of Simpson's rule over the (non-uniform) grid `x`.
+
+    The weights reproduce scipy.integrate.simps with even='avg', such that
+    simps(y, x) equals weights.dot(y), and can be reused for any `y` on
+    the same grid. Vectorized over the leading dimensions of `x`.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        (..., N) array of sorted points
+
+    Returns
+    -------
+    res : numpy.ndarray
+        (..., N) array of weights
+
+    """
+    x = np.asarray(x, dtype=float)
+    n = x.shape[-1]
+
+    h = np.diff(x, axis=-1)
+
+    res = np.zeros_like(x)
+
+    def add_basic_simpson(start, stop, scale):
+        # parabolas over pairs of intervals [i, i+1], [i+1, i+2]
+        i = np.arange(start, stop, 2)
+        h0 = h[..., i]
+        h1 = h[..., i + 1]
+        hsum = h0 + h1
+
+        res[..., i] += scale * hsum / 6.0 * (2.0 - h1 / h0)
+        res[..., i + 1] += scale * hsum / 6.0 * hsum * (hsum / (h0 * h1))
+        res[..., i + 2] += scale * hsum / 6.0 * (2.0 - h0 / h1)
+
+    if n % 2 == 1:
+        add_basic_simpson(0, n - 2, 1.0)
+    elif n > 1:
+        # average of simpson on the first intervals + trapezoid on the
+        #   last one and trapezoid on the first interval + simpson on the
+        #   rest
+        add_basic_simpson(0, n - 3, 0.5)
+        add_basic_simpson(1, n - 2, 0.5)
+        res[..., [-2, -1]] += 0.25 * h[..., [-1]]
+        res[..., [0, 1]] += 0.25 * h[..., [0]]
+
+    return res
+
+
+def trapezoid_weights(x):
+    """Calculate weights of the trapezoidal rule over the grid `x`.
+
+    Such that numpy.trapz(y, x) equals weights.dot(y). Vectorized over the
+    leading dimensions of `x`.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        (..., N) array of sorted points
+
+    Returns
+    -------
+    res : numpy.ndarray
+        (..., N) array of weights
+
+    """
+    x = np.asarray(x, dtype=float)
+
+    h = np.diff(x, axis=-1) / 2
+
+    res = np.zeros_like(x)
+    res[..., :-1] += h
+    res[..., 1:] += h
+
+    return res
+
+
+@lru_cache(maxsize=64)
+def _leggauss(n):
+    """Gauss-Legendre nodes and weights on [-1, 1], read-only."""
+    nodes, weights = np.polynomial.legendre.leggauss(n)
+    nodes.setflags(write=False)
+    weights.setflags(write=False)
+
+    return nodes, weights
+
+
+def gauss_legendre(n, a, b):
+    """Calculate nodes and weights of Gauss-Legendre quadrature on [a, b].
+
+    Nodes and weights on [-1, 1] are computed once per `n` and mapped
+    linearly to [a, b]. Vectorized for `a` and `b`.
+
+    Parameters
+    ----------
+    n : int
+        number of nodes
+    a : float or numpy.ndarray
+        lower integration limit(s)
+    b : float or numpy.ndarray
+        upper integration limit(s)
+
+    Returns
+    -------
+    nodes : numpy.ndarray
+        (..., n) array of nodes
+    weights : numpy.ndarray
+        (..., n) array of weights
+
+    """
+    t, w = _leggauss(n)
+
+    half_width = np.asarray((b - a) / 2, dtype=float)[..., np.newaxis]
+    mid = np.asarray((a + b) / 2, dtype=float)[..., np.newaxis]
+
+    nodes = half_width * t + mid
+    weights = half_width * w
+
+    return nodes, weights
+
+
+_rules = {
+    "simpson": simpson_weights,
+    "trapezoid": trapezoid_weights
+}
+
+
+@lru_cache(maxsize=256)
+def _cached_weights(rule, x_bytes):
+    """Weights of `rule` over the grid serialized to `x_bytes`, read-only.
+    """
+    res = _rules[rule](np.frombuffer(x_bytes, dtype=float))
+    res.setflags(write=False)
+
+    return res
+
+
+def get_weights(x, rule="simpson"):
+    """Get quadrature weights over the grid `x`, reusing cached ones.
+
+    One-dimensional grids are keyed by their contents, such that repeated
+    grids (e.g. from `strike_range`) cost one lookup; the least recently
+    used grids are evicted first. Weights over (N, M) per-row grids are
+    computed afresh.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        (M,) or (N, M) array of sorted points
+    rule : str
+        'simpson' or 'trapezoid'
+
+    Returns
+    -------
+    res : numpy.ndarray
+        (M,) or (N, M) array of weights, read-only if cached
+
+    """
+    if rule not in _rules:
+        raise ValueError("Quadrature rule {} not implemented, use one of {}!"
+                         .format(rule, sorted(_rules)))
+
+    x = np.asarray(x, dtype=float)
+
+    if x.ndim > 1:
+        return _rules[rule](x)
+
+    return _cached_weights(rule, np.ascontiguousarray(x).tobytes())
+
+
+def clear_cache():
+    """Clear the cache of quadrature weights."""
+    _cached_weights.cache_clear()
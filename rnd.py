@@ -0,0 +1,372 @@
+"""Estimation of the risk-neutral density as a mixture of log-normals.
+"""
+import pandas as pd
+import numpy as np
+from scipy.optimize import least_squares
+
+from optools.lnmix import lognormal_mixture
+from optools.calibration import (mixture_residuals, vega_scale,
+                                 levenberg_marquardt)
+
+
+def _unpack(x, n_comp):
+    """Map free parameters to (mu, sigma, wght).
+
+    Free parameters are [mu, log(sigma), z] where weights are the softmax
+    of z with the last element fixed at zero. Vectorized over leading
+    dimensions of `x`.
+    """
+    mu = x[..., :n_comp]
+    sigma = np.exp(x[..., n_comp:(2 * n_comp)])
+
+    z = np.concatenate((x[..., (2 * n_comp):], np.zeros(x.shape[:-1] + (1, ))),
+                       axis=-1)
+    wght = np.exp(z - z.max(axis=-1, keepdims=True))
+    wght = wght / wght.sum(axis=-1, keepdims=True)
+
+    return mu, sigma, wght
+
+
+def _pack(mu, sigma, wght):
+    """Inverse of `_unpack`."""
+    mu, sigma, wght = [np.asarray(p, dtype=float) for p in (mu, sigma, wght)]
+    z = np.log(wght[..., :-1]) - np.log(wght[..., -1:])
+
+    res = np.concatenate((mu, np.log(sigma), z), axis=-1)
+
+    return res
+
+
+def _residuals(x, strike, call_p, forward, rf, n_comp, scale):
+    """Residuals of `calibration.mixture_residuals` in free parameters."""
+    mu, sigma, wght = _unpack(x, n_comp)
+
+    res = mixture_residuals(mu, sigma, wght, strike, call_p, forward, rf,
+                            scale=scale)
+
+    return res
+
+
+def _residuals_and_jacobian(x, strike, call_p, forward, rf, n_comp, scale):
+    """Residuals and their derivatives w.r.t. the free parameters."""
+    mu, sigma, wght = _unpack(x, n_comp)
+
+    res, jac = mixture_residuals(mu, sigma, wght, strike, call_p, forward,
+                                 rf, scale=scale, jac=True)
+
+    # chain rule: d sigma / d log(sigma) = sigma; d wght_i / d z_j =
+    #   wght_i * (1{i=j} - wght_j), so d res / d z_j is
+    #   wght_j * (d res / d wght_j - sum_i wght_i * d res / d wght_i)
+    d_mu = jac[..., :n_comp]
+    d_sigma = jac[..., n_comp:(2 * n_comp)] * sigma[..., np.newaxis, :]
+    d_wght = jac[..., (2 * n_comp):]
+    wght = wght[..., np.newaxis, :]
+    d_z = wght[..., :-1] * (d_wght[..., :-1] -
+                            (d_wght * wght).sum(axis=-1, keepdims=True))
+
+    res_jac = np.concatenate((d_mu, d_sigma, d_z), axis=-1)
+
+    return res, res_jac
+
+
+def _jacobian(x, strike, call_p, forward, rf, n_comp, scale):
+    """Derivatives of `_residuals` w.r.t. the free parameters."""
+    _, res = _residuals_and_jacobian(x, strike, call_p, forward, rf, n_comp,
+                                     scale)
+
+    return res
+
+
+def _initial_guess(call_p, strike, forward, rf, n_comp):
+    """Starting values: components spread around a single log-normal.
+
+    Vectorized over rows of (N, M) `call_p` and `strike`.
+    """
+    forward, rf = [np.asarray(p, dtype=float)[..., np.newaxis]
+                   for p in (forward, rf)]
+
+    # total vola from the price of the call closest to the forward
+    p = np.argmin(np.abs(strike - forward), axis=-1)[..., np.newaxis]
+    strike_p = np.take_along_axis(strike, p, axis=-1)
+    call_p_p = np.take_along_axis(call_p, p, axis=-1)
+
+    time_value = call_p_p * np.exp(rf) - np.maximum(forward - strike_p, 0)
+    sigma = np.maximum(np.sqrt(2 * np.pi) * time_value / forward, 1e-4)
+
+    spread = np.linspace(-0.5, 0.5, n_comp) * sigma if n_comp > 1 else 0.0
+
+    mu = np.log(forward) - 0.5 * sigma * sigma + spread
+    sigma = np.broadcast_to(sigma, mu.shape)
+
+    res = _pack(mu, sigma, np.full(mu.shape, 1 / n_comp))
+
+    return res
+
+
+def estimate_rnd(call_p, strike, forward, rf, tau, n_comp=2, weights=None,
+                 space="price", x0=None, full_output=False, **kwargs):
+    """Fit a mixture of log-normals to call prices.
+
+    The loss is the sum of squared (weighted) call pricing errors plus the
+    squared relative forward pricing error (see `calibration`), and is
+    minimized with analytic derivatives by scipy.optimize.least_squares.
+
+    Parameters
+    ----------
+    call_p : numpy.ndarray
+        (M,) array of call prices
+    strike : numpy.ndarray
+        (M,) array of strike prices
+    forward : float
+        forward price
+    rf : float
+        risk-free rate, in (frac of 1) p.a.
+    tau : float
+        maturity, in years
+    n_comp : int
+        number of components
+    weights : numpy.ndarray, optional
+        (M,) weights of squared pricing errors; equal weights by default
+    space : str
+        'price' for pricing errors relative to the forward, 'iv' for
+        pricing errors divided by vegas of the observed options
+    x0 : lognormal_mixture, optional
+        starting values, e.g. the estimate for the previous date
+    full_output : bool
+        True to also return the output of the optimizer
+    **kwargs : any
+        additional arguments to scipy.optimize.least_squares
+
+    Returns
+    -------
+    res : lognormal_mixture
+        with per-period parameters, components sorted by mu
+    info : scipy.optimize.OptimizeResult
+        only if `full_output` is True
+
+    """
+    call_p = np.asarray(call_p, dtype=float)
+    strike = np.asarray(strike, dtype=float)
+
+    # everything is per period
+    rf = rf * tau
+
+    if space == "price":
+        scale = np.full_like(call_p, forward)
+    elif space == "iv":
+        scale = vega_scale(call_p, strike, forward, rf)
+    else:
+        raise NotImplementedError("Loss space not implemented!")
+
+    if weights is not None:
+        scale = scale / np.sqrt(weights)
+
+    if x0 is None:
+        x0 = _initial_guess(call_p, strike, forward, rf, n_comp)
+    else:
+        x0 = _pack(x0.mu, x0.sigma, x0.wght)
+
+    args = (strike, call_p, forward, rf, n_comp, scale)
+
+    info = least_squares(_residuals, x0, jac=_jacobian, args=args, **kwargs)
+
+    mu, sigma, wght = _unpack(info.x, n_comp)
+    order = np.argsort(mu)
+
+    res = lognormal_mixture(mu[order], sigma[order], wght[order])
+
+    if full_output:
+        return res, info
+
+    return res
+
+
+def estimate_rnd_history(call_p, strike, forward, rf, tau, n_comp=2,
+                         weights=None, space="price", warm_start=True,
+                         **kwargs):
+    """Fit mixtures of log-normals date by date.
+
+    With `warm_start`, the estimate for each date is the starting value for
+    the next one, which on daily data takes a fraction of the iterations of
+    a cold start.
+
+    Parameters
+    ----------
+    call_p : numpy.ndarray or pandas.DataFrame
+        (T, M) of call prices, one row per date
+    strike : numpy.ndarray or pandas.DataFrame
+        (T, M) of strike prices
+    forward : numpy.ndarray or pandas.Series
+        (T,) of forward prices
+    rf : float or numpy.ndarray
+        risk-free rate(s), in (frac of 1) p.a.
+    tau : float
+        maturity, in years
+    n_comp : int
+        number of components
+    weights : numpy.ndarray, optional
+        (T, M) weights of squared pricing errors
+    space : str
+        'price' or 'iv', see `estimate_rnd`
+    warm_start : bool
+        True to start from the previous date's estimate
+    **kwargs : any
+        additional arguments to scipy.optimize.least_squares
+
+    Returns
+    -------
+    res : pandas.DataFrame
+        of per-period parameters 'mu1', ..., 'sigma1', ..., 'w1', ... and
+        the number of function evaluations 'nfev', indexed as `call_p`
+
+    """
+    if isinstance(call_p, pd.DataFrame):
+        index = call_p.index
+    else:
+        index = pd.RangeIndex(len(call_p))
+
+    call_p = np.asarray(call_p, dtype=float)
+    strike = np.broadcast_to(np.asarray(strike, dtype=float), call_p.shape)
+    forward = np.broadcast_to(np.asarray(forward, dtype=float),
+                              call_p.shape[:1])
+    rf = np.broadcast_to(np.asarray(rf, dtype=float), call_p.shape[:1])
+
+    if weights is not None:
+        weights = np.broadcast_to(np.asarray(weights, dtype=float),
+                                  call_p.shape)
+
+    columns = ["{}{:d}".format(p, q + 1)
+               for p in ("mu", "sigma", "w") for q in range(n_comp)]
+    res = pd.DataFrame(np.nan, index=index, columns=columns + ["nfev"])
+
+    x0 = None
+
+    for p in range(len(call_p)):
+        valid = ~(np.isnan(call_p[p]) | np.isnan(strike[p]))
+
+        if valid.sum() < 3 * n_comp - 1:
+            x0 = None
+            continue
+
+        mix, info = estimate_rnd(
+            call_p[p, valid], strike[p, valid], forward[p], rf[p], tau,
+            n_comp=n_comp,
+            weights=None if weights is None else weights[p, valid],
+            space=space, x0=x0 if warm_start else None,
+            full_output=True, **kwargs)
+
+        res.iloc[p] = np.concatenate((mix.mu, mix.sigma, mix.wght,
+                                      [info.nfev]))
+
+        x0 = mix if info.success else None
+
+    return res
+
+
+def estimate_rnd_batch(call_p, strike, forward, rf, tau, n_comp=2,
+                       weights=None, space="price", x0=None, **kwargs):
+    """Fit mixtures of log-normals to many smiles at once.
+
+    All smiles are solved simultaneously with the batch Levenberg-Marquardt
+    of `calibration.levenberg_marquardt`, on the same loss as in
+    `estimate_rnd`; converged smiles drop out while the rest continue.
+
+    Parameters
+    ----------
+    call_p : numpy.ndarray or pandas.DataFrame
+        (N, M) of call prices, one row per smile
+    strike : numpy.ndarray or pandas.DataFrame
+        (N, M) of strike prices
+    forward : numpy.ndarray or pandas.Series
+        (N,) of forward prices
+    rf : float or numpy.ndarray
+        risk-free rate(s), in (frac of 1) p.a.
+    tau : float or numpy.ndarray
+        maturity(-ies), in years
+    n_comp : int
+        number of components
+    weights : numpy.ndarray, optional
+        (N, M) weights of squared pricing errors
+    space : str
+        'price' or 'iv', see `estimate_rnd`
+    x0 : numpy.ndarray or pandas.DataFrame, optional
+        (N, 3*n_comp) starting values as columns 'mu1', ..., 'sigma1', ...,
+        'w1', ..., e.g. an earlier output of this function (other columns
+        of a DataFrame are ignored); rows with nan are started cold
+    **kwargs : any
+        additional arguments to `calibration.levenberg_marquardt`
+
+    Returns
+    -------
+    res : pandas.DataFrame
+        of per-period parameters 'mu1', ..., 'sigma1', ..., 'w1', ..., the
+        number of iterations 'nit' and 'converged', indexed as `call_p`;
+        rows with missing prices are nan
+
+    """
+    if isinstance(call_p, pd.DataFrame):
+        index = call_p.index
+    else:
+        index = pd.RangeIndex(len(call_p))
+
+    call_p = np.asarray(call_p, dtype=float)
+    n = len(call_p)
+
+    strike = np.broadcast_to(np.asarray(strike, dtype=float), call_p.shape)
+    forward, rf, tau = [np.broadcast_to(np.asarray(p, dtype=float), (n, ))
+                        for p in (forward, rf, tau)]
+
+    # everything is per period
+    rf = rf * tau
+
+    if space == "price":
+        scale = np.broadcast_to(forward[:, np.newaxis], call_p.shape)
+    elif space == "iv":
+        scale = vega_scale(call_p, strike, forward, rf)
+    else:
+        raise NotImplementedError("Loss space not implemented!")
+
+    if weights is not None:
+        scale = scale / np.sqrt(weights)
+
+    # smiles with complete quotes only
+    valid = np.flatnonzero(~(np.isnan(call_p) | np.isnan(strike) |
+                             np.isnan(scale)).any(axis=-1))
+
+    args = (strike[valid], call_p[valid], forward[valid], rf[valid])
+
+    columns = ["{}{:d}".format(p, q + 1)
+               for p in ("mu", "sigma", "w") for q in range(n_comp)]
+
+    guess = _initial_guess(call_p[valid], strike[valid], forward[valid],
+                           rf[valid], n_comp)
+
+    if x0 is None:
+        x0 = guess
+    else:
+        if isinstance(x0, pd.DataFrame):
+            x0 = x0.loc[:, columns]
+        x0 = _pack(*np.split(np.asarray(x0, dtype=float)[valid], 3, axis=-1))
+
+        # rows without a warm start are started cold
+        cold = ~np.isfinite(x0).all(axis=-1)
+        x0[cold] = guess[cold]
+
+    x, info = levenberg_marquardt(
+        _residuals_and_jacobian, x0, args=args + (n_comp, scale[valid]),
+        **kwargs)
+
+    # sort components by mu
+    mu, sigma, wght = _unpack(x, n_comp)
+    order = np.argsort(mu, axis=-1)
+    par = [np.take_along_axis(p, order, axis=-1) for p in (mu, sigma, wght)]
+
+    res = pd.DataFrame(np.nan, index=index, columns=columns)
+    res.iloc[valid] = np.hstack(par)
+
+    res["nit"] = 0
+    res["converged"] = False
+    res.iloc[valid, -2] = info["nit"]
+    res.iloc[valid, -1] = info["converged"]
+
+    return res
@@ -0,0 +1,354 @@
+"""Parametric smile models: SVI, SABR and vanna-volga.
+
+Each model maps a small vector of parameters to volas at any strike, given
+the forward and the maturity. SVI and SABR are calibrated to quotes by
+least squares in vola, many smiles at once with the batch
+Levenberg-Marquardt of `calibration.levenberg_marquardt`; vanna-volga
+needs no calibration, its parameters are three pivot quotes.
+"""
+import numpy as np
+import pandas as pd
+
+from optools.calibration import levenberg_marquardt
+
+
+class SVI:
+    """Raw SVI parametrization of total implied variance (Gatheral, 2004).
+
+    w(k) = a + b*(rho*(k - m) + sqrt((k - m)^2 + sigma^2)), where k is
+    log-moneyness ln(K/F) and w the implied variance times maturity.
+    """
+    param_names = ("a", "b", "rho", "m", "sigma")
+
+    @staticmethod
+    def vola(params, strike, forward, tau):
+        """Calculate volas, (..., M) for (..., 5) `params`."""
+        a, b, rho, m, sigma = [params[..., [p]] for p in range(5)]
+        k = np.log(strike / forward) - m
+
+        w = a + b * (rho * k + np.sqrt(k * k + sigma * sigma))
+
+        return np.sqrt(np.maximum(w, 0.0) / tau)
+
+    @staticmethod
+    def to_free(params):
+        """Map parameters to unconstrained ones."""
+        a, b, rho, m, sigma = [params[..., p] for p in range(5)]
+
+        return np.stack((a, np.log(b), np.arctanh(rho), m, np.log(sigma)),
+                        axis=-1)
+
+    @staticmethod
+    def from_free(x):
+        """Map unconstrained parameters back: b, sigma > 0, |rho| < 1."""
+        return np.stack((x[..., 0], np.exp(x[..., 1]), np.tanh(x[..., 2]),
+                         x[..., 3], np.exp(x[..., 4])), axis=-1)
+
+    @staticmethod
+    def initial_guess(vola, strike, forward, tau):
+        """Wing slopes of total variance from the outermost quotes.
+
+        `forward` and `tau` are (N, 1) columns.
+        """
+        k = np.log(strike / forward)
+        w = vola * vola * tau
+
+        i_mid = np.argmin(w, axis=-1)[..., np.newaxis]
+        k_mid = np.take_along_axis(k, i_mid, axis=-1)[..., 0]
+        w_mid = np.take_along_axis(w, i_mid, axis=-1)[..., 0]
+
+        slope_l = (w[..., 0] - w_mid) / np.minimum(k[..., 0] - k_mid, -1e-8)
+        slope_r = (w[..., -1] - w_mid) / np.maximum(k[..., -1] - k_mid, 1e-8)
+
+        b = np.maximum(0.5 * (slope_r - slope_l), 1e-4)
+        rho = np.clip(0.5 * (slope_r + slope_l) / b, -0.9, 0.9)
+        sigma = np.maximum(0.5 * (k[..., -1] - k[..., 0]), 1e-4)
+        a = w_mid - b * sigma * np.sqrt(1 - rho * rho)
+
+        return np.stack((a, b, rho, k_mid, sigma), axis=-1)
+
+
+class SABR:
+    """SABR model of Hagan et al. (2002), lognormal vola approximation.
+
+    The exponent beta is fixed, at 1 by default as usual for FX; the
+    parameters are alpha, rho and nu (vol of vol).
+    """
+    param_names = ("alpha", "rho", "nu")
+
+    beta = 1.0
+
+    @classmethod
+    def vola(cls, params, strike, forward, tau):
+        """Calculate volas, (..., M) for (..., 3) `params`."""
+        alpha, rho, nu = [params[..., [p]] for p in range(3)]
+        beta = cls.beta
+
+        log_fk = np.log(forward / strike)
+        fk_beta = (forward * strike)**(0.5 * (1 - beta))
+
+        z = nu / alpha * fk_beta * log_fk
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_z = np.log((np.sqrt(1 - 2 * rho * z + z * z) + z - rho) /
+                         (1 - rho))
+            z_over_x = np.where(np.abs(z) > 1e-8, z / x_z, 1 - 0.5 * rho * z)
+
+        one_b = (1 - beta) * (1 - beta)
+        denominator = fk_beta * (1 + one_b / 24 * log_fk**2 +
+                                 one_b * one_b / 1920 * log_fk**4)
+        correction = 1 + (one_b / 24 * alpha * alpha / fk_beta**2 +
+                          rho * beta * nu * alpha / (4 * fk_beta) +
+                          (2 - 3 * rho * rho) / 24 * nu * nu) * tau
+
+        return alpha / denominator * z_over_x * correction
+
+    @staticmethod
+    def to_free(params):
+        """Map parameters to unconstrained ones."""
+        return np.stack((np.log(params[..., 0]), np.arctanh(params[..., 1]),
+                         np.log(params[..., 2])), axis=-1)
+
+    @staticmethod
+    def from_free(x):
+        """Map unconstrained parameters back: alpha, nu > 0, |rho| < 1."""
+        return np.stack((np.exp(x[..., 0]), np.tanh(x[..., 1]),
+                         np.exp(x[..., 2])), axis=-1)
+
+    @classmethod
+    def initial_guess(cls, vola, strike, forward, tau):
+        """ATM vola for alpha, skew for rho, curvature for nu.
+
+        `forward` and `tau` are (N, 1) columns.
+        """
+        k = np.log(strike / forward)
+        i_atm = np.argmin(np.abs(k), axis=-1)[..., np.newaxis]
+        atm = np.take_along_axis(vola, i_atm, axis=-1)[..., 0]
+
+        # quadratic in log-moneyness through all quotes, normal equations
+        design = np.stack((np.ones_like(k), k, k * k), axis=-1)
+        coef = np.linalg.solve(
+            np.einsum("...mi,...mj->...ij", design, design),
+            np.einsum("...mi,...m->...i", design, vola))
+
+        alpha = atm * forward[..., 0]**(1 - cls.beta)
+        nu = np.clip(np.sqrt(np.maximum(3 * coef[..., 2] * atm, 1e-4)),
+                     0.05, 5.0)
+        rho = np.clip(2 * coef[..., 1] / nu, -0.9, 0.9)
+
+        return np.stack((alpha, rho, nu), axis=-1)
+
+
+class VannaVolga:
+    """Vanna-volga smile of Castagna and Mercurio (2007), second order.
+
+    The smile is implied by three pivot quotes, usually the 25-delta put,
+    the atm and the 25-delta call, and reproduces them exactly. The
+    parameters are the three pivot strikes and volas.
+    """
+    param_names = ("k1", "k2", "k3", "vola1", "vola2", "vola3")
+
+    @staticmethod
+    def vola(params, strike, forward, tau):
+        """Calculate volas, (..., M) for (..., 6) `params`."""
+        k1, k2, k3, s1, s2, s3 = [params[..., [p]] for p in range(6)]
+
+        log_k = np.log(strike)
+        l1, l2, l3 = np.log(k1), np.log(k2), np.log(k3)
+
+        y1 = (l2 - log_k) * (l3 - log_k) / ((l2 - l1) * (l3 - l1))
+        y2 = (log_k - l1) * (l3 - log_k) / ((l2 - l1) * (l3 - l2))
+        y3 = (log_k - l1) * (log_k - l2) / ((l3 - l1) * (l3 - l2))
+
+        def d1_d2(k):
+            v = s2 * np.sqrt(tau)
+            d1 = (np.log(forward / k) + 0.5 * v * v) / v
+            return d1 * (d1 - v)
+
+        # first order: quadratic in log-strike through the pivots
+        first = y1 * s1 + y2 * s2 + y3 * s3 - s2
+        second = y1 * d1_d2(k1) * (s1 - s2)**2 + \
+            y3 * d1_d2(k3) * (s3 - s2)**2
+
+        dd = d1_d2(strike)
+        arg = s2 * s2 + dd * (2 * s2 * first + second)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            res = s2 + (-s2 + np.sqrt(arg)) / dd
+
+        # limit where d1*d2 vanishes, first order where there is no root
+        res = np.where(np.abs(dd) < 1e-10, s2 + first + second / (2 * s2),
+                       res)
+        res = np.where(arg < 0, s2 + first, res)
+
+        return res
+
+    @staticmethod
+    def pivots(vola, strike, forward, tau, index=None):
+        """Parameters from quotes: the quote closest to the forward and
+        its neighbours, or quotes at `index`."""
+        if index is None:
+            k = np.abs(np.log(strike / forward))
+            mid = np.clip(np.argmin(k, axis=-1), 1, strike.shape[-1] - 2)
+            index = np.stack((mid - 1, mid, mid + 1), axis=-1)
+        else:
+            index = np.broadcast_to(np.asarray(index),
+                                    strike.shape[:-1] + (3, ))
+
+        return np.concatenate(
+            (np.take_along_axis(strike, index, axis=-1),
+             np.take_along_axis(vola, index, axis=-1)), axis=-1)
+
+
+smile_models = {"svi": SVI, "sabr": SABR, "vanna_volga": VannaVolga}
+
+
+def _get_model(model):
+    """Look up a model by name."""
+    if model not in smile_models:
+        raise ValueError("Smile model {} not implemented!".format(model))
+
+    return smile_models[model]
+
+
+def _residuals_and_jacobian(x, vola, strike, forward, tau, model, eps=1e-7):
+    """Residuals in vola and forward-difference derivatives w.r.t. `x`."""
+    def residuals(x_):
+        params = model.from_free(x_)
+        return model.vola(params, strike, forward, tau) - vola
+
+    res = residuals(x)
+
+    jac = np.empty(res.shape + (x.shape[-1], ))
+    for p in range(x.shape[-1]):
+        x_p = x.copy()
+        x_p[:, p] += eps
+        jac[..., p] = (residuals(x_p) - res) / eps
+
+    return res, jac
+
+
+def smile_model_vola(params, strike, forward, tau, model="svi"):
+    """Evaluate a parametric smile model.
+
+    Parameters
+    ----------
+    params : numpy.ndarray or pandas.DataFrame
+        (P,) or (N, P) parameters, e.g. output of `fit_smile_model`
+    strike : numpy.ndarray
+        (M,) or (N, M) strikes
+    forward : float or numpy.ndarray
+        forward price(s), (N,) if an array
+    tau : float or numpy.ndarray
+        maturity(-ies), in years, (N,) if an array
+    model : str
+        'svi', 'sabr' or 'vanna_volga'
+
+    Returns
+    -------
+    res : numpy.ndarray
+        (M,) or (N, M) volas
+
+    """
+    model = _get_model(model)
+
+    if isinstance(params, pd.DataFrame):
+        params = params.loc[:, list(model.param_names)]
+
+    params = np.asarray(params, dtype=float)
+    strike = np.asarray(strike, dtype=float)
+
+    # one forward and maturity per row of parameters
+    forward, tau = [np.asarray(p, dtype=float)[..., np.newaxis]
+                    if np.ndim(p) > 0 else p for p in (forward, tau)]
+
+    return model.vola(params, strike, forward, tau)
+
+
+def fit_smile_model(vola, strike, forward, tau, model="svi", x0=None,
+                    **kwargs):
+    """Calibrate a parametric smile model to many smiles at once.
+
+    SVI and SABR are fitted by least squares in vola, all smiles together
+    with the batch Levenberg-Marquardt; derivatives are forward
+    differences. Vanna-volga takes its pivots from the quotes.
+
+    Parameters
+    ----------
+    vola : numpy.ndarray or pandas.DataFrame
+        (M,) or (N, M) quoted volas, one row per smile
+    strike : numpy.ndarray or pandas.DataFrame
+        (M,) or (N, M) strikes, increasing along rows
+    forward : float or numpy.ndarray
+        forward price(s), (N,) if an array
+    tau : float or numpy.ndarray
+        maturity(-ies), in years
+    model : str
+        'svi', 'sabr' or 'vanna_volga'
+    x0 : numpy.ndarray or pandas.DataFrame, optional
+        (N, P) starting values, e.g. an earlier output of this function
+        for the previous dates (warm start)
+    **kwargs : any
+        additional arguments to `calibration.levenberg_marquardt`, or
+        `index` of the pivots for vanna-volga
+
+    Returns
+    -------
+    res : pandas.DataFrame
+        of parameters (named as in `param_names` of the model), root mean
+        squared error in vola 'rmse', the number of iterations 'nit' and
+        'converged', indexed as `vola`; rows with missing quotes are nan
+
+    """
+    model_ = _get_model(model)
+
+    if isinstance(vola, pd.DataFrame):
+        index = vola.index
+    else:
+        index = pd.RangeIndex(len(np.atleast_2d(vola)))
+
+    vola = np.atleast_2d(np.asarray(vola, dtype=float))
+    n = len(vola)
+
+    strike = np.broadcast_to(np.asarray(strike, dtype=float), vola.shape)
+    forward, tau = [np.broadcast_to(np.asarray(p, dtype=float), (n, ))
+                    for p in (forward, tau)]
+
+    valid = np.flatnonzero(~(np.isnan(vola) | np.isnan(strike))
+                           .any(axis=-1) & ~np.isnan(forward))
+    # forwards and maturities as columns, to broadcast against strikes
+    args = (vola[valid], strike[valid], forward[valid, np.newaxis],
+            tau[valid, np.newaxis])
+
+    columns = list(model_.param_names)
+    res = pd.DataFrame(np.nan, index=index, columns=columns)
+
+    if model_ is VannaVolga:
+        params = model_.pivots(*args, **kwargs)
+        nit, converged = np.zeros(len(valid), dtype=int), \
+            np.ones(len(valid), dtype=bool)
+    else:
+        if x0 is None:
+            params0 = model_.initial_guess(*args)
+        else:
+            if isinstance(x0, pd.DataFrame):
+                x0 = x0.loc[:, columns]
+            params0 = np.asarray(x0, dtype=float)[valid]
+
+        x, info = levenberg_marquardt(_residuals_and_jacobian,
+                                      model_.to_free(params0),
+                                      args=args + (model_, ), **kwargs)
+        params = model_.from_free(x)
+        nit, converged = info["nit"], info["converged"]
+
+    res.iloc[valid] = params
+
+    fitted = model_.vola(params, *args[1:])
+    res["rmse"] = np.nan
+    res.iloc[valid, -1] = np.sqrt(((fitted - args[0])**2).mean(axis=-1))
+
+    res["nit"] = 0
+    res["converged"] = False
+    res.iloc[valid, -2] = nit
+    res.iloc[valid, -1] = converged
+
+    return res
@@ -0,0 +1,247 @@
+"""Local-linear kernel regression of smiles.
+
+A vectorized replacement of statsmodels' KernelReg(reg_type='ll') with a
+gaussian kernel in one variable: predictions at all points, and for many
+smiles at once, are closed-form weighted least-squares fits. Bandwidths
+are either given or chosen by least-squares leave-one-out cross-validation,
+as `bw='cv_ls'` of KernelReg, for all smiles at once.
+"""
+import numpy as np
+from functools import lru_cache
+
+
+def _local_linear_sums(x, y, x_new, bw, leave_out=False):
+    """Local-linear fits at `x_new` from gaussian-weighted sums.
+
+    Shapes broadcast as x, y (..., 1, M) against x_new (..., m, 1) and bw
+    (..., 1, 1); with `leave_out`, x_new is x and observation i is left out
+    of the fit at point i.
+    """
+    d = x - x_new
+    log_w = -0.5 * (d / bw)**2
+
+    if leave_out:
+        n = log_w.shape[-1]
+        log_w = np.where(np.eye(n, dtype=bool), -np.inf, log_w)
+
+    # weights relative to the largest one, to survive small bandwidths
+    w = np.exp(log_w - log_w.max(axis=-1, keepdims=True))
+
+    # sums centered at the weighted mean of d, itself taken relative to the
+    #   point of the largest weight: the line is fitted without the
+    #   cancellation of s0*s2 - s1^2 when one weight dominates
+    d = np.broadcast_to(d, w.shape)
+    ref = np.take_along_axis(d, np.argmax(w, axis=-1)[..., np.newaxis],
+                             axis=-1)
+
+    s0 = w.sum(axis=-1, keepdims=True)
+    d_bar = (w * (d - ref)).sum(axis=-1, keepdims=True) / s0
+    y_bar = (w * y).sum(axis=-1, keepdims=True) / s0
+    d_c = d - ref - d_bar
+
+    sxx = (w * d_c * d_c).sum(axis=-1)
+    sxy = (w * d_c * (y - y_bar)).sum(axis=-1)
+    s2 = (w * d * d).sum(axis=-1)
+
+    # local constant where the local line is not identified
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(sxx > 1e-12 * s2, sxy / sxx, 0.0)
+
+    res = y_bar[..., 0] - slope * (ref + d_bar)[..., 0]
+
+    return res
+
+
+def local_linear(x, y, x_new, bw):
+    """Fit a local-linear regression with a gaussian kernel.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        (M,) or (N, M) observed points, e.g. strikes, shared or per smile
+    y : numpy.ndarray
+        (M,) or (N, M) observed values, e.g. volas
+    x_new : numpy.ndarray
+        (m,) or (N, m) points to predict at
+    bw : float or numpy.ndarray
+        bandwidth(s), (N,) if an array
+
+    Returns
+    -------
+    res : numpy.ndarray
+        (m,) or (N, m) predictions
+
+    """
+    x, y, x_new, bw = [np.asarray(p, dtype=float) for p in (x, y, x_new, bw)]
+
+    res = _local_linear_sums(x[..., np.newaxis, :], y[..., np.newaxis, :],
+                             x_new[..., np.newaxis],
+                             bw[..., np.newaxis, np.newaxis])
+
+    return res
+
+
+def cv_loss(x, y, bw):
+    """Calculate the leave-one-out cross-validation loss of `local_linear`.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        (M,) or (N, M) observed points and values
+    bw : numpy.ndarray
+        (..., N) bandwidths, e.g. several candidates for each smile
+
+    Returns
+    -------
+    res : numpy.ndarray
+        (..., N) mean squared leave-one-out prediction errors
+
+    """
+    x, y, bw = [np.asarray(p, dtype=float) for p in (x, y, bw)]
+
+    y_hat = _local_linear_sums(x[..., np.newaxis, :], y[..., np.newaxis, :],
+                               x[..., np.newaxis],
+                               bw[..., np.newaxis, np.newaxis],
+                               leave_out=True)
+
+    res = ((y - y_hat)**2).mean(axis=-1)
+
+    return res
+
+
+def cv_bandwidth(x, y, xtol=1e-4, ftol=1e-4, max_iter=1000):
+    """Choose bandwidths by least-squares leave-one-out cross-validation.
+
+    The loss is minimized as in KernelReg(bw='cv_ls'): by the Nelder-Mead
+    method, here in its one-dimensional form for all smiles at once,
+    starting from the normal reference bandwidth 1.06*std(x)*M^(-1/5).
+    The loss has plateaus and several local minima for few quotes, so a
+    different optimizer would find different (local) minima. KernelReg's
+    own loss, with fits through a pseudo-inverse, is off from the exact one
+    by up to about 1% where the local line is nearly unidentified, which
+    steers its search elsewhere: on 1m FX smiles, fits with the bandwidths
+    of both differ by up to 1e-4 in vola, on noisy smiles by up to 1e-3,
+    and by more where KernelReg ends at a bandwidth far below the spacing
+    of quotes. With equal bandwidths fits agree to 1e-10.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        (M,) or (N, M) observed points and values
+    xtol : float
+        absolute tolerance on bandwidths
+    ftol : float
+        absolute tolerance on the loss
+    max_iter : int
+        maximum number of iterations
+
+    Returns
+    -------
+    res : float or numpy.ndarray
+        (N,) bandwidths
+
+    """
+    x, y = [np.asarray(p, dtype=float) for p in (x, y)]
+    batch = np.broadcast_shapes(x.shape[:-1], y.shape[:-1])
+    x_b = np.broadcast_to(x, batch + x.shape[-1:])
+    y_b = np.broadcast_to(y, batch + y.shape[-1:])
+
+    # the loss is symmetric in the sign of bandwidths; trial points are
+    #   evaluated at their absolute value, floored far below the spacing of
+    #   quotes such that (x_i - x_j)/bw stays finite
+    floor = np.maximum(1e-8 * np.ptp(x_b, axis=-1), np.finfo(float).tiny)
+
+    def loss(bw, rows):
+        # evaluated for rows still searching only, nan elsewhere
+        res = np.full(batch, np.nan)
+        res[rows] = cv_loss(x_b[rows], y_b[rows],
+                            np.maximum(np.abs(bw), floor)[rows])
+        return res
+
+    def sort(x0, x1, f0, f1):
+        swap = f1 < f0
+        return np.where(swap, x1, x0), np.where(swap, x0, x1), \
+            np.where(swap, f1, f0), np.where(swap, f0, f1)
+
+    # simplex of two points: best x0 and worst x1
+    x0 = np.array(np.broadcast_to(
+        1.06 * x.std(axis=-1) * x.shape[-1]**(-1/5), batch))
+    x1 = np.where(x0 != 0, 1.05 * x0, 0.00025)
+    everywhere = np.ones(batch, dtype=bool)
+    x0, x1, f0, f1 = sort(x0, x1, loss(x0, everywhere),
+                          loss(x1, everywhere))
+
+    for _ in range(max_iter):
+        active = (np.abs(x1 - x0) > xtol) | (np.abs(f1 - f0) > ftol)
+        if not active.any():
+            break
+
+        # reflection
+        xr = 2 * x0 - x1
+        fr = loss(xr, active)
+
+        # expansion if the reflection is the best, outside or inside
+        #   contraction otherwise
+        expand = fr < f0
+        inside = ~expand & (fr >= f1)
+        x_try = np.where(expand, 3 * x0 - 2 * x1,
+                         np.where(inside, 0.5 * (x0 + x1),
+                                  1.5 * x0 - 0.5 * x1))
+        f_try = loss(x_try, active)
+
+        accept_try = np.where(expand, f_try < fr,
+                              np.where(inside, f_try < f1, f_try <= fr))
+        shrink = ~expand & ~accept_try
+
+        x_new = np.where(accept_try, x_try, xr)
+        f_new = np.where(accept_try, f_try, fr)
+
+        # shrink towards the best point
+        x_shrunk = x0 + 0.5 * (x1 - x0)
+        if (shrink & active).any():
+            f_shrunk = loss(x_shrunk, shrink & active)
+        else:
+            f_shrunk = f1
+
+        x_new = np.where(shrink, x_shrunk, x_new)
+        f_new = np.where(shrink, f_shrunk, f_new)
+
+        x1, f1 = np.where(active, x_new, x1), np.where(active, f_new, f1)
+        x0, x1, f0, f1 = sort(x0, x1, f0, f1)
+
+    res = np.maximum(np.abs(x0), floor)
+
+    return res[()]
+
+
+@lru_cache(maxsize=1024)
+def _cached_bandwidth(x_bytes, y_bytes):
+    """Cross-validated bandwidth of the smile serialized to bytes."""
+    return cv_bandwidth(np.frombuffer(x_bytes, dtype=float),
+                        np.frombuffer(y_bytes, dtype=float))
+
+
+def get_bandwidth(x, y):
+    """Get the cross-validated bandwidth of a smile, reusing cached ones.
+
+    Smiles are keyed by their contents, such that interpolating the same
+    smile again costs one lookup.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        (M,) observed points and values
+
+    Returns
+    -------
+    res : float
+
+    """
+    x, y = [np.ascontiguousarray(p, dtype=float) for p in (x, y)]
+
+    return _cached_bandwidth(x.tobytes(), y.tobytes())
+
+
+def clear_bandwidth_cache():
+    """Empty the cache of bandwidths."""
+    _cached_bandwidth.cache_clear()
@@ -17,6 +17,11 @@ path = "c:/users/" + usr + "/google drive/" + \
 # logger.setLevel(logging.DEBUG)
 
 from optools import pricing as op, pricing_wrappers as opwraps
+from optools.volsurface import VolatilitySmile, VolatilitySurface
+from optools import quadrature as quad
+from optools import rnd
+from optools import calibration as cal
+from scipy import integrate
 
 
 class TestFromWystup(unittest.TestCase):
@@ -44,6 +49,121 @@ class TestFromWystup(unittest.TestCase):
         self.assertAlmostEquals(res.loc[self.delta], 5.07, 2)
         self.assertAlmostEquals(res.loc[1-self.delta], 4.89, 2)
 
+    def test_smiles_from_combinations(self):
+        """
+        """
+        from scipy.stats import norm
+        from optools.volsurface import smiles_from_combinations
+
+        atm = np.array([0.0483, 0.05, 0.052])
+        combies = {0.25: {"rr": np.array([0.0018, 0.002, np.nan]),
+                          "bf": np.array([0.0015, 0.0016, 0.0017])},
+                   0.1: {"rr": np.array([0.004, 0.0042, 0.0041]),
+                         "bf": np.array([0.005, 0.0052, 0.0053])}}
+        spot, rf, div_yield, tau = 1.1, 0.01, 0.005, 0.25
+        forward = spot * np.exp((rf - div_yield) * tau)
+
+        res = smiles_from_combinations(combies, atm, spot, forward, rf,
+                                       div_yield, tau)
+
+        self.assertEqual(res["strike"].shape, (3, 5))
+        self.assertTrue((np.diff(res["strike"][:2], axis=-1) > 0).all())
+        self.assertTrue(np.isnan(res["strike"][2, -2:]).all())
+
+        # vs. quote by quote: atm forward, 25- and 10-delta calls and puts
+        vola = [atm[1]]
+        strike = [forward]
+        for d, v in combies.items():
+            call, put = op.vanillas_from_combinations(v["rr"][1], v["bf"][1],
+                                                      atm[1])
+            vola.extend([call, put])
+            strike.extend([
+                op.strike_from_delta(d, spot, rf, div_yield, tau, call, True),
+                op.strike_from_delta(-d, spot, rf, div_yield, tau, put,
+                                     False)])
+        order = np.argsort(strike)
+
+        assert_array_almost_equal(res["strike"][1], np.array(strike)[order],
+                                  decimal=12)
+        assert_array_almost_equal(res["vola"][1], np.array(vola)[order],
+                                  decimal=12)
+
+        # put wing vs put deltas inverted in closed form: spot delta
+        #   -exp(-q*tau)*N(-d1) = -d
+        put = res["delta"][1] < 0
+        put_vola = res["vola"][1, put]
+        put_delta = -res["delta"][1, put]
+        ppf = norm.ppf(put_delta * np.exp(div_yield * tau))
+        put_strike = forward * np.exp(put_vola**2 * tau / 2 +
+                                      put_vola * np.sqrt(tau) * ppf)
+        assert_array_almost_equal(res["strike"][1, put], put_strike,
+                                  decimal=12)
+
+        # vs. the former call with delta 1 - d: off by about 1e-4 relative
+        ppf_call = norm.ppf((1 - put_delta) * np.exp(div_yield * tau))
+        call_strike = forward * np.exp(put_vola**2 * tau / 2 -
+                                       put_vola * np.sqrt(tau) * ppf_call)
+        rel = np.abs(call_strike / put_strike - 1)
+        self.assertTrue(((rel > 1e-5) & (rel < 1e-3)).all())
+
+        # premium-adjusted quotes give lower strikes
+        pa = smiles_from_combinations(combies, atm, spot, forward, rf,
+                                      div_yield, tau, convention="spot_pa",
+                                      atm="dns")
+        self.assertTrue((pa["strike"][:2] < res["strike"][:2]).all())
+
+        # the atm call has the delta of eq. 1.96 in Wystup (2006)
+        atm_delta = np.exp(-div_yield * tau) * \
+            norm.cdf(0.5 * atm[1] * np.sqrt(tau))
+        self.assertAlmostEqual(res["delta"][1, 2], atm_delta, places=12)
+
+    def test_delta_conventions(self):
+        """
+        """
+        from scipy.optimize import brentq
+
+        spot, rf, div_yield, tau = 110.0, 0.001, 0.02, 0.5
+        vola = np.array([[0.1], [0.12], [0.3]])
+        delta = np.array([0.1, 0.25, 0.4, -0.4, -0.25, -0.1])
+        is_call = delta > 0
+
+        for conv in op.delta_conventions:
+            strike = op.strike_from_delta(delta, spot, rf, div_yield, tau,
+                                          vola, is_call, convention=conv)
+            res = op.delta_from_strike(strike, spot, rf, div_yield, tau,
+                                       vola, is_call, convention=conv)
+            assert_array_almost_equal(res, np.broadcast_to(delta, res.shape),
+                                      decimal=10)
+
+            # delta-neutral straddle
+            k = op.atm_strike(spot, rf, div_yield, tau, vola, atm="dns",
+                              convention=conv)
+            self.assertAlmostEqual(np.abs(
+                op.delta_from_strike(k, spot, rf, div_yield, tau, vola, True,
+                                     convention=conv) +
+                op.delta_from_strike(k, spot, rf, div_yield, tau, vola,
+                                     False, convention=conv)).max(), 0.0)
+
+        # premium-adjusted call strike on the upper branch, as brentq
+        forward = spot * np.exp((rf - div_yield) * tau)
+        k = brentq(lambda x: op.delta_from_strike(
+            x, spot, rf, div_yield, tau, 0.12, True, "spot_pa") - 0.25,
+                   forward, forward * 1.2, xtol=1e-12)
+        self.assertAlmostEqual(op.strike_from_delta(
+            0.25, spot, rf, div_yield, tau, 0.12, True, "spot_pa"), k,
+            places=8)
+
+        # no strike has a premium-adjusted call delta close to one
+        self.assertTrue(np.isnan(op.strike_from_delta(
+            0.95, spot, rf, div_yield, tau, 0.3, True, "forward_pa")))
+
+        # unknown options
+        with self.assertRaises(ValueError):
+            op.delta_from_strike(110.0, spot, rf, div_yield, tau, 0.1, True,
+                                 "premium")
+        with self.assertRaises(ValueError):
+            op.atm_strike(spot, rf, div_yield, tau, 0.1, atm="atms")
+
 
 # class TestSimpleFormulas(unittest.TestCase):
 #     """
@@ -358,6 +478,1302 @@ class TestOptoolsWrappers(unittest.TestCase):
         self.assertAlmostEqual(beta, self.beta_pm)
         self.assertAlmostEqual(s2_m, self.s2_m)
 
+class TestImpliedVola(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        self.forward = np.array([[1.0], [1.2], [0.9]])
+        self.rf = np.array([[0.01], [0.02], [0.0]])
+        self.tau = np.array([[0.25], [1.0], [1/12]])
+        self.strike = self.forward * \
+            np.exp(np.array([-0.1, -0.05, 0.0, 0.05, 0.1]))
+        self.vola = np.random.random(size=(3, 5))*0.3 + 0.1
+
+        self.call_p = op.bs_price(strike=self.strike, rf=self.rf,
+                                  tau=self.tau, vola=self.vola,
+                                  forward=self.forward)
+
+    def test_bs_iv_panel(self):
+        """
+        """
+        res, converged = op.bs_iv(self.call_p, self.forward, self.strike,
+                                  self.rf, self.tau, full_output=True)
+
+        self.assertEqual(res.shape, (3, 5))
+        self.assertTrue(converged.all())
+        assert_array_almost_equal(res, self.vola, decimal=8)
+
+    def test_bs_iv_no_arb_violation(self):
+        """
+        """
+        call_p = np.array([0.05, 1.5, 0.0])
+
+        res, converged = op.bs_iv(call_p, 1.0, 1.0, 0.0, 1.0,
+                                  full_output=True)
+
+        self.assertAlmostEqual(res[0], 0.1254, places=4)
+        self.assertTrue(np.isnan(res[1:]).all())
+        self.assertFalse(converged[1:].any())
+
+
+class TestGreeks(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        self.spot = 1.1
+        self.rf = 0.01
+        self.div_yield = 0.02
+        self.tau = np.array([[0.25], [1.0]])
+        self.strike = np.array([0.9, 1.1, 1.3])
+        self.vola = np.array([0.12, 0.1, 0.14])
+
+        self.forward = self.spot * np.exp((self.rf - self.div_yield)*self.tau)
+
+    def test_bs_greeks_vs_price_and_vega(self):
+        """
+        """
+        res = op.bs_greeks(self.strike, self.rf, self.tau, self.vola,
+                           forward=self.forward, greeks=["price", "vega"])
+
+        price = op.bs_price(self.strike, self.rf, self.tau, self.vola,
+                            forward=self.forward)
+        vega = op.bs_vega(self.forward, self.strike, self.rf, self.tau,
+                          self.vola)
+
+        self.assertEqual(sorted(res.keys()), ["price", "vega"])
+        assert_array_almost_equal(res["price"], price, decimal=12)
+        assert_array_almost_equal(res["vega"], vega, decimal=12)
+
+    def test_bs_greeks_finite_differences(self):
+        """
+        """
+        h = 1e-5
+
+        def price(spot, is_call):
+            return op.bs_greeks(self.strike, self.rf, self.tau, self.vola,
+                                div_yield=self.div_yield, spot=spot,
+                                is_call=is_call, greeks=["price"])["price"]
+
+        for is_call in (True, False):
+            res = op.bs_greeks(self.strike, self.rf, self.tau, self.vola,
+                               div_yield=self.div_yield, spot=self.spot,
+                               is_call=is_call)
+
+            delta = (price(self.spot + h, is_call) -
+                     price(self.spot - h, is_call)) / (2*h)
+            gamma = (price(self.spot + h, is_call) -
+                     2*price(self.spot, is_call) +
+                     price(self.spot - h, is_call)) / h**2
+
+            assert_array_almost_equal(res["delta_spot"], delta, decimal=8)
+            assert_array_almost_equal(res["gamma"], gamma, decimal=4)
+
+    def test_bs_greeks_need_spot(self):
+        """
+        """
+        with self.assertRaises(ValueError):
+            op.bs_greeks(self.strike, self.rf, self.tau, self.vola,
+                         forward=self.forward, greeks=["gamma"])
+
+        with self.assertRaises(ValueError) as cm:
+            op.bs_greeks(self.strike, self.rf, self.tau, self.vola,
+                         forward=self.forward, greeks=["charm"])
+        self.assertIn("charm", str(cm.exception))
+
+
+class TestVolatilitySmile(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        self.strike = np.array([1.168, 1.021, 1.062, 1.093, 1.121])
+        self.vola = np.array([0.099, 0.105, 0.096, 0.091, 0.093])
+
+        self.smile = VolatilitySmile.from_arrays(
+            self.vola, self.strike, spot=1.09, forward=1.093, rf=0.01,
+            div_yield=0.005, tau=0.25)
+
+    def test_from_arrays(self):
+        """
+        """
+        order = np.argsort(self.strike)
+
+        assert_array_almost_equal(self.smile.strike, self.strike[order])
+        assert_array_almost_equal(self.smile.vola, self.vola[order])
+        self.assertTrue(self.smile.strike.flags["C_CONTIGUOUS"])
+        self.assertFalse(hasattr(self.smile, "__dict__"))
+
+        # pandas view
+        smile = pd.Series(self.vola, index=self.strike).sort_index()
+        assert_array_almost_equal(self.smile.smile.values, smile.values)
+        assert_array_almost_equal(self.smile.smile.index, smile.index)
+
+    def test_interpolate_constant_extrapolation(self):
+        """
+        """
+        new_strike = np.linspace(0.9, 1.3, 41)
+
+        res = self.smile.interpolate(new_strike=new_strike)
+
+        assert_array_almost_equal(res.strike, new_strike)
+        self.assertTrue((res.vola[new_strike < 1.021] == 0.105).all())
+        self.assertTrue((res.vola[new_strike > 1.168] == 0.099).all())
+
+    def test_interpolate_kernel(self):
+        """
+        """
+        from statsmodels.nonparametric.kernel_regression import KernelReg
+        from optools import smoothing
+
+        new_strike = np.linspace(1.0, 1.2, 41)
+        strike, vola = self.smile.strike, self.smile.vola
+
+        # cross-validated bandwidth, as KernelReg's
+        kr = KernelReg(endog=[vola, ], exog=[strike, ], reg_type="ll",
+                       var_type=["c", ])
+        res = self.smile.interpolate(new_strike=new_strike,
+                                     in_method="kernel", ex_method=None)
+
+        self.assertAlmostEqual(smoothing.get_bandwidth(strike, vola),
+                               kr.bw[0], places=8)
+        assert_array_almost_equal(res.vola, kr.fit(new_strike)[0],
+                                  decimal=8)
+
+        # fixed bandwidth
+        kr = KernelReg(endog=[vola, ], exog=[strike, ], reg_type="ll",
+                       var_type=["c", ], bw=[0.03])
+        res = self.smile.interpolate(new_strike=new_strike,
+                                     in_method="kernel", ex_method=None,
+                                     bw=0.03)
+        assert_array_almost_equal(res.vola, kr.fit(new_strike)[0],
+                                  decimal=12)
+
+        # batches of smiles
+        res_batch = smoothing.local_linear(
+            strike, np.vstack((vola, vola + 0.01)), new_strike,
+            np.array([0.03, 0.03]))
+        assert_array_almost_equal(res_batch[1], res.vola + 0.01)
+
+    def test_kernel_vs_kernelreg_history(self):
+        """
+        """
+        from decimal import Decimal, getcontext
+        from statsmodels.nonparametric.kernel_regression import KernelReg
+        from optools import smoothing
+
+        rng = np.random.RandomState(0)
+        n = 30
+        strike = 1.1 * np.exp(np.linspace(-0.08, 0.08, 5) +
+                              rng.normal(size=(n, 5)) * 0.003)
+        vola = 0.09 + 0.02 * (np.log(strike / 1.1) / 0.08) ** 2 + \
+            rng.normal(size=(n, 5)) * 0.003
+        new_strike = strike[:, :1] + (strike[:, -1:] - strike[:, :1]) * \
+            np.linspace(0, 1, 41)
+
+        kr = [KernelReg(endog=[y, ], exog=[x, ], reg_type="ll",
+                        var_type=["c", ]) for x, y in zip(strike, vola)]
+        bw_kr = np.abs([k.bw[0] for k in kr])
+        res_kr = np.vstack([k.fit(x)[0] for k, x in zip(kr, new_strike)])
+
+        # same bandwidths, same fits, unless KernelReg picks one far below
+        #   the spacing of quotes, where its pinv-based fit breaks down
+        regular = bw_kr > 0.2 * np.diff(strike, axis=-1).min(axis=-1)
+        res = smoothing.local_linear(strike, vola, new_strike, bw_kr)
+        assert_array_almost_equal(res[regular], res_kr[regular],
+                                  decimal=10)
+
+        # cross-validated bandwidths land elsewhere on flat stretches or in
+        #   other local minima of the loss: fits agree to 1e-3
+        res = smoothing.local_linear(strike, vola, new_strike,
+                                     smoothing.cv_bandwidth(strike, vola))
+        self.assertLess(np.abs(res - res_kr)[regular].max(), 1e-3)
+
+        # one dominant weight: vs. the fit in 50-digit arithmetic
+        x, y, x_new, bw = strike[0, 1:], vola[0, 1:], strike[0, 0], 0.01
+        getcontext().prec = 50
+        d = [Decimal(v) - Decimal(x_new) for v in x]
+        w = [(-(v / Decimal(bw)) ** 2 / 2).exp() for v in d]
+        yy = [Decimal(v) for v in y]
+        s = [sum(a * b ** p for a, b in zip(w, d)) for p in range(3)]
+        t = [sum(a * b ** p * c for a, b, c in zip(w, d, yy))
+             for p in range(2)]
+        exact = (s[2] * t[0] - s[1] * t[1]) / (s[0] * s[2] - s[1] ** 2)
+
+        self.assertAlmostEqual(
+            smoothing.local_linear(x, y, np.array([x_new]), bw)[0],
+            float(exact), places=12)
+
+    def test_default_grid_vs_strike_range(self):
+        """
+        """
+        from optools.helpers import strike_range
+        from optools.grids import strike_grid
+
+        # default: adaptive grid, svix over otm prices on the whole grid
+        res = self.smile.interpolate()
+        mfiv = res.get_mfivariance()
+        svix = res.get_mfivariance(svix=True)
+
+        self.assertEqual(len(res.strike), 311)
+        self.assertAlmostEqual(mfiv, 0.0093031359, places=10)
+        self.assertAlmostEqual(svix, 0.0092791531, places=10)
+
+        # former default: strike_range, mfiv within 1e-6 relative
+        old = self.smile.interpolate(strike_range(self.smile.strike))
+        self.assertLess(abs(mfiv / old.get_mfivariance() - 1), 1e-6)
+
+        # former svix integrated otm puts and calls separately, leaving the
+        #   interval around the forward out: 1% lower
+        below = old.strike < old.forward
+        put_p = op.call_to_put(old.call_p, old.strike, old.forward, old.rf,
+                               old.tau)
+        svix_old = \
+            quad.get_weights(old.strike[below]).dot(put_p[below]) + \
+            quad.get_weights(old.strike[~below]).dot(old.call_p[~below])
+        svix_old *= 2 * np.exp(old.rf * old.tau) / old.forward**2 / old.tau
+        self.assertAlmostEqual(svix / svix_old - 1, 0.0101, places=4)
+
+        # both within 1e-6 of a very fine grid
+        grid, weights = strike_grid(self.smile.strike, self.smile.forward,
+                                    self.smile.vola, self.smile.tau,
+                                    policy="gauss", tol=1e-13,
+                                    return_weights=True)
+        fine = self.smile.interpolate(grid)
+        self.assertLess(
+            abs(mfiv / fine.get_mfivariance(weights=weights) - 1), 1e-6)
+        self.assertLess(
+            abs(svix / fine.get_mfivariance(svix=True, weights=weights) - 1),
+            1e-6)
+
+    def test_call_p_cache(self):
+        """
+        """
+        call_p = self.smile.call_p
+
+        self.assertIs(self.smile.call_p, call_p)
+        self.assertFalse(call_p.flags["WRITEABLE"])
+
+        # invalidated when the pricing inputs change
+        self.smile.rf = 0.02
+        assert_array_almost_equal(
+            self.smile.call_p,
+            op.bs_price(self.smile.strike, 0.02, 0.25, self.smile.vola,
+                        forward=1.093))
+
+    def test_get_moments(self):
+        """
+        """
+        smile = self.smile.interpolate()
+
+        res = smile.get_moments()
+
+        self.assertAlmostEqual(res["mfiv"], smile.get_mfivariance(),
+                               places=14)
+        self.assertAlmostEqual(res["svix"],
+                               smile.get_mfivariance(svix=True), places=14)
+        self.assertAlmostEqual(res["mfiskewness"], smile.get_mfiskewness(),
+                               places=14)
+        self.assertAlmostEqual(res["mfiv_down"],
+                               smile.get_mfisemivariance()[0], places=14)
+
+    def test_dropna(self):
+        """
+        """
+        smile = VolatilitySmile.from_arrays(
+            np.array([0.1, np.nan, 0.12]), np.array([1.0, 1.1, np.nan]))
+
+        self.assertEqual(len(smile.dropna().strike), 2)
+        self.assertEqual(len(smile.dropna(from_index=True).strike), 2)
+
+
+class TestMomentsPanel(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        n = 20
+        self.spot = np.random.random(size=(n,))*0.2 + 0.9
+        self.rf = np.random.random(size=(n,))*0.05
+        self.tau = np.random.choice([1/12, 0.25, 0.5], size=(n,))
+        self.forward = self.spot*np.exp(self.rf*self.tau)
+
+        # shared and per-row strike grids
+        self.strike = np.linspace(0.6, 1.5, 201)
+        self.strike_rows = self.strike * \
+            (np.random.random(size=(n, 1))*0.1 + 0.95)
+
+        self.vola = 0.1 + 0.5*(self.strike_rows - 1)**2
+
+        self.call_p = op.bs_price(strike=self.strike_rows,
+                                  rf=self.rf[:, np.newaxis],
+                                  tau=self.tau[:, np.newaxis],
+                                  vola=self.vola,
+                                  forward=self.forward[:, np.newaxis])
+
+    def test_moments_per_row_grid(self):
+        """
+        """
+        args = (self.call_p, self.strike_rows, self.forward, self.rf,
+                self.tau)
+
+        for fun in (op.mfivariance, op.simple_var_swap_rate):
+            res = fun(*args)
+            res_loop = [fun(*[p[i] for p in args])
+                        for i in range(len(self.rf))]
+
+            assert_array_almost_equal(res, res_loop, decimal=12)
+
+        res = op.mfiskewness(self.call_p, self.strike_rows, self.spot,
+                             self.forward, self.rf, self.tau)
+        res_loop = [op.mfiskewness(self.call_p[i], self.strike_rows[i],
+                                   self.spot[i], self.forward[i],
+                                   self.rf[i], self.tau[i])
+                    for i in range(len(self.rf))]
+
+        assert_array_almost_equal(res, res_loop, decimal=10)
+
+    def test_moments_shared_grid(self):
+        """
+        """
+        res = op.simple_var_swap_rate(self.call_p, self.strike, self.forward,
+                                      self.rf, self.tau)
+        res_loop = [op.simple_var_swap_rate(self.call_p[i], self.strike,
+                                            self.forward[i], self.rf[i],
+                                            self.tau[i])
+                    for i in range(len(self.rf))]
+
+        assert_array_almost_equal(res, res_loop, decimal=12)
+
+
+class TestQuadrature(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        self.x = np.sort(np.random.random(size=(24,)))*2 + 0.5
+        self.y = np.exp(-self.x)
+
+    def test_weights_vs_scipy(self):
+        """
+        """
+        for n in (2, 3, 10, 11):
+            x, y = self.x[:n], self.y[:n]
+            self.assertAlmostEqual(quad.simpson_weights(x).dot(y),
+                                   integrate.simps(y, x), places=12)
+            self.assertAlmostEqual(quad.trapezoid_weights(x).dot(y),
+                                   np.trapz(y, x), places=12)
+
+    def test_get_weights_cache(self):
+        """
+        """
+        quad.clear_cache()
+
+        w_1 = quad.get_weights(self.x)
+        w_2 = quad.get_weights(self.x.copy())
+
+        self.assertIs(w_1, w_2)
+        self.assertFalse(w_1.flags["WRITEABLE"])
+        self.assertEqual(quad._cached_weights.cache_info().hits, 1)
+
+        with self.assertRaises(ValueError):
+            quad.get_weights(self.x, rule="midpoint")
+
+    def test_gauss_legendre(self):
+        """
+        """
+        a, b = np.array([0.5, 1.0]), np.array([2.5, 2.0])
+
+        nodes, weights = quad.gauss_legendre(8, a, b)
+
+        res = (np.exp(-nodes) * weights).sum(axis=-1)
+
+        assert_array_almost_equal(res, np.exp(-a) - np.exp(-b), decimal=12)
+
+
+class TestVolatilitySurface(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        tau = np.array([0.25, 1.0])
+        forward = pd.Series([1.0, 1.02], index=tau)
+
+        vola_df = pd.DataFrame({
+            0.25: pd.Series([0.12, 0.10, 0.11], index=[0.9, 1.0, 1.1]),
+            1.0: pd.Series([0.14, 0.13], index=[1.02, 1.2])})
+
+        self.surf = VolatilitySurface(vola_df, forward=forward,
+                                      spot=forward*0+1.0,
+                                      rf=forward*0, div_yield=forward*0)
+
+    def test_interpolate_along_tau(self):
+        """
+        """
+        res = self.surf.interpolate_along_tau().surface
+
+        # 0.9 at 3m carried to 1y with sticky moneyness
+        k_9 = 1.02 * 0.9**2
+        self.assertAlmostEqual(res.loc[k_9, 1.0], 0.14 + 0.02)
+
+        # 1.2 at 1y carried to 3m
+        k_12 = 1.0 * (1.2 / 1.02)**0.5
+        self.assertAlmostEqual(res.loc[k_12, 0.25], 0.10 - 0.01)
+
+        # atm of 3m maps onto atm of 1y
+        self.assertAlmostEqual(res.loc[1.02, 1.0], 0.14)
+        self.assertEqual(res.shape, (8, 2))
+
+    def test_smiles_cached(self):
+        """
+        """
+        smiles = self.surf.smiles
+        smile = smiles[0.25]
+
+        self.assertIs(self.surf.smiles, smiles)
+        self.assertIs(self.surf.smiles[0.25], smile)
+        self.assertEqual(list(smiles), [0.25, 1.0])
+        assert_array_almost_equal(smiles[1.0].strike, [1.02, 1.2])
+
+        # reassigning data invalidates the cache
+        self.surf.forward = self.surf.forward * 1.01
+        self.assertIsNot(self.surf.smiles[0.25], smile)
+        self.assertAlmostEqual(self.surf.smiles[0.25].forward, 1.01)
+
+    def test_interpolate_along_tau_no_atm(self):
+        """
+        """
+        self.surf.forward = self.surf.forward * 1.01
+
+        with self.assertRaises(ValueError):
+            self.surf.interpolate_along_tau()
+
+
+class TestMomentsByBlock(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        n = 40
+        rf = 0.01 + np.random.normal(size=(n,)) * 0.001
+        div_yield = 0.005 + np.random.normal(size=(n,)) * 0.001
+        spot = 1.1 * np.exp(np.random.normal(size=(n,)) * 0.01)
+        self.tau = 1/12
+
+        self.data = pd.DataFrame({
+            "spot": spot,
+            "forward": spot * np.exp((rf - div_yield) * self.tau),
+            "rf": rf,
+            "div_yield": div_yield,
+            "atm_vola": 0.09 + np.random.normal(size=(n,)) * 0.005,
+            "25rr": -0.01 + np.random.normal(size=(n,)) * 0.002,
+            "25bf": 0.003 + np.random.normal(size=(n,)) * 0.0005,
+            "10rr": -0.02 + np.random.normal(size=(n,)) * 0.003,
+            "10bf": 0.009 + np.random.normal(size=(n,)) * 0.001},
+            index=pd.bdate_range("2010-01-01", periods=n))
+
+        # one missing butterfly, one missing atm vola
+        self.data.iloc[3, -1] = np.nan
+        self.data.iloc[5, 4] = np.nan
+
+    def test_vs_per_row(self):
+        """
+        """
+        res = pd.concat(opwraps.wrapper_moments_by_block(
+            self.data, self.tau, chunksize=16))
+
+        self.assertTrue(res.iloc[5].isnull().all())
+
+        for p in [0, 3, 17, 39]:
+            row = self.data.iloc[p].dropna()
+            if p == 3:
+                row = row.drop("10rr")
+
+            smile = opwraps.wrapper_smile_from_series(row, self.tau)
+            moments = smile.dropna(from_index=True).interpolate() \
+                .get_moments()
+
+            assert_array_almost_equal(
+                res.iloc[p].values,
+                [moments[k] for k in ("mfiv", "svix", "mfiskewness")],
+                decimal=8)
+
+    def test_quote_schema(self):
+        """
+        """
+        schema = opwraps.get_quote_schema(
+            tuple(self.data.columns) + ("comment", "5bf"))
+
+        self.assertIs(schema, opwraps.get_quote_schema(schema.columns))
+        self.assertEqual(schema.market["atm_vola"], 4)
+        self.assertEqual(schema.combies[0.1], {"rr": 7, "bf": 8})
+
+        values = np.column_stack((self.data.values[:2], [[np.nan, 0.01]] * 2))
+        market, combies = schema.split(values)
+        assert_array_almost_equal(market["spot"], self.data["spot"][:2])
+        self.assertTrue(np.isnan(combies[0.05]["rr"]))
+
+        with self.assertRaises(ValueError):
+            opwraps.QuoteSchema(["spot", "25rr"])
+
+    def test_smiles_from_frame(self):
+        """
+        """
+        smiles = opwraps.wrapper_smiles_from_frame(self.data, self.tau)
+
+        for p in [0, 3]:
+            smile = opwraps.wrapper_smile_from_series(self.data.iloc[p],
+                                                      self.tau)
+            smile = smile.dropna(from_index=True)
+            assert_array_almost_equal(smiles.iloc[p].strike, smile.strike)
+            assert_array_almost_equal(smiles.iloc[p].vola, smile.vola)
+
+        res = opwraps.wrapper_smiles_from_frame(self.data, self.tau,
+                                                moments=True)
+        res_block = pd.concat(opwraps.wrapper_moments_by_block(
+            self.data, self.tau))
+
+        assert_array_almost_equal(res.values, res_block.values, decimal=10)
+
+    def test_mfiv_from_frame(self):
+        """
+        """
+        for svix in (False, True):
+            res = opwraps.wrapper_mfiv_from_frame(self.data, self.tau,
+                                                  svix=svix)
+            self.assertTrue(np.isnan(res.iloc[5]))
+
+            ref = [opwraps.wrapper_mfiv_from_series(
+                self.data.iloc[p], self.tau, None, svix=svix)
+                for p in [0, 3, 17, 39]]
+
+            assert_array_almost_equal(res.iloc[[0, 3, 17, 39]].values, ref,
+                                      decimal=10)
+
+        # smile by smile for other interpolation
+        intpl_kwargs = {"in_method": "kernel"}
+        res = opwraps.wrapper_mfiv_from_frame(self.data, self.tau,
+                                              intpl_kwargs)
+        ref = opwraps.wrapper_mfiv_from_series(self.data.iloc[3], self.tau,
+                                               intpl_kwargs)
+        self.assertAlmostEqual(res.iloc[3], ref, places=10)
+
+    def test_mfiv_from_frame_convention(self):
+        """
+        """
+        kwargs = {"convention": "forward_pa", "atm": "dns"}
+
+        res = opwraps.wrapper_mfiv_from_frame(self.data, self.tau, **kwargs)
+        res_spot = opwraps.wrapper_mfiv_from_frame(self.data, self.tau)
+
+        ref = [opwraps.wrapper_mfiv_from_series(
+            self.data.iloc[p], self.tau, None, **kwargs)
+            for p in [0, 3, 17, 39]]
+
+        assert_array_almost_equal(res.iloc[[0, 3, 17, 39]].values, ref,
+                                  decimal=10)
+        self.assertGreater(np.abs(res - res_spot).max(), 1e-6)
+
+        # missing forward filled in by no-arbitrage relations
+        data = self.data.copy()
+        data.iloc[3, data.columns.get_loc("forward")] = np.nan
+        res_fill = opwraps.wrapper_mfiv_from_frame(data, self.tau,
+                                                   fill_no_arb=True, **kwargs)
+        self.assertAlmostEqual(res_fill.iloc[3], res.iloc[3], places=10)
+
+    def test_chunks(self):
+        """
+        """
+        res_1 = pd.concat(opwraps.wrapper_moments_by_block(
+            self.data, self.tau, chunksize=7))
+        res_2 = pd.concat(opwraps.wrapper_moments_by_block(
+            (self.data.iloc[:20], self.data.iloc[20:]), self.tau))
+
+        assert_array_almost_equal(res_1.values, res_2.values, decimal=10)
+
+    def test_parallel(self):
+        """
+        """
+        data = {"eurusd": self.data, "usdchf": self.data.iloc[::-1]}
+
+        res_serial = opwraps.wrapper_moments_parallel(
+            data, self.tau, chunksize=8, n_jobs=1)
+        res_parallel = opwraps.wrapper_moments_parallel(
+            data, self.tau, chunksize=8, n_jobs=2)
+        res_block = pd.concat(opwraps.wrapper_moments_by_block(
+            self.data, self.tau, chunksize=8))
+
+        for k in data:
+            self.assertTrue(res_parallel[k].index.equals(data[k].index))
+            self.assertTrue(res_serial[k].equals(res_parallel[k]))
+
+        self.assertTrue(res_serial["eurusd"].equals(res_block))
+
+    def test_parallel_other_columns(self):
+        """
+        """
+        data = self.data.assign(ticker="eurusd",
+                                date=self.data.index.astype(str))
+
+        res = opwraps.wrapper_moments_parallel(data, self.tau, chunksize=8,
+                                               n_jobs=2)
+        res_block = pd.concat(opwraps.wrapper_moments_by_block(
+            self.data, self.tau, chunksize=8))
+
+        self.assertTrue(res.equals(res_block))
+
+    def test_fill_by_no_arb(self):
+        """
+        """
+        columns = ["spot", "forward", "rf", "div_yield"]
+        data = self.data.copy()
+        for p in range(4):
+            data.iloc[10 + p, p] = np.nan
+
+        # two missing values
+        data.iloc[20, [0, 2]] = np.nan
+
+        with self.assertWarns(UserWarning):
+            res, unsolved = op.fill_by_no_arb_frame(data, self.tau,
+                                                    full_output=True)
+
+        assert_array_almost_equal(res.iloc[10:14][columns].values,
+                                  self.data.iloc[10:14][columns].values,
+                                  decimal=12)
+        self.assertEqual(list(np.flatnonzero(unsolved)), [20])
+        self.assertTrue(res.iloc[20, [0, 2]].isnull().all())
+
+        # as the scalar version, row by row
+        for p in range(10, 14):
+            one = op.fill_by_no_arb(tau=self.tau, **data.iloc[p][columns])
+            assert_array_almost_equal(res.iloc[p][columns].values,
+                                      [one[c] for c in columns], decimal=14)
+
+        with self.assertRaises(ValueError):
+            op.fill_by_no_arb_frame(data, self.tau, raise_errors=True)
+
+        # maturity from a column
+        data["tau"] = self.tau
+        data.iloc[11, -1] = np.nan
+        with self.assertWarns(UserWarning):
+            _, unsolved = op.fill_by_no_arb_frame(
+                data.drop(index=data.index[20]), full_output=True)
+        self.assertEqual(list(np.flatnonzero(unsolved)), [11])
+
+
+class TestMixture(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        self.mu = np.array([0.07, 0.11])
+        self.sigma = np.array([0.03, 0.06])
+        self.wght = np.array([0.4, 0.6])
+        self.forward = self.wght.dot(np.exp(self.mu + self.sigma**2 / 2))
+        self.strike = self.forward * np.exp(np.linspace(-0.12, 0.12, 9))
+        self.rf = 0.001
+
+    def test_price_under_mixture(self):
+        """
+        """
+        res, res_jac = op.price_under_mixture(self.strike, self.rf, self.mu,
+                                              self.sigma, self.wght, jac=True)
+
+        # weighted black-scholes prices
+        f_comp = np.exp(self.mu + self.sigma**2 / 2)
+        c_comp = op.bs_price(self.strike[:, np.newaxis], self.rf, 1.0,
+                             self.sigma, forward=f_comp)
+        assert_array_almost_equal(res, c_comp.dot(self.wght), decimal=12)
+
+        # derivatives vs central differences
+        par = np.concatenate((self.mu, self.sigma, self.wght))
+        eps = 1e-7
+        num_jac = np.column_stack([
+            (op.price_under_mixture(self.strike, self.rf,
+                                    *np.split(par + eps * e, 3)) -
+             op.price_under_mixture(self.strike, self.rf,
+                                    *np.split(par - eps * e, 3))) / (2*eps)
+            for e in np.eye(len(par))])
+        assert_array_almost_equal(res_jac, num_jac, decimal=8)
+
+        # batches of mixtures
+        res_batch = op.price_under_mixture(
+            np.vstack((self.strike, )*3), self.rf, np.vstack((self.mu, )*3),
+            np.vstack((self.sigma, )*3), np.vstack((self.wght, )*3))
+        assert_array_almost_equal(res_batch, np.vstack((res, )*3))
+
+    def test_estimate_rnd(self):
+        """
+        """
+        call_p = op.price_under_mixture(self.strike, self.rf, self.mu,
+                                        self.sigma, self.wght)
+
+        res = rnd.estimate_rnd(call_p, self.strike, self.forward,
+                               rf=self.rf*12, tau=1/12)
+
+        assert_array_almost_equal(res.mu, self.mu, decimal=5)
+        assert_array_almost_equal(res.sigma, self.sigma, decimal=5)
+        assert_array_almost_equal(res.wght, self.wght, decimal=5)
+
+    def test_estimate_rnd_history(self):
+        """
+        """
+        mu = self.mu + np.linspace(0, 0.01, 10)[:, np.newaxis]
+        forward = (self.wght * np.exp(mu + self.sigma**2 / 2)).sum(axis=1)
+        strike = forward[:, np.newaxis] / self.forward * self.strike
+        call_p = op.price_under_mixture(strike, self.rf, mu, self.sigma,
+                                        self.wght)
+
+        cold = rnd.estimate_rnd_history(call_p, strike, forward,
+                                        rf=self.rf*12, tau=1/12,
+                                        warm_start=False)
+        warm = rnd.estimate_rnd_history(call_p, strike, forward,
+                                        rf=self.rf*12, tau=1/12)
+
+        assert_array_almost_equal(warm[["mu1", "mu2"]].values, mu,
+                                  decimal=5)
+        self.assertLess(warm["nfev"].iloc[1:].mean(),
+                        cold["nfev"].iloc[1:].mean())
+
+    def test_lnmix_pdf_cdf(self):
+        """
+        """
+        from scipy.stats import lognorm
+        from optools.lnmix import lognormal_mixture
+
+        x = self.strike
+        mix = lognormal_mixture(self.mu, self.sigma, self.wght)
+
+        pdf = sum(w * lognorm.pdf(x, s, scale=np.exp(m))
+                  for m, s, w in zip(self.mu, self.sigma, self.wght))
+        cdf = sum(w * lognorm.cdf(x, s, scale=np.exp(m))
+                  for m, s, w in zip(self.mu, self.sigma, self.wght))
+
+        assert_array_almost_equal(mix.pdf(x), pdf, decimal=10)
+        assert_array_almost_equal(np.exp(mix.logpdf(x)), pdf, decimal=10)
+        assert_array_almost_equal(mix.cdf(x), cdf, decimal=12)
+
+        # scalars, any shape of points and non-positive points
+        self.assertAlmostEqual(mix.pdf(x[4]), pdf[4])
+        self.assertEqual(mix.cdf(x.reshape(3, 3)).shape, (3, 3))
+        assert_array_almost_equal(mix.pdf(np.array([0.0, -1.0])), [0, 0])
+        self.assertTrue(np.isneginf(mix.logpdf(0.0)))
+
+        # log-pdf stays finite where the pdf underflows
+        self.assertEqual(mix.pdf(50.0), 0.0)
+        self.assertTrue(np.isfinite(mix.logpdf(50.0)))
+
+        # batches of mixtures
+        mix_batch = lognormal_mixture(
+            *[np.vstack((p, p)) for p in (self.mu, self.sigma, self.wght)])
+        assert_array_almost_equal(mix_batch.pdf(x), np.vstack((pdf, pdf)))
+        assert_array_almost_equal(mix_batch.cdf(x[4]), [cdf[4], cdf[4]])
+
+    def test_lnmix_quantile(self):
+        """
+        """
+        from optools.lnmix import lognormal_mixture
+
+        mix = lognormal_mixture(self.mu, self.sigma, self.wght)
+        p = np.array([1e-8, 0.01, 0.25, 0.5, 0.75, 0.99])
+
+        res = mix.quantile(p)
+        assert_array_almost_equal(mix.cdf(res), p, decimal=12)
+        assert_array_almost_equal(mix.quantile(p, method="table"), res,
+                                  decimal=5)
+
+        self.assertAlmostEqual(mix.quantile(0.5), res[3])
+        assert_array_almost_equal(mix.quantile(np.array([0.0, 1.0])),
+                                  [0.0, np.inf])
+
+        # batches of mixtures, one probability for all or several each
+        mix_batch = lognormal_mixture(
+            *[np.vstack((p_, p_)) for p_ in (self.mu, self.sigma, self.wght)])
+        assert_array_almost_equal(mix_batch.quantile(p), np.vstack((res, res)))
+        assert_array_almost_equal(mix_batch.quantile(0.5, method="table"),
+                                  [res[3], res[3]], decimal=5)
+
+        # the table is rebuilt when parameters change
+        mix.mu = self.mu + 0.1
+        assert_array_almost_equal(mix.quantile(p, method="table"),
+                                  res * np.exp(0.1), decimal=5)
+
+    def test_lnmix_moments(self):
+        """
+        """
+        from optools.lnmix import lognormal_mixture
+
+        mix = lognormal_mixture(self.mu, self.sigma, self.wght)
+        mean = mix.raw_moment(1)
+
+        def expect(fun, lo=0, hi=np.inf):
+            return integrate.quad(lambda x: fun(x) * mix.pdf(x), lo, hi,
+                                  epsabs=1e-14, epsrel=1e-12, limit=200)[0]
+
+        self.assertAlmostEqual(mean, self.forward, places=12)
+        self.assertAlmostEqual(mix.central_moment(3),
+                               expect(lambda x: (x - mean)**3), places=12)
+        self.assertAlmostEqual(mix.raw_moment(4, log=True),
+                               expect(lambda x: np.log(x)**4), places=12)
+        self.assertAlmostEqual(mix.partial_moment(3),
+                               expect(lambda x: (mean - x)**3, hi=mean),
+                               places=12)
+        self.assertAlmostEqual(mix.semivariance(1.05, upper=True, log=True),
+                               expect(lambda x: np.log(x / 1.05)**2, lo=1.05),
+                               places=12)
+
+        # the implied variance is the sum of its down- and upside parts
+        strike = np.linspace(0.6, 1.8, 2001)
+        call_p = op.price_under_mixture(strike, 0.0, self.mu, self.sigma,
+                                        self.wght)
+        mfiv = op.mfivariance(call_p, strike, mean, 0.0, 1.0)
+        self.assertAlmostEqual(sum(mix.mfisemivariance()), mfiv, places=7)
+
+        # cached, read-only and reset when parameters change
+        self.assertIs(mix.central_moment(3), mix.central_moment(3))
+        mix.mu = self.mu + 0.1
+        self.assertAlmostEqual(mix.raw_moment(1), mean * np.exp(0.1))
+
+        # batches of mixtures
+        mix_batch = lognormal_mixture(
+            *[np.vstack((p, p)) for p in (self.mu, self.sigma, self.wght)])
+        assert_array_almost_equal(mix_batch.kurtosis(log=True),
+                                  [mix.kurtosis(log=True)] * 2)
+
+    def test_estimate_rnd_batch(self):
+        """
+        """
+        mu = self.mu + np.linspace(0, 0.01, 10)[:, np.newaxis]
+        forward = (self.wght * np.exp(mu + self.sigma**2 / 2)).sum(axis=1)
+        strike = forward[:, np.newaxis] / self.forward * self.strike
+        call_p = op.price_under_mixture(strike, self.rf, mu, self.sigma,
+                                        self.wght)
+        call_p[3, 0] = np.nan
+
+        res = rnd.estimate_rnd_batch(call_p, strike, forward,
+                                     rf=self.rf*12, tau=1/12)
+
+        valid = np.arange(10) != 3
+        self.assertTrue(res["converged"][valid].all())
+        self.assertTrue(res.iloc[3, :6].isnull().all())
+        assert_array_almost_equal(res.loc[valid, ["mu1", "mu2"]].values,
+                                  mu[valid], decimal=5)
+        assert_array_almost_equal(res.loc[valid, ["w1", "w2"]].values,
+                                  np.vstack((self.wght, )*9), decimal=4)
+
+        # same as one smile at a time
+        one = rnd.estimate_rnd(call_p[0], strike[0], forward[0],
+                               rf=self.rf*12, tau=1/12)
+        assert_array_almost_equal(res.loc[0, ["sigma1", "sigma2"]].values,
+                                  one.sigma, decimal=5)
+
+        # warm start from an earlier output, with a row to start cold
+        x0 = res.copy()
+        x0.iloc[5, :6] = np.nan
+        warm = rnd.estimate_rnd_batch(call_p, strike, forward,
+                                      rf=self.rf*12, tau=1/12, x0=x0)
+
+        self.assertTrue(warm["converged"][valid].all())
+        self.assertTrue((warm["nit"][valid] <= res["nit"][valid]).all())
+        assert_array_almost_equal(warm.iloc[:, :6].values,
+                                  res.iloc[:, :6].values, decimal=5)
+
+
+class TestCalibration(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        mu = np.array([0.07, 0.11])
+        sigma = np.array([0.03, 0.06])
+        wght = np.array([0.4, 0.6])
+
+        self.forward = wght.dot(np.exp(mu + sigma**2 / 2))
+        self.strike = self.forward * np.exp(np.linspace(-0.12, 0.12, 9))
+        self.rf = 0.001
+        self.call_p = op.price_under_mixture(self.strike, self.rf, mu, sigma,
+                                             wght)
+
+        # parameters away from the true ones
+        self.par = np.concatenate((mu + 0.005, sigma * 1.2, [0.3, 0.7]))
+
+    def test_gradient(self):
+        """
+        """
+        def loss(par, space):
+            return cal.mixture_loss(*np.split(par, 3), self.strike,
+                                    self.call_p, self.forward, self.rf,
+                                    space=space)
+
+        eps = 1e-7
+
+        for space in ("price", "iv"):
+            res, grad = loss(self.par, space)
+            num_grad = np.array([
+                (loss(self.par + eps*e, space)[0] -
+                 loss(self.par - eps*e, space)[0]) / (2*eps)
+                for e in np.eye(len(self.par))])
+
+            self.assertGreater(res, 0)
+            assert_array_almost_equal(grad / np.abs(grad).max(),
+                                      num_grad / np.abs(grad).max(),
+                                      decimal=6)
+
+    def test_batch(self):
+        """
+        """
+        res, grad = cal.mixture_loss(*np.split(self.par, 3), self.strike,
+                                     self.call_p, self.forward, self.rf,
+                                     space="iv")
+
+        n = 3
+        res_batch, grad_batch = cal.mixture_loss(
+            *[np.vstack((p, )*n) for p in np.split(self.par, 3)],
+            np.vstack((self.strike, )*n), np.vstack((self.call_p, )*n),
+            np.full(n, self.forward), np.full(n, self.rf), space="iv")
+
+        assert_array_almost_equal(res_batch, np.full(n, res))
+        assert_array_almost_equal(grad_batch, np.vstack((grad, )*n))
+
+
+class TestDensity(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        from optools.lnmix import lognormal_mixture
+
+        self.mix = lognormal_mixture(np.array([0.07, 0.11]),
+                                     np.array([0.03, 0.06]),
+                                     np.array([0.4, 0.6]))
+        self.forward = self.mix.raw_moment(1)
+
+        # many quotes, so that the spline is close to the true smile
+        self.strike = self.forward * np.exp(np.linspace(-0.35, 0.35, 41))
+        call_p = op.price_under_mixture(self.strike, 0.0, self.mix.mu,
+                                        self.mix.sigma, self.mix.wght)
+        self.vola = op.bs_iv(call_p, self.forward, self.strike, 0.0, 1.0)
+
+    def test_flat_smile(self):
+        """
+        """
+        from scipy.stats import lognorm
+        from optools.density import breeden_litzenberger
+
+        v = 0.1 * np.sqrt(0.25)
+        res = breeden_litzenberger(np.full(5, 0.1), self.strike[::10],
+                                   self.forward, 0.25)
+
+        lognormal = lognorm.pdf(res.strike, v,
+                                scale=self.forward * np.exp(-v * v / 2))
+        assert_array_almost_equal(res.density, lognormal, decimal=6)
+
+        with self.assertRaises(ValueError):
+            breeden_litzenberger(np.full(5, 0.1), self.strike[::10],
+                                 self.forward, 0.25, method="kernel")
+        self.assertAlmostEqual(res.raw_moment(1), self.forward, places=8)
+
+    def test_vs_mixture(self):
+        """
+        """
+        from optools.density import breeden_litzenberger
+
+        for method in ("analytic", "fd"):
+            res = breeden_litzenberger(self.vola, self.strike, self.forward,
+                                       1.0, method=method, n_points=1001)
+
+            self.assertAlmostEqual(res.mass, 1.0, places=6)
+            assert_array_almost_equal(res.density / 10,
+                                      self.mix.pdf(res.strike) / 10,
+                                      decimal=2)
+            self.assertAlmostEqual(res.skewness(), self.mix.skewness(),
+                                   places=4)
+            self.assertAlmostEqual(res.quantile(0.01),
+                                   self.mix.quantile(0.01), places=5)
+            self.assertAlmostEqual(res.cdf(self.forward),
+                                   self.mix.cdf(self.forward), places=4)
+
+    def test_batch_and_repair(self):
+        """
+        """
+        from optools.density import breeden_litzenberger
+
+        # the second smile has a butterfly arbitrage in the middle
+        vola = np.vstack((self.vola, self.vola))
+        vola[1, 20] += 0.02
+
+        res = breeden_litzenberger(vola, np.vstack((self.strike, )*2),
+                                   self.forward, 1.0)
+        one = breeden_litzenberger(self.vola, self.strike, self.forward, 1.0)
+
+        assert_array_almost_equal(res.density[0], one.density)
+        assert_array_almost_equal(res.quantile(np.array([0.5, 0.5]))[0],
+                                  one.quantile(0.5))
+
+        self.assertTrue((res.density >= 0).all())
+        assert_array_almost_equal(np.trapz(res.density, res.strike), [1, 1])
+
+        smile = VolatilitySmile.from_arrays(self.vola, self.strike,
+                                            forward=self.forward, rf=0.01,
+                                            tau=1.0)
+        assert_array_almost_equal(smile.get_rnd().density, one.density)
+
+    def test_stacked_splines(self):
+        """
+        """
+        from optools.density import breeden_litzenberger
+
+        vola = np.vstack((self.vola, self.vola * 1.1))
+        strike = np.vstack((self.strike, self.strike * 1.02))
+
+        # the clamped spline of all smiles at once vs. the same boundary
+        #   condition spelled out, which fits CubicSpline smile by smile;
+        #   second differences of prices blow up rounding errors
+        for method, decimal in (("analytic", 12), ("fd", 8)):
+            res = breeden_litzenberger(vola, strike, self.forward, 1.0,
+                                       method=method)
+            ref = breeden_litzenberger(vola, strike, self.forward, 1.0,
+                                       method=method,
+                                       bc_type=((1, 0.0), (1, 0.0)))
+            assert_array_almost_equal(res.density, ref.density,
+                                      decimal=decimal)
+
+
+class TestSmileModels(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        from optools.smile_models import SABR
+
+        self.forward = 1.1
+        self.tau = 0.25
+        self.strike = self.forward * np.exp(np.linspace(-0.15, 0.15, 9))
+
+        # a path of SABR smiles, parameters drifting slowly over dates
+        t = np.linspace(0, 1, 50)[:, np.newaxis]
+        self.params = np.hstack((0.1 + 0.02 * t, -0.3 + 0.2 * t,
+                                 0.8 - 0.3 * t))
+        self.vola = SABR.vola(self.params, self.strike, self.forward,
+                              self.tau)
+
+    def test_recover_params(self):
+        """
+        """
+        from optools.smile_models import SVI, fit_smile_model
+
+        res = fit_smile_model(self.vola, self.strike, self.forward,
+                              self.tau, model="sabr")
+        self.assertTrue(res["converged"].all())
+        assert_array_almost_equal(res.iloc[:, :3].values, self.params)
+
+        svi_params = np.array([0.002, 0.03, -0.3, 0.01, 0.1])
+        vola = SVI.vola(svi_params, self.strike, self.forward, self.tau)
+        res = fit_smile_model(vola, self.strike, self.forward, self.tau,
+                              model="svi")
+        assert_array_almost_equal(res.iloc[0, :5].values, svi_params)
+
+    def test_batch_and_warm_start(self):
+        """
+        """
+        from optools.smile_models import fit_smile_model
+
+        vola = self.vola.copy()
+        vola[3, 2] = np.nan
+
+        res = fit_smile_model(vola, self.strike, self.forward, self.tau,
+                              model="sabr")
+        one = fit_smile_model(vola[10], self.strike, self.forward, self.tau,
+                              model="sabr")
+
+        self.assertTrue(res.iloc[3, :4].isnull().all())
+        assert_array_almost_equal(res.iloc[10, :4].astype(float),
+                                  one.iloc[0, :4].astype(float))
+
+        # yesterday's parameters as starting values
+        warm = fit_smile_model(vola, self.strike, self.forward, self.tau,
+                               model="sabr", x0=res.shift(1).fillna(res))
+        self.assertLess(warm["nit"].sum(), res["nit"].sum())
+
+        with self.assertRaises(ValueError):
+            fit_smile_model(vola, self.strike, self.forward, self.tau,
+                            model="heston")
+
+    def test_vanna_volga(self):
+        """
+        """
+        from optools.smile_models import fit_smile_model, smile_model_vola
+
+        res = fit_smile_model(self.vola, self.strike, self.forward,
+                              self.tau, model="vanna_volga")
+        fitted = smile_model_vola(res, self.strike, self.forward, self.tau,
+                                  model="vanna_volga")
+
+        # pivots are reproduced exactly
+        assert_array_almost_equal(fitted[:, 3:6], self.vola[:, 3:6],
+                                  decimal=12)
+
+    def test_interpolate(self):
+        """
+        """
+        smile = VolatilitySmile.from_arrays(self.vola[0], self.strike,
+                                            forward=self.forward,
+                                            tau=self.tau)
+        new_strike = np.linspace(0.9, 1.3, 21)
+
+        res = smile.interpolate(self.strike, in_method="sabr")
+        assert_array_almost_equal(res.vola, self.vola[0])
+
+        # stored parameters instead of a fit
+        params = smile.fit_model("sabr")
+        assert_array_almost_equal(
+            smile.interpolate(new_strike, in_method="sabr",
+                              params=params).vola,
+            smile.interpolate(new_strike, in_method="sabr").vola)
+
+        # model wings without extrapolation, flat ones with
+        wings = smile.interpolate(new_strike, in_method="sabr",
+                                  ex_method=None)
+        flat = smile.interpolate(new_strike, in_method="sabr")
+        self.assertGreater(wings.vola[0], flat.vola[0])
+
+        with self.assertRaises(ValueError):
+            VolatilitySmile.from_arrays(self.vola[0], self.strike)\
+                .interpolate(in_method="svi")
+
+
+class TestGrids(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        self.forward = 1.1
+        self.tau = 0.25
+        self.strike = self.forward * np.exp(np.linspace(-0.1, 0.1, 5))
+        self.vola = np.array([0.13, 0.115, 0.1, 0.105, 0.12])
+
+    def test_flat_smile(self):
+        """
+        """
+        from optools.grids import strike_grid
+
+        for policy in ("adaptive", "gauss"):
+            grid, weights = strike_grid(self.strike, self.forward, 0.1,
+                                        self.tau, policy=policy,
+                                        return_weights=True)
+            call_p = op.bs_price(grid, 0.01, self.tau, 0.1,
+                                 forward=self.forward)
+            res = op.mfivariance(call_p, grid, self.forward, 0.01, self.tau,
+                                 weights=weights)
+            self.assertAlmostEqual(res / 0.01, 1.0, places=6)
+
+    def test_tolerance_not_met(self):
+        """
+        """
+        import warnings
+        from optools.grids import grid_step
+
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            res = grid_step(1e-17, 0.05, "adaptive", max_iter=4)
+
+        self.assertEqual(len(w), 1)
+        self.assertIn("not met", str(w[0].message))
+        self.assertEqual(res, 0.5**4)
+
+        # met: no warning
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            grid_step(1e-4, 0.06, "adaptive")
+
+        self.assertEqual(len(w), 0)
+
+    def test_breakpoints_and_size(self):
+        """
+        """
+        from optools.grids import strike_grid
+        from optools.helpers import strike_range
+
+        res = strike_grid(self.strike, self.forward, self.vola, self.tau)
+
+        for k in (self.forward, self.strike[0], self.strike[-1]):
+            self.assertAlmostEqual(np.abs(res - k).min(), 0.0, places=12)
+
+        self.assertTrue((np.diff(res) > 0).all())
+        self.assertLess(len(res), len(strike_range(self.strike)) / 2)
+
+    def test_vs_fine_grid(self):
+        """
+        """
+        from optools.grids import strike_grid
+
+        smile = VolatilitySmile.from_arrays(self.vola, self.strike,
+                                            forward=self.forward, rf=0.01,
+                                            tau=self.tau)
+
+        grid, weights = strike_grid(self.strike, self.forward, self.vola,
+                                    self.tau, policy="gauss", tol=1e-12,
+                                    return_weights=True)
+        fine = smile.interpolate(grid)
+
+        # default grid of interpolate is the adaptive one
+        res = smile.interpolate()
+
+        for svix in (False, True):
+            self.assertAlmostEqual(
+                res.get_mfivariance(svix=svix) /
+                fine.get_mfivariance(svix=svix, weights=weights), 1.0,
+                places=6)
+
+    def test_batch_grids(self):
+        """
+        """
+        from optools.grids import strike_grid, strike_grids
+        from optools.helpers import spline_rows
+        from scipy.interpolate import CubicSpline
+
+        shift = np.array([[1.0], [1.02], [0.97], [1.0]])
+        strike = self.strike * shift
+        vola = self.vola * shift
+        forward = np.full(4, self.forward)
+
+        res = strike_grids(strike, forward, vola, self.tau)
+        self.assertEqual(sorted(np.concatenate([r for r, _, _ in res])),
+                         list(range(4)))
+
+        for rows, grids, weights in res:
+            for p, r in enumerate(rows):
+                grid, w = strike_grid(strike[r], self.forward, vola[r],
+                                      self.tau, return_weights=True)
+                assert_array_almost_equal(grids[p], grid, decimal=12)
+                assert_array_almost_equal(weights[p], w, decimal=12)
+
+            x = np.clip(grids, strike[rows, :1], strike[rows, -1:])
+            ref = [CubicSpline(strike[r], vola[r])(x[p])
+                   for p, r in enumerate(rows)]
+            assert_array_almost_equal(
+                spline_rows(x, strike[rows], vola[rows]), ref, decimal=12)
+
+        with self.assertRaises(ValueError):
+            strike_grid(self.strike, self.forward, self.vola, self.tau,
+                        policy="chebyshev")
+        with self.assertRaises(ValueError):
+            strike_grids(strike, forward, vola, self.tau, policy="uniform")
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -1,17 +1,20 @@
 import pandas as pd
 import numpy as np
-import copy
-from functools import reduce
+from collections.abc import Mapping
 from scipy.interpolate import CubicSpline
-from statsmodels.nonparametric.kernel_regression import KernelReg
 import matplotlib.pyplot as plt
 from optools.helpers import strike_range
+from optools.grids import strike_grid
 from mpl_toolkits.mplot3d import Axes3D
 
 from optools.pricing import (bs_price, strike_from_delta, mfivariance,
                              mfiskewness, vanillas_from_combinations,
-                             simple_var_swap_rate)
-from optools.helpers import fast_norm_cdf
+                             simple_var_swap_rate, delta_from_strike,
+                             atm_strike)
+from optools.density import breeden_litzenberger
+from optools.smoothing import local_linear, get_bandwidth
+from optools.smile_models import smile_models, fit_smile_model, \
+    smile_model_vola
 
 
 class VolatilitySmile:
@@ -23,6 +26,9 @@ class VolatilitySmile:
 
     All options are by defaults call options.
 
+    Strikes and volas are stored as contiguous float arrays sorted by
+    strike; the pandas.Series view in `.smile` is only created on demand.
+
     TODO: think about forward, spot, rf and div_yield defaults.
 
     Parameters
@@ -43,35 +49,128 @@ class VolatilitySmile:
         time to maturity, in years
 
     """
+    __slots__ = ("vola", "strike", "spot", "forward", "rf", "div_yield",
+                 "tau", "delta", "_call_p")
+
+    # attributes call prices depend on
+    _pricing_attrs = ("vola", "strike", "forward", "rf", "tau")
+
     def __init__(self, vola_series, spot=None, forward=None, rf=None,
                  div_yield=None, tau=None):
         """
         """
-        # sort, convert to float, rename
-        smile = vola_series.astype(float).sort_index().rename(tau)
-
-        # save to attributes
-        self.smile = smile
-
-        self.vola = smile.values
-        self.strike = np.array(smile.index)
+        self._init(vola=vola_series.values, strike=vola_series.index,
+                   spot=spot, forward=forward, rf=rf, div_yield=div_yield,
+                   tau=tau)
+
+    def _init(self, vola, strike, spot, forward, rf, div_yield, tau,
+              delta=None):
+        """Sort by strike, convert to contiguous float arrays and save."""
+        vola = np.asarray(vola, dtype=float)
+        strike = np.asarray(strike, dtype=float)
+
+        # sort (nan last, as pandas does)
+        order = np.argsort(strike, kind="mergesort")
+
+        # read-only, such that cached call prices cannot go stale
+        self.vola = np.ascontiguousarray(vola[order])
+        self.strike = np.ascontiguousarray(strike[order])
+        self.vola.setflags(write=False)
+        self.strike.setflags(write=False)
+        self.delta = None if delta is None else \
+            np.ascontiguousarray(np.asarray(delta, dtype=float)[order])
         self.spot = spot
         self.forward = forward
         self.rf = rf
         self.div_yield = div_yield
         self.tau = tau
 
-    def dropna(self, from_index=False):
-        """
+    @classmethod
+    def from_arrays(cls, vola, strike, spot=None, forward=None, rf=None,
+                    div_yield=None, tau=None, delta=None):
+        """Construct VolatilitySmile from arrays, bypassing pandas.
+
+        Parameters
+        ----------
+        vola: numpy.ndarray
+            implied vol
+        strike: numpy.ndarray
+            of option strike prices
+        spot: float, optional
+            underlying price
+        forward : float, optional
+            forward price
+        rf: float, optional
+            risk-free rate, in (frac of 1) p.a.
+        div_yield: float, optional
+            dividend yield, in (frac of 1) p.a.
+        tau: float, optional
+            time to maturity, in years
+        delta: numpy.ndarray, optional
+            of option deltas, in (frac of 1)
+
+        Returns
+        -------
+        res : VolatilitySmile
+            instance
+
         """
-        res = copy.deepcopy(self)
+        res = cls.__new__(cls)
+        res._init(vola=vola, strike=strike, spot=spot, forward=forward,
+                  rf=rf, div_yield=div_yield, tau=tau, delta=delta)
+
+        return res
 
+    def __setattr__(self, name, value):
+        """Set attribute, invalidating cached call prices if needed."""
+        object.__setattr__(self, name, value)
+
+        if name in self._pricing_attrs:
+            object.__setattr__(self, "_call_p", None)
+
+    @property
+    def call_p(self):
+        """Call prices at each strike, calculated once and cached."""
+        if self._call_p is None:
+            call_p = bs_price(forward=self.forward, strike=self.strike,
+                              rf=self.rf, tau=self.tau, vola=self.vola)
+            call_p.setflags(write=False)
+            self._call_p = call_p
+
+        return self._call_p
+
+    @property
+    def smile(self):
+        """pandas.Series of vola indexed by strike, created on demand."""
+        res = pd.Series(self.vola, index=self.strike, name=self.tau)
+
+        return res
+
+    def dropna(self, from_index=False):
+        """Drop points with missing strikes (or volas).
+
+        Parameters
+        ----------
+        from_index : bool
+            True to drop points with missing strikes, False to drop points
+            with missing volas
+
+        Returns
+        -------
+        res : VolatilitySmile
+            a new instance
+
+        """
         if from_index:
-            res.smile = res.smile.loc[res.smile.index.dropna()]
-            res.vola = res.smile.values
-            res.strike = np.array(res.smile.index)
+            keep = ~np.isnan(self.strike)
         else:
-            res.smile = res.smile.dropna()
+            keep = ~np.isnan(self.vola)
+
+        res = VolatilitySmile.from_arrays(
+            self.vola[keep], self.strike[keep], spot=self.spot,
+            forward=self.forward, rf=self.rf, div_yield=self.div_yield,
+            tau=self.tau,
+            delta=None if self.delta is None else self.delta[keep])
 
         return res
 
@@ -87,7 +186,7 @@ class VolatilitySmile:
 
     @classmethod
     def by_delta(cls, vola_series, spot, forward, rf, div_yield, tau,
-                 is_call):
+                 is_call, convention="spot"):
         """Construct VolatilitySmile from delta-vola relation.
 
         Converts Balck-Scholes deltas to strikes (see Wystup (2006), eq. 1.44)
@@ -109,6 +208,8 @@ class VolatilitySmile:
             time to maturity, in years
         is_call: bool
             whether options are call options
+        convention : str
+            delta convention, 'spot', 'forward', 'spot_pa' or 'forward_pa'
 
         Returns
         -------
@@ -116,28 +217,22 @@ class VolatilitySmile:
             instance
 
         """
-        # rename index to be able to pick it up as a column later
-        vola_series.index.name = "delta"
+        delta = np.asarray(vola_series.index, dtype=float)
+        vola = np.asarray(vola_series.values, dtype=float)
 
         # strikes from deltas
-        strike = strike_from_delta(vola_series.index, spot, rf, div_yield, tau,
-                                   vola_series.values, is_call)
-
-        # concat vola-by-delta and strikes to have the delta-to-strike mapping
-        df = pd.concat({
-            "vola": vola_series,
-            "strike": pd.Series(strike, index=vola_series.index)},
-            axis=1).reset_index().set_index("strike").sort_index()
+        strike = strike_from_delta(delta, spot, rf, div_yield, tau, vola,
+                                   is_call, convention=convention)
 
-        res = cls(df.loc[:, "vola"], spot, forward, rf, div_yield, tau)
-
-        res.delta = df.loc[:, "delta"]
+        res = cls.from_arrays(vola, strike, spot, forward, rf, div_yield, tau,
+                              delta=delta)
 
         return res
 
     @classmethod
     def by_delta_from_combinations(cls, combies, atm_vola, spot, forward, rf,
-                                   div_yield, tau):
+                                   div_yield, tau, convention="spot",
+                                   atm="atmf"):
         """Construct VolatilitySmile from delta-vola of option combinations.
 
         Essentially a wrapper around .by_delta() condtructor, conveniently
@@ -145,7 +240,8 @@ class VolatilitySmile:
         butterfly spreads and at-the-money vanillas (details are in
         Wystup (2006), pp. 22-23). The first step is to recover the vola of
         the underlying vanilla call options (eqs. 1.97-1.100 in Wystup (
-        2006)), the second step is to apply .to_delta to these.
+        2006)), the second step is to apply .to_delta to these. For many
+        dates at once, see `smiles_from_combinations`.
 
         Parameters
         ----------
@@ -166,6 +262,11 @@ class VolatilitySmile:
             div yield (rf rate of the base currency), in (frac of 1) p.a.
         tau : float
             time to maturity, in years
+        convention : str
+            delta convention of the quotes, 'spot', 'forward', 'spot_pa' or
+            'forward_pa'
+        atm : str
+            definition of the atm quote, 'atmf' or 'dns'
 
         Returns
         -------
@@ -173,24 +274,12 @@ class VolatilitySmile:
             instance
 
         """
-        # for each delta, calculate iv of respective call, concat to a Series
-        volas = list()
-
-        for k, v in combies.items():
-            volas.append(vanillas_from_combinations(atm=atm_vola,
-                                                    delta=k, **v))
+        arr = smiles_from_combinations(combies, atm_vola, spot, forward, rf,
+                                       div_yield, tau, convention=convention,
+                                       atm=atm)
 
-        volas = pd.concat(volas)
-
-        # add delta of atm (slightly different than 0.5, as in
-        #   Wystup (2006), eq. 1.96)
-        atm_delta = np.exp(-div_yield * tau) * \
-            fast_norm_cdf(0.5 * atm_vola * np.sqrt(tau))
-
-        volas.loc[atm_delta] = atm_vola
-
-        res = cls.by_delta(volas,
-                           spot, forward, rf, div_yield, tau, is_call=True)
+        res = cls.from_arrays(arr["vola"][0], arr["strike"][0], spot, forward,
+                              rf, div_yield, tau, delta=arr["delta"][0])
 
         return res
 
@@ -238,22 +327,28 @@ class VolatilitySmile:
                     ex_method="constant", **kwargs):
         """Interpolate volatility smile.
 
-        Spline interpolation (exact fit to existing data) or kernel
-        regression interpolation (approximate fit to existing data) is
-        implemented.
+        Spline interpolation (exact fit to existing data), kernel
+        regression interpolation (approximate fit to existing data) and
+        the parametric models of `smile_models` are implemented.
 
         Parameters
         ----------
         new_strike : numpy.ndarray
-            of strike prices over which the interpolation takes place
+            of strike prices over which the interpolation takes place; by
+            default, the adaptive grid of `grids.strike_grid` if `forward`
+            and `tau` are set, `helpers.strike_range` otherwise
         in_method : str
-            method of interpolation; 'spline' and 'kernel' is supported
+            method of interpolation; 'spline', 'kernel', 'svi', 'sabr' and
+            'vanna_volga' are supported; the models need `forward` and `tau`
         ex_method : str or None
             method of extrapolation; None to skip extrapolation, 'const' for
             extrapolation with endpoint values
         **kwargs : any
             additional argument to the interpolation function,
-            e.g. bc_type='clamped' for a clamped smile
+            e.g. bc_type='clamped' for a clamped smile; for 'kernel', `bw`
+            sets the bandwidth, cross-validated (and cached) by default; for
+            the models, `params` skips calibration and other arguments go
+            to `fit_smile_model`
 
         Returns
         -------
@@ -262,7 +357,22 @@ class VolatilitySmile:
         """
         # defaults
         if new_strike is None:
-            new_strike = strike_range(self.strike)
+            if self.forward is None or self.tau is None:
+                new_strike = strike_range(self.strike)
+            else:
+                new_strike = strike_grid(self.strike, self.forward,
+                                         self.vola, self.tau)
+        else:
+            new_strike = np.asarray(new_strike, dtype=float)
+
+        # constant extrapolation with endpoint values is evaluation at the
+        #   endpoints for strikes beyond them
+        if ex_method is None:
+            eval_strike = new_strike
+        elif ex_method == "constant":
+            eval_strike = np.clip(new_strike, self.strike[0], self.strike[-1])
+        else:
+            raise NotImplementedError("Extrapolation method not implemented!")
 
         # interpolate -------------------------------------------------------
         if in_method == "spline":
@@ -270,51 +380,64 @@ class VolatilitySmile:
             cs = CubicSpline(self.strike, self.vola,
                              extrapolate=False, **kwargs)
             # fit
-            vola_interpolated = cs(new_strike)
+            vola_interpolated = cs(eval_strike)
 
         elif in_method == "kernel":
-            # estimate endog must be a list of one element
-            kr = KernelReg(endog=[self.vola, ], exog=[self.strike, ],
-                           reg_type="ll", var_type=['c', ])
+            # local-linear regression; bandwidth cross-validated unless given
+            bw = kwargs.get("bw")
+            if bw is None:
+                bw = get_bandwidth(self.strike, self.vola)
 
             # fit
-            vola_interpolated, _ = kr.fit(data_predict=new_strike)
+            vola_interpolated = local_linear(self.strike, self.vola,
+                                             eval_strike, bw)
+
+        elif in_method in smile_models:
+            if self.forward is None or self.tau is None:
+                raise ValueError("Forward and tau are needed to fit " +
+                                 "a smile model!")
+
+            params = kwargs.pop("params", None)
+            if params is None:
+                params = self.fit_model(in_method, **kwargs)
+
+            vola_interpolated = smile_model_vola(
+                params, eval_strike, self.forward, self.tau, model=in_method)
 
         else:
             raise NotImplementedError("Interpolation method not implemented!")
 
-        # extrapolate -------------------------------------------------------
-        if ex_method is None:
-            pass
+        # construct another VolatilitySmile instance
+        res = VolatilitySmile.from_arrays(vola_interpolated, new_strike,
+                                          spot=self.spot,
+                                          forward=self.forward, rf=self.rf,
+                                          div_yield=self.div_yield,
+                                          tau=self.tau)
 
-        elif ex_method == "constant":
-            # use pandas.Series functionality to extrapolate but check if the
-            #   strikes are sorted first
-            tmp = pd.Series(index=new_strike, data=vola_interpolated)
-            if not np.array_equal(tmp.index, sorted(tmp.index)):
-                raise ValueError("Strikes not sorted before extrapolation!")
+        return res
 
-            # fill beyond endpoints
-            tmp.loc[tmp.index < min(self.strike)] = tmp.loc[min(self.strike)]
-            tmp.loc[tmp.index > max(self.strike)] = tmp.loc[max(self.strike)]
+    def fit_model(self, model="svi", **kwargs):
+        """Calibrate a parametric smile model to this smile.
 
-            # disassemble again
-            new_strike = np.array(tmp.index)
-            vola_interpolated = tmp.values
+        Parameters
+        ----------
+        model : str
+            'svi', 'sabr' or 'vanna_volga'
+        **kwargs : any
+            additional arguments to `fit_smile_model`
 
-        else:
-            raise NotImplementedError("Extrapolation method not implemented!")
+        Returns
+        -------
+        res : pandas.Series
+            parameters of the model, enough to store the smile
 
-        # construct another VolatilitySmile instance
-        vola_series = pd.Series(vola_interpolated, index=new_strike)
-        res = VolatilitySmile(vola_series,
-                              spot=self.spot,
-                              forward=self.forward, rf=self.rf,
-                              div_yield=self.div_yield, tau=self.tau)
+        """
+        res = fit_smile_model(self.vola, self.strike, self.forward, self.tau,
+                              model=model, **kwargs)
 
-        return res
+        return res.loc[0, list(smile_models[model].param_names)]
 
-    def get_mfivariance(self, svix=False):
+    def get_mfivariance(self, svix=False, weights=None):
         """Calculate the model-free implied variance.
 
         The mfiv is calculated as the integral over call prices weighted by
@@ -326,6 +449,9 @@ class VolatilitySmile:
         ----------
         svix : bool
             True to calculate Martin (2017) simple variance swap rates
+        weights : numpy.ndarray, optional
+            quadrature weights over the strikes instead of Simpson's, e.g.
+            from `grids.strike_grid(policy='gauss', return_weights=True)`
 
         Returns
         -------
@@ -334,29 +460,31 @@ class VolatilitySmile:
 
         """
         # from volas to call prices
-        call_p = bs_price(forward=self.forward, strike=self.strike,
-                          rf=self.rf, tau=self.tau, vola=self.vola)
+        call_p = self.call_p
 
         # mfiv
         if svix:
             res = simple_var_swap_rate(call_p, self.strike, self.forward,
-                                       self.rf, self.tau)
+                                       self.rf, self.tau, weights=weights)
         else:
             res = mfivariance(call_p, self.strike, self.forward,
-                              self.rf, self.tau)
+                              self.rf, self.tau, weights=weights)
 
         return res
 
     def get_mfisemivariance(self):
-        """
+        """Calculate the model-free implied down- and upside variances.
 
         Returns
         -------
+        mfiv_down : float
+            mfiv over strikes below the forward, in (frac of 1) p.a.
+        mfiv_up : float
+            mfiv over strikes above the forward, in (frac of 1) p.a.
 
         """
         # from volas to call prices
-        call_p = bs_price(forward=self.forward, strike=self.strike,
-                          rf=self.rf, tau=self.tau, vola=self.vola)
+        call_p = self.call_p
 
         # break into up- and downside
         idx_down = self.strike <= self.forward
@@ -369,20 +497,78 @@ class VolatilitySmile:
 
         return mfiv_down, mfiv_up
 
-    def get_mfiskewness(self):
-        """
+    def get_mfiskewness(self, mfiv=None):
+        """Calculate the model-free implied skewness.
+
+        Parameters
+        ----------
+        mfiv : float, optional
+            output of .get_mfivariance(), if already calculated
 
         Returns
         -------
+        res : float
+            model-free implied skewness
 
         """
         # from volas to call prices
-        call_p = bs_price(forward=self.forward, strike=self.strike,
-                          rf=self.rf, tau=self.tau, vola=self.vola)
+        call_p = self.call_p
 
         # mfiv
         res = mfiskewness(call_p=call_p, strike=self.strike, spot=self.spot,
-                          forward=self.forward, rf=self.rf, tau=self.tau)
+                          forward=self.forward, rf=self.rf, tau=self.tau,
+                          mfiv=mfiv)
+
+        return res
+
+    def get_moments(self):
+        """Calculate all model-free moments from one pricing pass.
+
+        Call prices are calculated (or taken from the cache) once, and the
+        mfiv is reused in the skewness.
+
+        Returns
+        -------
+        res : dict
+            with keys 'mfiv', 'svix', 'mfiv_down', 'mfiv_up' and
+            'mfiskewness' (nan if spot is not set)
+
+        """
+        mfiv = self.get_mfivariance()
+        mfiv_down, mfiv_up = self.get_mfisemivariance()
+
+        res = {
+            "mfiv": mfiv,
+            "svix": self.get_mfivariance(svix=True),
+            "mfiv_down": mfiv_down,
+            "mfiv_up": mfiv_up,
+            "mfiskewness": np.nan if self.spot is None else
+            self.get_mfiskewness(mfiv=mfiv)
+        }
+
+        return res
+
+    def get_rnd(self, method="analytic", **kwargs):
+        """Estimate the risk-neutral density nonparametrically.
+
+        Volas are interpolated with a spline and extrapolated with a
+        constant, as in `.interpolate()`; the density is the second
+        derivative of call prices w.r.t. the strike.
+
+        Parameters
+        ----------
+        method : str
+            'analytic' or 'fd', see `density.breeden_litzenberger`
+        **kwargs : any
+            additional arguments to `density.breeden_litzenberger`
+
+        Returns
+        -------
+        res : RiskNeutralDensity
+
+        """
+        res = breeden_litzenberger(self.vola, self.strike, self.forward,
+                                   self.tau, method=method, **kwargs)
 
         return res
 
@@ -415,9 +601,194 @@ class VolatilitySmile:
         return fig, ax
 
 
+def smiles_from_combinations(combies, atm_vola, spot, forward, rf, div_yield,
+                             tau, convention="spot", atm="atmf"):
+    """Construct many smiles from delta-vola of option combinations at once.
+
+    The batch counterpart of `VolatilitySmile.by_delta_from_combinations`,
+    for a history of quotes: volas of vanilla options and their strikes are
+    calculated with array operations over all dates. The risk reversal and
+    butterfly of delta d give the volas of the call with delta d and of the
+    put with delta -d; the atm vola that of the atm straddle.
+
+    Before, the put was solved as a call with delta 1 - d, which is exact for
+    forward deltas only: for spot deltas N(d1) is off by exp(q*tau) - 1, so
+    put strikes move by sigma*sqrt(tau)*(exp(q*tau) - 1)/phi(d1) relative,
+    about 1e-4 for 10-delta and 7e-5 for 25-delta 1m puts at q = 0.8%.
+
+    Parameters
+    ----------
+    combies : dict
+        of (delta: combi) pairs where combi is a dict-like as follows:
+            {'rr': (N,) array of ivs of the risk reversal,
+             'bf': (N,) array of ivs of the butterfly}
+        all ivs are in (frac of 1) p.a.
+    atm_vola : float or numpy.ndarray
+        (N,) at-the-money volatilities, in (frac of 1) p.a.
+    spot, forward, rf, div_yield : float or numpy.ndarray
+        (N,) underlying and forward prices, risk-free rates and dividend
+        yields (rf rates of the base currency), in (frac of 1) p.a.
+    tau : float or numpy.ndarray
+        time(s) to maturity, in years
+    convention : str
+        delta convention of the quotes, 'spot', 'forward', 'spot_pa' or
+        'forward_pa', see `pricing.delta_from_strike`
+    atm : str
+        definition of the atm quote: 'atmf' for the forward, 'dns' for the
+        delta-neutral straddle, see `pricing.atm_strike`
+
+    Returns
+    -------
+    res : dict
+        as the arrays of `stack_smiles`: (N, 2*len(combies) + 1) arrays of
+        'strike', 'vola' and 'delta' (of calls, negative for puts, and of
+        the atm call), each row sorted by strike with missing quotes (nan)
+        last, and (N,) arrays of 'spot', 'forward', 'rf', 'div_yield' and
+        'tau'
+
+    """
+    atm_vola, spot, forward, rf, div_yield, tau = [
+        np.atleast_1d(np.asarray(p, dtype=float)) for p in
+        np.broadcast_arrays(atm_vola, spot, forward, rf, div_yield, tau)]
+
+    # calls and puts implied by each combination
+    vola, delta, is_call = [], [], []
+
+    for d, v in sorted(combies.items()):
+        rr, bf = [np.broadcast_to(np.asarray(v[p], dtype=float),
+                                  atm_vola.shape) for p in ("rr", "bf")]
+
+        vola.extend(vanillas_from_combinations(rr, bf, atm_vola))
+        delta.extend([np.full_like(atm_vola, d),
+                      np.full_like(atm_vola, -d)])
+        is_call.extend([True, False])
+
+    vola, delta = np.column_stack(vola), np.column_stack(delta)
+
+    # strikes from deltas
+    col = [p[:, np.newaxis] for p in (spot, rf, div_yield, tau)]
+    strike = strike_from_delta(delta, *col, vola, np.array(is_call),
+                               convention=convention)
+
+    # atm strike and the delta of its call
+    atm_k = atm_strike(spot, rf, div_yield, tau, atm_vola, atm=atm,
+                       convention=convention)
+    atm_delta = delta_from_strike(atm_k, spot, rf, div_yield, tau, atm_vola,
+                                  True, convention=convention)
+
+    strike = np.column_stack((atm_k, strike))
+    vola = np.column_stack((atm_vola, vola))
+    delta = np.column_stack((atm_delta, delta))
+
+    # sort each row by strike (nan last)
+    order = np.argsort(strike, axis=-1, kind="mergesort")
+
+    res = {
+        p: np.take_along_axis(v, order, axis=-1)
+        for p, v in (("strike", strike), ("vola", vola), ("delta", delta))
+    }
+    res.update(spot=spot, forward=forward, rf=rf, div_yield=div_yield,
+               tau=tau)
+
+    return res
+
+
+def stack_smiles(smiles):
+    """Stack smiles with equally many strikes into arrays.
+
+    Parameters
+    ----------
+    smiles : dict-like
+        of VolatilitySmile instances
+
+    Returns
+    -------
+    res : list
+        of (keys, arrays) tuples, one per number of strikes, where `keys`
+        is a list of keys of `smiles` and `arrays` is a dict of (N, M)
+        arrays of 'strike' and 'vola' and (N,) arrays of 'spot', 'forward',
+        'rf', 'div_yield' and 'tau', with nan where not set
+
+    """
+    # group by the number of strikes
+    groups = dict()
+    for k, v in smiles.items():
+        groups.setdefault(len(v.strike), list()).append(k)
+
+    res = list()
+
+    for keys in groups.values():
+        arrays = {
+            p: np.vstack([getattr(smiles[k], p) for k in keys])
+            for p in ("strike", "vola")
+        }
+        arrays.update({
+            p: np.array([getattr(smiles[k], p) for k in keys], dtype=float)
+            for p in ("spot", "forward", "rf", "div_yield", "tau")
+        })
+
+        res.append((keys, arrays))
+
+    return res
+
+
+class _SmileMapping(Mapping):
+    """Read-only mapping of maturity to smile, built lazily.
+
+    Each smile is constructed from its column of the surface on first
+    access and cached afterwards.
+
+    Parameters
+    ----------
+    vola : numpy.ndarray
+        (strike x maturity) array of volas, with nans where not quoted
+    strike : numpy.ndarray
+    tau : numpy.ndarray
+    spot, forward, rf, div_yield : dict-like
+        indexed by maturity
+    """
+    def __init__(self, vola, strike, tau, spot, forward, rf, div_yield):
+        self._vola = vola
+        self._strike = strike
+        self._column = {t: p for p, t in enumerate(tau)}
+        self._spot = spot
+        self._forward = forward
+        self._rf = rf
+        self._div_yield = div_yield
+
+        self._cache = dict()
+
+    def __getitem__(self, tau):
+        if tau not in self._cache:
+            p = self._column[tau]
+
+            # column of the (sorted) vola array, without nans
+            valid = ~np.isnan(self._vola[:, p])
+
+            self._cache[tau] = VolatilitySmile.from_arrays(
+                self._vola[valid, p], self._strike[valid],
+                spot=self._spot.get(tau, None),
+                forward=self._forward.get(tau, None),
+                rf=self._rf.get(tau, None),
+                div_yield=self._div_yield.get(tau, None),
+                tau=tau)
+
+        return self._cache[tau]
+
+    def __iter__(self):
+        return iter(self._column)
+
+    def __len__(self):
+        return len(self._column)
+
+
 class VolatilitySurface:
     """
     """
+    # attributes the smiles are built from
+    _smile_attrs = ("surface", "vola", "strike", "tau", "spot", "forward",
+                    "rf", "div_yield")
+
     def __init__(self, vola_df, spot=None, forward=None, rf=None,
                  div_yield=None):
         """
@@ -438,19 +809,27 @@ class VolatilitySurface:
         self.rf = rf
         self.div_yield = div_yield
 
+    def __setattr__(self, name, value):
+        """Set attribute, invalidating cached smiles if needed."""
+        object.__setattr__(self, name, value)
+
+        if name in self._smile_attrs:
+            object.__setattr__(self, "_smiles", None)
+
     @property
     def smiles(self):
-        res = {
-            t: VolatilitySmile(v.dropna(),
-                               spot=self.spot.get(t, None),
-                               forward=self.forward.get(t, None),
-                               rf=self.rf.get(t, None),
-                               div_yield=self.div_yield.get(t, None),
-                               tau=t)
-            for t, v in self.surface.iteritems()
-        }
+        """Mapping of maturity to VolatilitySmile, cached.
 
-        return res
+        Smiles are constructed on first access to each maturity and reused
+        until any of the surface attributes is reassigned; changes made to
+        `surface` or `vola` in place are not tracked.
+        """
+        if self._smiles is None:
+            self._smiles = _SmileMapping(
+                self.vola, self.strike, self.tau, spot=self.spot,
+                forward=self.forward, rf=self.rf, div_yield=self.div_yield)
+
+        return self._smiles
 
     def plot(self, **kwargs):
         """Plot the surface in 3d.
@@ -488,10 +867,13 @@ class VolatilitySurface:
         return fig, ax
 
     def interpolate_along_tau(self):
-        """
+        """Impute volas across maturities with sticky moneyness.
 
-        Parameters
-        ----------
+        Every quoted (strike, maturity) point is carried over to each other
+        maturity at strike f_new*(k/f)^sqrt(tau_new/tau), its distance to the
+        atm vola kept fixed. All pairs of maturities are computed at once;
+        where several maturities land on the same strike, the shortest one
+        takes precedence.
 
         Returns
         -------
@@ -499,57 +881,52 @@ class VolatilitySurface:
             a new instance, with interpolated data
 
         """
-        # assert isinstance(self.forward, pd.Series)
-        # self.forward = self.forward.reindex(index=self.tau)
-
-        # loop over maturities: for each, there are five unique (in case of
-        # fx) strikes, so it is possible to fill up to five new strikes in
-        # each other column
-        imputed_all = list()
-
-        for tau_star, tau_star_col in self.surface.iteritems():
-            # fetch self.forward corresponding to this maturity
-            f_star = self.forward.loc[tau_star]
-            # strikes in this column
-            k_star = np.array(tau_star_col.dropna().index)
-
-            # loop over the other columns (the two closest at most)
-            # closest_cols = pd.Series({tau_star: tau_star}).reindex(
-            #     index=self.tau).sort_index()
-            # closest_cols = closest_cols.ffill(limit=1).bfill(limit=1).dropna()
-            # closest_cols = [p for p in closest_cols.index if p != tau_star]
-            closest_cols = self.surface.columns
-
-            imputed_tau_star = dict()
-
-            for tau_new, tau_new_col in\
-                    self.surface.loc[:, closest_cols].iteritems():
-
-                # fetch self.forward corresponding to this maturity (new one)
-                f_new = self.forward.loc[tau_new]
-
-                # calculate new strikes for this new maturity
-                k_new = f_new * (k_star / f_star)**(np.sqrt(tau_new/tau_star))
-
-                # calculate new sigmas
-                sigma_new = self.surface.loc[f_new, tau_new] +\
-                    self.surface.loc[k_star, tau_star].values - \
-                    self.surface.loc[f_star, tau_star]
-
-                # assemble in a series
-                imputed_tau_star[tau_new] = pd.Series(index=k_new,
-                                                      data=sigma_new)
-
-            # concat all freshly imputed dfs
-            imputed_all.append(pd.concat(imputed_tau_star, axis=1))
-
-        # merge all dfs with reduce
-        def reduce_func(x, y):
-            x_new, y_new = x.align(y, join="outer")
-            return x_new.fillna(y_new)
+        forward = np.asarray(self.forward.reindex(index=self.tau),
+                             dtype=float)
+
+        # atm volas: self.forward must be among the strikes of each column
+        atm_idx = pd.Index(self.strike).get_indexer(forward)
+        if (atm_idx < 0).any():
+            raise ValueError("forward prices must be among the strikes.")
+
+        atm_vola = self.vola[atm_idx, np.arange(len(self.tau))]
+
+        # (tau_star, tau_new, strike) cube ------------------------------------
+        f_star = forward[:, np.newaxis, np.newaxis]
+        f_new = forward[np.newaxis, :, np.newaxis]
+        tau_star = self.tau[:, np.newaxis, np.newaxis]
+        tau_new = self.tau[np.newaxis, :, np.newaxis]
+
+        k_star = self.strike[np.newaxis, np.newaxis, :]
+        k_new = f_new * (k_star / f_star)**(np.sqrt(tau_new/tau_star))
+
+        sigma_new = atm_vola[np.newaxis, :, np.newaxis] + \
+            self.vola.T[:, np.newaxis, :] - \
+            atm_vola[:, np.newaxis, np.newaxis]
+
+        # keep quoted points only; the cube is flattened with tau_star
+        # varying slowest, so earlier entries are shorter maturities
+        quoted = np.broadcast_to(
+            ~np.isnan(self.vola.T)[:, np.newaxis, :], k_new.shape)
+        col = np.broadcast_to(
+            np.arange(len(self.tau))[np.newaxis, :, np.newaxis],
+            k_new.shape)[quoted]
+        k_new = k_new[quoted]
+        sigma_new = sigma_new[quoted]
+
+        # merge into a dense strike x tau array -------------------------------
+        new_strike, row = np.unique(k_new, return_inverse=True)
+
+        vola = np.full((len(new_strike), len(self.tau)), np.nan)
+
+        # first non-nan value for each cell
+        has_value = ~np.isnan(sigma_new)
+        cell = (row * len(self.tau) + col)[has_value]
+        _, first = np.unique(cell, return_index=True)
+        vola.flat[cell[first]] = sigma_new[has_value][first]
 
         res = VolatilitySurface(
-            vola_df=reduce(reduce_func, imputed_all),
+            vola_df=pd.DataFrame(vola, index=new_strike, columns=self.tau),
             forward=self.forward, spot=self.spot, rf=self.rf,
             div_yield=self.div_yield)
 
@@ -611,15 +988,45 @@ class VolatilitySurface:
                                  forward=self.forward, rf=self.rf,
                                  div_yield=self.div_yield)
 
-    def get_mfivariance(self):
-        """
+    def get_mfivariance(self, svix=False):
+        """Calculate the model-free implied variance for each maturity.
+
+        Smiles with equally many strikes are stacked, priced and integrated
+        at once.
+
+        Parameters
+        ----------
+        svix : bool
+            True to calculate Martin (2017) simple variance swap rates
 
         Returns
         -------
+        res : pandas.Series
+            of mfiv, in (frac of 1) p.a., indexed by maturity
 
         """
-        res = pd.Series({t: v.get_mfivariance()
-                         for t, v in self.smiles.items()})
+        smiles = self.smiles
+
+        res = dict()
+
+        for taus, arr in stack_smiles(smiles):
+            call_p = bs_price(strike=arr["strike"],
+                              rf=arr["rf"][:, np.newaxis],
+                              tau=arr["tau"][:, np.newaxis],
+                              vola=arr["vola"],
+                              forward=arr["forward"][:, np.newaxis])
+
+            if svix:
+                mfiv = simple_var_swap_rate(call_p, arr["strike"],
+                                            arr["forward"], arr["rf"],
+                                            arr["tau"])
+            else:
+                mfiv = mfivariance(call_p, arr["strike"], arr["forward"],
+                                   arr["rf"], arr["tau"])
+
+            res.update(zip(taus, mfiv))
+
+        res = pd.Series({t: res[t] for t in smiles})
 
         return res
 